@@ -0,0 +1,100 @@
+"""Benchmarks for destructify. Run all benchmarks using ``python -m benchmarks``, or using
+``pytest benchmarks/pytest_suite.py`` if pytest-benchmark is installed.
+
+A benchmark is registered using the :func:`benchmark` decorator on a setup function, that returns a
+:class:`Workload`: a function that runs a single iteration, together with the amount of records and bytes processed
+by that iteration.
+"""
+
+import collections
+import gc
+import importlib
+import sys
+import time
+import timeit
+import tracemalloc
+
+__all__ = ['Benchmark', 'Workload', 'Result', 'REGISTRY', 'SIZES', 'benchmark', 'instance_size', 'load_all',
+           'measure', 'measure_size']
+
+Benchmark = collections.namedtuple('Benchmark', 'group name setup')
+Workload = collections.namedtuple('Workload', 'func records nbytes')
+Result = collections.namedtuple('Result', 'group name seconds records_per_second mb_per_second peak_kib error')
+
+REGISTRY = []
+SIZES = []
+
+MODULES = ['benchmarks.fields', 'benchmarks.structures', 'benchmarks.png']
+
+
+def benchmark(group, name):
+    """Registers the decorated setup function as benchmark *name* in *group*."""
+    def decorator(setup):
+        REGISTRY.append(Benchmark(group, name, setup))
+        return setup
+    return decorator
+
+
+def instance_size(group, name):
+    """Registers the decorated function, which returns a function that creates a single instance, for measuring the
+    amount of memory used per instance.
+    """
+    def decorator(setup):
+        SIZES.append(Benchmark(group, name, setup))
+        return setup
+    return decorator
+
+
+def load_all():
+    """Imports all benchmark modules, so their benchmarks are registered."""
+    for module in MODULES:
+        importlib.import_module(module)
+
+
+def measure(bench, *, min_time=0.2, repeat=5, allocations=True):
+    """Runs the benchmark and returns a :class:`Result`. The amount of iterations is chosen such that a single timing
+    takes at least *min_time* seconds, and the best of *repeat* timings is used. If *allocations* is true, the peak
+    amount of memory allocated during a single iteration is measured as well.
+    """
+    try:
+        workload = bench.setup()
+        workload.func()
+    except Exception as e:
+        return Result(bench.group, bench.name, None, None, None, None, "{}: {}".format(e.__class__.__name__, e))
+
+    timer = timeit.Timer(workload.func, timer=time.perf_counter)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    seconds = min(timer.repeat(repeat, number)) / number
+
+    peak_kib = None
+    if allocations:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            workload.func()
+            peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+
+    return Result(bench.group, bench.name, seconds, workload.records / seconds, workload.nbytes / seconds / 1e6,
+                  peak_kib, None)
+
+
+def measure_size(bench, count=1000):
+    """Returns the average amount of bytes that is kept alive by a single instance created by the benchmark, excluding
+    the list that holds the instances.
+    """
+    factory = bench.setup()
+    factory()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [factory() for _ in range(count)]
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0] - sys.getsizeof(instances)
+    finally:
+        tracemalloc.stop()
+    del instances
+    return (after - before) / count
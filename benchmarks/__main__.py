@@ -0,0 +1,61 @@
+import argparse
+import json
+
+from . import REGISTRY, SIZES, load_all, measure, measure_size
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Runs the destructify benchmarks.")
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        help="only run benchmarks whose group or name contains this string (may be repeated)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimal duration of a single timing in seconds (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="amount of timings, of which the best is used "
+                                                              "(default: %(default)s)")
+    parser.add_argument("--no-allocations", dest="allocations", action="store_false",
+                        help="do not measure the peak memory allocated during an iteration")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to this file as JSON")
+    parser.add_argument("--list", action="store_true", help="only list the available benchmarks")
+    args = parser.parse_args()
+
+    load_all()
+
+    def selected(bench):
+        return not args.patterns or any(p in "{}/{}".format(bench.group, bench.name) for p in args.patterns)
+
+    benchmarks = [bench for bench in REGISTRY if selected(bench)]
+    sizes = [bench for bench in SIZES if selected(bench)]
+
+    if args.list:
+        for bench in benchmarks + sizes:
+            print("{}/{}".format(bench.group, bench.name))
+        return
+
+    results = []
+    print("{:<8} {:<28} {:>12} {:>10} {:>10}".format("group", "name", "records/s", "MB/s", "peak KiB"))
+    for bench in benchmarks:
+        result = measure(bench, min_time=args.min_time, repeat=args.repeat, allocations=args.allocations)
+        results.append(result._asdict())
+        if result.error is not None:
+            print("{:<8} {:<28} {}".format(result.group, result.name, result.error))
+            continue
+        print("{:<8} {:<28} {:>12,.0f} {:>10.2f} {:>10}".format(
+            result.group, result.name, result.records_per_second, result.mb_per_second,
+            "-" if result.peak_kib is None else "{:.1f}".format(result.peak_kib)
+        ))
+
+    if sizes:
+        print()
+        print("{:<8} {:<28} {:>12}".format("group", "name", "bytes"))
+    for bench in sizes:
+        size = measure_size(bench)
+        results.append({'group': bench.group, 'name': bench.name, 'bytes': size})
+        print("{:<8} {:<28} {:>12.0f}".format(bench.group, bench.name, size))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Micro-benchmarks that parse and write many small records, each consisting of a single field type."""
+
+import enum
+import io
+
+import destructify
+
+from . import Workload, benchmark
+
+RECORDS = 1000
+
+
+class Color(enum.IntEnum):
+    RED = 1
+    GREEN = 2
+
+
+class Inner(destructify.Structure):
+    a = destructify.IntegerField(2, 'little')
+    b = destructify.IntegerField(2, 'little')
+
+
+def _field_benchmarks(name, fields, values):
+    """Registers a parse and write benchmark for a :class:`Structure` consisting of *fields*, filled with *values*."""
+    structure = type(name, (destructify.Structure,), dict(fields, __module__=__name__))
+    instances = [structure(**values) for _ in range(RECORDS)]
+    record = instances[0].to_bytes()
+    buffer = record * RECORDS
+
+    @benchmark('parse', name)
+    def parse_setup():
+        def parse():
+            stream = io.BytesIO(buffer)
+            for _ in range(RECORDS):
+                structure.from_stream(stream)
+        return Workload(parse, RECORDS, len(buffer))
+
+    @benchmark('write', name)
+    def write_setup():
+        def write():
+            stream = io.BytesIO()
+            for instance in instances:
+                instance.to_stream(stream)
+        return Workload(write, RECORDS, len(buffer))
+
+
+_field_benchmarks('BytesField[fixed]', {'value': destructify.BytesField(length=16)}, {'value': b'x' * 16})
+_field_benchmarks('BytesField[terminated]', {'value': destructify.BytesField(terminator=b'\0')},
+                  {'value': b'hello world'})
+_field_benchmarks('StringField', {'value': destructify.StringField(terminator=b'\0', encoding='utf-8')},
+                  {'value': 'hello w\xf6rld'})
+_field_benchmarks('IntegerField', {'value': destructify.IntegerField(4, 'little')}, {'value': 123456})
+_field_benchmarks('VariableLengthIntegerField', {'value': destructify.VariableLengthIntegerField()},
+                  {'value': 300000})
+_field_benchmarks('IntField', {'value': destructify.IntField()}, {'value': -123456})
+_field_benchmarks('DoubleField', {'value': destructify.DoubleField()}, {'value': 3.14})
+_field_benchmarks('BitField', {'a': destructify.BitField(3), 'b': destructify.BitField(5)}, {'a': 5, 'b': 17})
+_field_benchmarks('ConstantField', {'value': destructify.ConstantField(b'MAGIC')}, {})
+_field_benchmarks('EnumField', {'value': destructify.EnumField(destructify.IntegerField(1), Color)},
+                  {'value': Color.GREEN})
+_field_benchmarks('StructureField', {'value': destructify.StructureField(Inner)}, {'value': Inner(a=1, b=2)})
+_field_benchmarks('ArrayField', {'value': destructify.ArrayField(destructify.IntegerField(2, 'little'), count=16)},
+                  {'value': list(range(16))})
+_field_benchmarks('ConditionalField', {'flag': destructify.IntegerField(1),
+                                       'value': destructify.ConditionalField(destructify.IntegerField(4, 'little'),
+                                                                             condition='flag')},
+                  {'flag': 1, 'value': 123456})
+_field_benchmarks('SwitchField', {'kind': destructify.IntegerField(1),
+                                  'value': destructify.SwitchField({1: destructify.IntegerField(4, 'little')},
+                                                                   switch='kind')},
+                  {'kind': 1, 'value': 123456})
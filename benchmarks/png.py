@@ -0,0 +1,53 @@
+"""Macro-benchmarks that parse and re-serialize synthetic PNG files using the structures in ``examples/png.py``."""
+
+import importlib.util
+import os
+import struct
+import zlib
+
+from . import Workload, benchmark
+
+
+def _load_example():
+    path = os.path.join(os.path.dirname(__file__), os.pardir, 'examples', 'png.py')
+    spec = importlib.util.spec_from_file_location('_png_example', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+png = _load_example()
+
+
+def _chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def synthetic_png(text_chunks=16, data_chunks=32, data_size=8192):
+    """Creates a valid PNG file with a header, palette, physical dimensions, several text chunks and several image data
+    chunks. The image data is not meaningful, but this does not matter for parsing the chunk structure.
+    """
+    chunks = [
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', 256, 256, 8, 3, 0, 0, 0)),
+        _chunk(b'PLTE', bytes(range(256)) * 3),
+        _chunk(b'pHYs', struct.pack('>IIB', 2835, 2835, 1)),
+    ]
+    chunks += [_chunk(b'tEXt', b'Comment\0' + 'text {}'.format(i).encode('latin1')) for i in range(text_chunks)]
+    chunks += [_chunk(b'IDAT', bytes(i % 256 for i in range(data_size))) for _ in range(data_chunks)]
+    chunks.append(_chunk(b'IEND', b''))
+    return b'\x89PNG\r\n\x1a\n' + b''.join(chunks), len(chunks)
+
+
+@benchmark('parse', 'PNG')
+def png_parse():
+    data, chunks = synthetic_png()
+    return Workload(lambda: png.PngFile.from_bytes(data), chunks, len(data))
+
+
+@benchmark('write', 'PNG')
+def png_write():
+    data, chunks = synthetic_png()
+    png_file = png.PngFile.from_bytes(data)
+    if png_file.to_bytes() != data:
+        raise AssertionError("Writing the PNG file did not return the original file")
+    return Workload(png_file.to_bytes, chunks, len(data))
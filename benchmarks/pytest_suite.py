@@ -0,0 +1,19 @@
+"""Runs the benchmarks using pytest-benchmark, e.g. ``pytest benchmarks/pytest_suite.py --benchmark-autosave``. These
+are skipped if pytest-benchmark is not installed. This module is not named ``test*.py``, so it is not collected by the
+test discovery of the test suite.
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks import REGISTRY, load_all  # noqa: E402
+
+load_all()
+
+
+@pytest.mark.parametrize("bench", REGISTRY, ids=lambda bench: "{}/{}".format(bench.group, bench.name))
+def test_benchmark(benchmark, bench):
+    workload = bench.setup()
+    benchmark.extra_info.update(records=workload.records, nbytes=workload.nbytes)
+    benchmark(workload.func)
@@ -0,0 +1,231 @@
+"""Benchmarks of structure-level features: nesting, lazy fields, raw capturing, projections, predicates, slots,
+writing into buffers and writing many records.
+"""
+
+import io
+
+import destructify
+from destructify import this
+
+from . import Workload, benchmark, instance_size
+
+RECORDS = 1000
+# every nested record contains 23 structures
+NESTED_RECORDS = 100
+
+
+class Point(destructify.Structure):
+    x = destructify.IntegerField(2, 'little', signed=True)
+    y = destructify.IntegerField(2, 'little', signed=True)
+
+
+class Polygon(destructify.Structure):
+    count = destructify.IntegerField(1)
+    points = destructify.ArrayField(destructify.StructureField(Point), count='count')
+
+
+class Drawing(destructify.Structure):
+    name = destructify.StringField(terminator=b'\0', encoding='utf-8')
+    polygons = destructify.ArrayField(destructify.StructureField(Polygon), count=4)
+
+
+class Blob(destructify.Structure):
+    kind = destructify.IntegerField(1)
+    length = destructify.IntegerField(2, 'little')
+    payload = destructify.BytesField(length='length', lazy=True)
+    tail = destructify.IntegerField(4, 'little')
+
+
+class CapturedBlob(destructify.Structure):
+    kind = destructify.IntegerField(1)
+    length = destructify.IntegerField(2, 'little')
+    payload = destructify.BytesField(length='length')
+    tail = destructify.IntegerField(4, 'little')
+
+    class Meta:
+        capture_raw = True
+
+
+class Bits(destructify.Structure):
+    a = destructify.BitField(1)
+    b = destructify.BitField(3)
+    c = destructify.BitField(4)
+    d = destructify.BitField(12)
+    e = destructify.BitField(4, realign=True)
+
+
+class Pair(destructify.Structure):
+    a = destructify.IntegerField(1)
+    b = destructify.IntegerField(2, 'little')
+
+
+class SlottedPair(destructify.Structure):
+    a = destructify.IntegerField(1)
+    b = destructify.IntegerField(2, 'little')
+
+    class Meta:
+        slots = True
+
+
+class Packet(destructify.Structure):
+    header = destructify.StructField('>HHI', multibyte=True)
+    flags = destructify.IntegerField(1)
+    checksum = destructify.StructField('>I', multibyte=False)
+
+
+def _drawing():
+    polygons = [Polygon(points=[Point(x=i, y=-i) for i in range(n)]) for n in (3, 4, 5, 6)]
+    return Drawing(name='drawing', polygons=polygons)
+
+
+def _blobs(structure, size=4096):
+    records = [structure(kind=i % 10, payload=bytes(size), tail=i).to_bytes() for i in range(RECORDS)]
+    return b''.join(records)
+
+
+def _parse_records(structure, buffer, touch=None, records=RECORDS, **kwargs):
+    # lazy fields do not necessarily leave the stream at the end of the record, so we seek explicitly
+    def parse():
+        stream = io.BytesIO(buffer)
+        offset = 0
+        for _ in range(records):
+            result, consumed = structure.from_stream(stream, **kwargs)
+            if touch is not None:
+                touch(result)
+            offset += consumed
+            stream.seek(offset)
+    return Workload(parse, records, len(buffer))
+
+
+@benchmark('parse', 'nested')
+def nested_parse():
+    return _parse_records(Drawing, _drawing().to_bytes() * NESTED_RECORDS, records=NESTED_RECORDS)
+
+
+@benchmark('write', 'nested')
+def nested_write():
+    drawing = _drawing()
+    size = len(drawing.to_bytes())
+
+    def write():
+        stream = io.BytesIO()
+        for _ in range(NESTED_RECORDS):
+            drawing.to_stream(stream)
+    return Workload(write, NESTED_RECORDS, size * NESTED_RECORDS)
+
+
+@benchmark('write', 'nested[capture_raw]')
+def nested_write_captured():
+    data = _drawing().to_bytes()
+    drawing = Drawing.from_stream(io.BytesIO(data), destructify.ParsingContext(capture_raw=True))[0]
+    # the first polygon is changed, so only the others are written using their captured bytes
+    drawing.polygons[0].points[0].x = 100
+
+    def write():
+        stream = io.BytesIO()
+        for _ in range(NESTED_RECORDS):
+            drawing.to_stream(stream)
+    return Workload(write, NESTED_RECORDS, len(data) * NESTED_RECORDS)
+
+
+@benchmark('parse', 'lazy')
+def lazy_parse():
+    return _parse_records(Blob, _blobs(Blob))
+
+
+@benchmark('parse', 'lazy[resolved]')
+def lazy_parse_resolved():
+    return _parse_records(Blob, _blobs(Blob), touch=lambda blob: len(blob.payload.__wrapped__))
+
+
+@benchmark('parse', 'capture_raw')
+def capture_raw_parse():
+    return _parse_records(CapturedBlob, _blobs(CapturedBlob))
+
+
+@benchmark('parse', 'only')
+def only_parse():
+    return _parse_records(CapturedBlob, _blobs(CapturedBlob), only={'tail'})
+
+
+@benchmark('parse', 'iter_stream[where]')
+def where_parse():
+    buffer = _blobs(CapturedBlob)
+
+    def parse():
+        for _ in CapturedBlob.iter_stream(io.BytesIO(buffer), where=this.kind == 0):
+            pass
+    return Workload(parse, RECORDS, len(buffer))
+
+
+@benchmark('write', 'to_bytes')
+def packet_to_bytes():
+    packet = Packet(header=(1, 2, 3), flags=4, checksum=5)
+
+    def write():
+        for _ in range(RECORDS):
+            packet.to_bytes()
+    return Workload(write, RECORDS, packet.byte_size() * RECORDS)
+
+
+@benchmark('write', 'to_buffer')
+def packet_to_buffer():
+    packet = Packet(header=(1, 2, 3), flags=4, checksum=5)
+    size = packet.byte_size()
+    buffer = bytearray(size * RECORDS)
+
+    def write():
+        for i in range(RECORDS):
+            packet.to_buffer(buffer, i * size)
+    return Workload(write, RECORDS, size * RECORDS)
+
+
+@benchmark('write', 'write_many')
+def drawings_write_many():
+    drawings = [_drawing() for _ in range(NESTED_RECORDS)]
+    size = sum(len(drawing.to_bytes()) for drawing in drawings)
+
+    def write():
+        Drawing.write_many(drawings, io.BytesIO())
+    return Workload(write, NESTED_RECORDS, size)
+
+
+@benchmark('write', 'write_many[fixed]')
+def pairs_write_many():
+    pairs = [Pair(a=i % 256, b=i) for i in range(RECORDS)]
+
+    def write():
+        Pair.write_many(pairs, io.BytesIO())
+    return Workload(write, RECORDS, len(Pair) * RECORDS)
+
+
+@benchmark('parse', 'BitStream')
+def bits_parse():
+    return _parse_records(Bits, Bits(a=1, b=5, c=9, d=1000, e=3).to_bytes() * RECORDS)
+
+
+@benchmark('write', 'BitStream')
+def bits_write():
+    bits = Bits(a=1, b=5, c=9, d=1000, e=3)
+    size = len(bits.to_bytes())
+
+    def write():
+        stream = io.BytesIO()
+        for _ in range(RECORDS):
+            bits.to_stream(stream)
+    return Workload(write, RECORDS, size * RECORDS)
+
+
+@instance_size('instance', 'Structure')
+def pair_size():
+    return lambda: Pair.from_bytes(b'\x01\x02\x03', keep_context=False)
+
+
+@instance_size('instance', 'Structure[slots]')
+def slotted_pair_size():
+    return lambda: SlottedPair.from_bytes(b'\x01\x02\x03', keep_context=False)
+
+
+@instance_size('instance', 'Structure[context]')
+def pair_context_size():
+    return lambda: Pair.from_bytes(b'\x01\x02\x03')
@@ -7,10 +7,22 @@ class NOT_PROVIDED(metaclass=_NOT_PROVIDED_META):
     pass
 
 
+class _UNLOADED_META(type):
+    def __repr__(self):
+        return "UNLOADED"
+
+
+class UNLOADED(metaclass=_UNLOADED_META):
+    """Value of fields that were not loaded, because they were not requested in a projection."""
+    pass
+
+
 from destructify.parsing import *
 from destructify.fields import *
 from destructify.structures import *
 from destructify import gui
+from destructify import parallel
+from destructify import profiling
 
 
 __version__ = '0.2.0'
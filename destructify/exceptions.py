@@ -30,6 +30,10 @@ class WrongMagicError(ParseError):
     pass
 
 
+class WrongChecksumError(ParseError):
+    pass
+
+
 class WriteError(DestructifyError):
     pass
 
@@ -8,6 +8,20 @@ from ..exceptions import ImpossibleToCalculateLengthError, DefinitionError
 from ..parsing.expression import Expression
 
 
+def _takes_context(var):
+    """Returns whether :func:`_retrieve_property` would pass the context to *var*, i.e. whether *var* is a callable
+    that has at least one parameter.
+    """
+    if not callable(var):
+        return False
+    if isinstance(var, Expression):
+        return True
+    try:
+        return len(inspect.signature(var).parameters) > 0
+    except (TypeError, ValueError):
+        return True
+
+
 def _retrieve_property(context, var, special_case_str=True):
     """Retrieves a property:
 
@@ -26,6 +40,34 @@ def _retrieve_property(context, var, special_case_str=True):
         return var
 
 
+class Deferred:
+    """A value that is only known after later fields have been written, such as the length or offset of a field that
+    follows it. It can be used as :attr:`Field.override`. :meth:`Structure.to_stream` writes a placeholder of
+    ``len(field)`` bytes instead, and writes the actual value in its place once the field named *after* has been
+    written, or once all fields have been written if *after* is :const:`None`.
+
+    :param resolve: A callable taking a :attr:`ParsingContext.f` object, returning the actual value.
+    :param str after: The name of the field that must be written before the value can be resolved.
+    """
+
+    def __init__(self, resolve, after=None):
+        self.resolve = resolve
+        self.after = after
+
+    def __repr__(self):
+        return "<{}: after {}>".format(self.__class__.__name__, self.after)
+
+    @classmethod
+    def length_of(cls, name):
+        """Returns a :class:`Deferred` resolving to the written length of the field *name*."""
+        return cls(lambda c: c._context.fields[name].length, after=name)
+
+    @classmethod
+    def offset_of(cls, name):
+        """Returns a :class:`Deferred` resolving to the offset the field *name* was written at."""
+        return cls(lambda c: c._context.fields[name].offset, after=name)
+
+
 @total_ordering
 class Field:
     """A basic field is incapable of parsing or writing anything, as it is intended to be subclassed."""
@@ -73,6 +115,9 @@ class Field:
     def with_name(self, name):
         """Context manager that yields this :class:`Field` with a different name. If `name` is :const:`None`, this is
         ignored.
+
+        Note that this modifies the field itself, which is shared by all parses of the :class:`Structure`. It is
+        therefore not safe to use while parsing concurrently; use :attr:`ParsingContext.current_field_name` instead.
         """
         old_name = self.name
         if name is not None:
@@ -273,7 +318,7 @@ class Field:
     def seek_start(self, stream, context, offset):
         """This is called before the field is parsed/written. It should expect the stream to be aligned to the ending
         of the previous field. It is intended to seek its starting position. This makes sense if the offset is set, for
-        instance. In the case this stream is not tellable and no seek is performed, *offset* is returned unmodified.
+        instance. If no seek is performed, the current position of the stream is returned.
 
         Note that the *relative* offset is passed in, but the *absolute* offset is expected as a result.
 
@@ -282,6 +327,24 @@ class Field:
         :param int offset: The current relative offset in the stream
         :return: The new absolute offset in the stream
         """
+        new_offset = self._seek_position(stream, context, offset)
+        if new_offset is None:
+            return stream.tell()
+        return new_offset
+
+    def _seek_start(self, stream, context, offset):
+        """Variant of :meth:`seek_start` that is used while parsing and writing structures. It returns :const:`None`
+        if the stream was not moved, as the caller keeps track of the current position itself, avoiding a call to
+        :func:`tell` for every field. Subclasses that override :meth:`seek_start` are still called.
+        """
+        if type(self).seek_start is not Field.seek_start:
+            return self.seek_start(stream, context, offset)
+        return self._seek_position(stream, context, offset)
+
+    def _seek_position(self, stream, context, offset):
+        """Implements :attr:`offset`, :attr:`skip` and :attr:`StructureOptions.alignment`, returning the new absolute
+        offset, or :const:`None` if the stream was not moved.
+        """
         if self.offset is not None:
             offset = _retrieve_property(context, self.offset)
             if offset is not None:
@@ -301,11 +364,7 @@ class Field:
             if offset % alignment != 0:
                 return stream.seek(alignment - (offset % alignment), io.SEEK_CUR)
 
-        # attempt to return the current position if available.
-        try:
-            return stream.tell()
-        except (OSError, AttributeError):
-            return offset
+        return None
 
     def seek_end(self, stream, context, offset):
         """This is called when the field is lazy and we need to find the end of the field. This is *not* called
@@ -2,12 +2,23 @@ import io
 import math
 from functools import partialmethod
 
-from . import Field
+from . import Field, Deferred
 from .. import Substream
 from ..exceptions import DefinitionError, WriteError, StreamExhaustedError, ImpossibleToCalculateLengthError, ParseError
 from ..parsing.streams import BitStream
 
 
+def _write_parts(stream, value, suffix):
+    """Writes *value* followed by *suffix*. Large values are written separately from the suffix, rather than being
+    copied into a new bytes object.
+    """
+    if not suffix:
+        return stream.write(value)
+    if len(value) < io.DEFAULT_BUFFER_SIZE:
+        return stream.write(bytes(value) + suffix)
+    return stream.write(value) + stream.write(suffix)
+
+
 class BytesField(Field):
     def __init__(self, *args, length=None, terminator=None, step=1, terminator_handler='consume',
                  strict=True, padding=None, **kwargs):
@@ -107,38 +118,44 @@ class BytesField(Field):
     def _to_stream_fixed_length(self, stream, value, context):
         length = self.get_length(context)
 
+        # the bytes following the value are kept separately, so a large value does not need to be copied
+        suffix = b""
         if self.terminator is not None:
             # We can expect the consume and include handlers here.
             if self.terminator_handler == 'consume':
-                value += self.terminator
+                suffix = self.terminator
             elif self.terminator_handler == 'include' and not value.endswith(self.terminator) and self.strict:
                 raise WriteError("The field {} does not include its terminator.".format(self.full_name))
 
-        if length < 0:
-            # For negative lengths, we just write to the stream
-            return stream.write(value)
+        if isinstance(length, Deferred) or length < 0:
+            # For negative lengths, or lengths that are written after this field, we just write to the stream
+            return _write_parts(stream, value, suffix)
 
-        if len(value) < length:
+        total = len(value) + len(suffix)
+        if total < length:
             if self.padding is not None:
-                remaining = length - len(value)
+                remaining = length - total
 
                 if self.strict and remaining % len(self.padding) != 0:
                     raise WriteError("The field %s must be padded, but the remaining bytes %d are not a multiple of %d." %
                                      (self.full_name, remaining, len(self.padding)))
 
                 # slicing for paddings longer than 1 byte
-                value = (value + self.padding * remaining)[:length]
+                suffix = (suffix + self.padding * remaining)[:length - len(value)]
             elif self.strict:
                 raise WriteError("The contents of %s are %d long, but expecting %d." %
-                                 (self.full_name, len(value), length))
-        elif len(value) > length:
+                                 (self.full_name, total, length))
+        elif total > length:
             if self.strict:
                 raise WriteError("The contents of %s are %d long, but expecting %d." %
-                                 (self.full_name, len(value), length))
+                                 (self.full_name, total, length))
 
-            value = value[:length]
+            if len(value) > length:
+                value, suffix = memoryview(value)[:length], b""
+            else:
+                suffix = suffix[:length - len(value)]
 
-        return stream.write(value)
+        return _write_parts(stream, value, suffix)
 
     def _from_stream_terminated(self, stream, context):
         read = b""
@@ -174,7 +191,7 @@ class BytesField(Field):
 
     def _to_stream_terminated(self, stream, value, context):
         if self.terminator_handler == 'consume':
-            return stream.write(value + self.terminator)
+            return _write_parts(stream, value, self.terminator)
         elif self.terminator_handler == 'include':
             if not value.endswith(self.terminator) and self.strict:
                 raise WriteError("The field {} does not include its terminator.".format(self.full_name))
@@ -255,10 +272,7 @@ class BitField(FixedLengthField):
             if not isinstance(prev_field, BitField) or prev_field.realign:
                 return super().seek_start(stream, context, offset)
 
-        try:
-            return stream.tell()
-        except (OSError, AttributeError):
-            return offset
+        return None
 
     def seek_end(self, stream, context, offset):
         return None
@@ -375,6 +389,7 @@ class StructureField(Field):
     def seek_end(self, stream, context, offset):
         if self.length is not None:
             return stream.seek(self.get_length(context), io.SEEK_CUR)
+        return super().seek_end(stream, context, offset)
 
     def from_stream(self, stream, context):
         length = None
@@ -382,7 +397,7 @@ class StructureField(Field):
             length = self.get_length(context)
 
         substream = Substream(stream, length=length)
-        subcontext = context.fields[self.name].create_subcontext(stream=substream)
+        subcontext = context.get_field_context(self).create_subcontext(stream=substream)
 
         res, consumed = self.structure.from_stream(substream, context=subcontext)
 
@@ -399,9 +414,12 @@ class StructureField(Field):
         length = None
         if self.length is not None:
             length = self.get_length(context)
+            if isinstance(length, Deferred):
+                # the length is written after the structure
+                length = None
 
         substream = Substream(stream, length=length)
-        subcontext = context.fields[self.name].create_subcontext(stream=substream)
+        subcontext = context.get_field_context(self).create_subcontext(stream=substream)
         written = value.to_stream(substream, subcontext)
 
         if length is not None and written < length:
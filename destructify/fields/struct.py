@@ -2,6 +2,7 @@ import struct
 
 from destructify.exceptions import DefinitionError
 from . import FixedLengthField
+from ..parsing.streams import BufferStream
 
 
 BYTE_ORDER_MAPPING = {
@@ -74,6 +75,9 @@ class StructField(FixedLengthField):
     def to_stream(self, stream, value, context):
         if value is None:
             value = 0
+        if type(stream) is BufferStream:
+            # pack directly into the buffer
+            return stream.pack_into(self._struct, *value) if self.multibyte else stream.pack_into(self._struct, value)
         if self.multibyte:
             return super().to_stream(stream, self._struct.pack(*value), context)
         return super().to_stream(stream, self._struct.pack(value), context)
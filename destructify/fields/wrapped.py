@@ -1,11 +1,16 @@
+import bz2
+import hashlib
 import io
 import itertools
+import lzma
+import zlib
 from functools import partialmethod
 
-from . import Field, FixedLengthField
-from ..structures.base import _recapture
-from ..parsing import Substream
-from ..exceptions import DefinitionError, StreamExhaustedError, ParseError, WriteError, WrongMagicError
+from . import Field, FixedLengthField, Deferred
+from ..structures.base import _reraise
+from ..parsing import Substream, DecompressingStream, CompressingStream, DigestStream
+from ..exceptions import DefinitionError, StreamExhaustedError, ParseError, WriteError, WrongMagicError, \
+    WrongChecksumError
 
 
 class WrappedFieldMixin(object):
@@ -131,9 +136,13 @@ class ArrayField(WrappedFieldMixin, Field):
             count = self.get_count(context)
         elif self.length is not None:
             length = self.get_length(context)
+            if isinstance(length, Deferred):
+                # the length is written after the array
+                length = None
 
         substream = Substream(stream, length=length if length is not None and length >= 0 else None)
-        subcontext = context.fields[self.name].create_subcontext(stream=substream, flat=True)
+        subcontext = context.get_field_context(self).create_subcontext(stream=substream, flat=True)
+        profiler, listener = subcontext.profiler, subcontext.listener
 
         for i in itertools.count():
             if count is not None:
@@ -149,17 +158,33 @@ class ArrayField(WrappedFieldMixin, Field):
                 pass
 
             # Create a new 'field' with a different name, and set it in our context
-            subcontext.fields[i] = self.base_field.field_context(subcontext, field_name=i)
+            subcontext.fields[i] = self.base_field.field_context(subcontext, field_name=i,
+                                                                 projection=subcontext.projection)
+            subcontext.current_field_name = i
 
             try:
-                with self.base_field.with_name(i) as field_instance:
-                    with _recapture(ParseError(f"Error while seeking the start of item {i} in field {self}")):
-                        offset = field_instance.seek_start(substream, subcontext, total_consumed)
-
-                    with _recapture(ParseError(f"Error while parsing item {i} in field {self}")):
-                        res, consumed = field_instance.decode_from_stream(substream, subcontext)
+                try:
+                    offset = self.base_field._seek_start(substream, subcontext, total_consumed)
+                except Exception as e:
+                    _reraise(e, ParseError, "Error while seeking the start of item {} in field {}", i, self)
+                if offset is None:
+                    offset = total_consumed
+                elif profiler is not None:
+                    profiler.seek(self.base_field)
+                if listener is not None:
+                    listener.field_start(subcontext.fields[i], offset)
+
+                try:
+                    if profiler is None:
+                        res, consumed = self.base_field.decode_from_stream(substream, subcontext)
+                    else:
+                        res, consumed = profiler.decode(self.base_field, substream, subcontext)
+                except Exception as e:
+                    _reraise(e, ParseError, "Error while parsing item {} in field {}", i, self)
 
                 subcontext.fields[i].add_parse_info(value=res, offset=offset, length=consumed)
+                if listener is not None:
+                    listener.field_end(subcontext.fields[i])
 
             except StreamExhaustedError:
                 if length is not None and length < 0:
@@ -177,6 +202,7 @@ class ArrayField(WrappedFieldMixin, Field):
             if self.until is not None and self.until(subcontext, res):
                 break
 
+        subcontext.current_field_name = None
         return result, total_consumed
 
     def to_stream(self, stream, value, context):
@@ -193,22 +219,40 @@ class ArrayField(WrappedFieldMixin, Field):
             length = self.get_length(context)
 
         substream = Substream(stream, length=length if length is not None and length >= 0 else None)
-        subcontext = context.fields[self.name].create_subcontext(stream=substream, flat=True)
+        subcontext = context.get_field_context(self).create_subcontext(stream=substream, flat=True)
+        profiler, listener = subcontext.profiler, subcontext.listener
 
         for i, val in enumerate(value):
             # Create a new 'field' with a different name, and set it in our context
             subcontext.fields[i] = self.base_field.field_context(subcontext, field_name=i, value=val)
+            subcontext.current_field_name = i
 
-            with self.base_field.with_name(i) as field_instance:
-                with _recapture(WriteError(f"Error while seeking the start of item {i} in field {self}")):
-                    offset = field_instance.seek_start(substream, subcontext, total_written)
+            try:
+                offset = self.base_field._seek_start(substream, subcontext, total_written)
+            except Exception as e:
+                _reraise(e, WriteError, "Error while seeking the start of item {} in field {}", i, self)
+            if offset is None:
+                offset = total_written
+            elif profiler is not None:
+                profiler.seek(self.base_field)
+            if listener is not None:
+                listener.field_start(subcontext.fields[i], offset)
 
-                with _recapture(WriteError(f"Error while parsing item {i} in field {self}")):
-                    written = field_instance.encode_to_stream(substream, val, subcontext)
+            try:
+                if profiler is None:
+                    written = self.base_field.encode_to_stream(substream, val, subcontext)
+                else:
+                    written = profiler.encode(self.base_field, substream, val, subcontext)
+            except Exception as e:
+                _reraise(e, WriteError, "Error while parsing item {} in field {}", i, self)
 
             subcontext.fields[i].add_parse_info(offset=offset, length=written)
+            if listener is not None:
+                listener.field_end(subcontext.fields[i])
             total_written += written
 
+        subcontext.current_field_name = None
+
         if length is not None and total_written < length:
             raise WriteError(f"Only {total_written} bytes written in {self.name}, expected {length}.")
 
@@ -297,3 +341,193 @@ class PseudoMemberEnumMixin:
             return '%s.%s' % (cls.__name__, self._name_)
         else:
             return '%s.%r' % (cls.__name__, self._value_)
+
+
+class CompressedField(WrappedFieldMixin, Field):
+    COMPRESSIONS = {
+        'zlib': (zlib.decompressobj, zlib.compressobj),
+        'deflate': (lambda: zlib.decompressobj(-zlib.MAX_WBITS),
+                    lambda: zlib.compressobj(wbits=-zlib.MAX_WBITS)),
+        'gzip': (lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+                 lambda: zlib.compressobj(wbits=16 + zlib.MAX_WBITS)),
+        'lzma': (lzma.LZMADecompressor, lzma.LZMACompressor),
+        'bz2': (bz2.BZ2Decompressor, bz2.BZ2Compressor),
+    }
+
+    def __init__(self, base_field, compression='zlib', *args, length=None, **kwargs):
+        self.compression = compression
+        self.length = length
+
+        if isinstance(compression, str):
+            if compression not in self.COMPRESSIONS:
+                raise DefinitionError("Unknown compression {} for {}".format(compression, self.__class__.__name__))
+            self.decompressor, self.compressor = self.COMPRESSIONS[compression]
+        else:
+            self.decompressor, self.compressor = compression
+
+        super().__init__(base_field, *args, **kwargs)
+
+    def initialize(self):
+        """Overrides the content of the length field if possible."""
+
+        super().initialize()
+
+        if isinstance(self.length, str):
+            related_field = self.bound_structure._meta.get_field_by_name(self.length)
+            if not related_field.has_override:
+                related_field.override = lambda c, v: self._compressed_length(c[self.name], c._context)
+
+    get_length = partialmethod(Field._get_property, 'length')
+
+    def _compressed_length(self, value, context):
+        # the value is compressed twice this way, but the length must be known before it is written
+        stream = CompressingStream(io.BytesIO(), self.compressor())
+        self.base_field.encode_to_stream(stream, value, context)
+        return stream.finish()
+
+    def seek_end(self, stream, context, offset):
+        if self.length is not None:
+            return stream.seek(self.get_length(context), io.SEEK_CUR)
+
+    def from_stream(self, stream, context):
+        length = None
+        if self.length is not None:
+            length = self.get_length(context)
+
+        decompressed = DecompressingStream(stream, self.decompressor(), length=length)
+        value, _ = self.base_field.decode_from_stream(decompressed, context)
+        consumed = decompressed.finish()
+
+        if length is not None:
+            if decompressed.consumed < length:
+                stream.seek(length - decompressed.consumed, io.SEEK_CUR)
+            consumed = length
+        elif decompressed.consumed > consumed:
+            # we have read beyond the end of the compressed data
+            stream.seek(consumed - decompressed.consumed, io.SEEK_CUR)
+
+        return value, consumed
+
+    def to_stream(self, stream, value, context):
+        compressed = CompressingStream(stream, self.compressor())
+        self.base_field.encode_to_stream(compressed, value, context)
+        written = compressed.finish()
+
+        length = self.get_length(context) if self.length is not None else None
+        if length is not None and not isinstance(length, Deferred):
+            if length < written:
+                raise WriteError("The compressed contents of {} are {} long, but expecting {}."
+                                 .format(self.full_name, written, length))
+            elif written < length:
+                stream.seek(length - written, io.SEEK_CUR)
+                written = length
+
+        return written
+
+
+class _ZlibChecksum:
+    """Wraps :func:`zlib.crc32` and :func:`zlib.adler32` in the interface of a :mod:`hashlib` object."""
+
+    def __init__(self, function, initial):
+        self.function = function
+        self.value = initial
+
+    def update(self, data):
+        self.value = self.function(data, self.value)
+
+    def digest(self):
+        return self.value
+
+
+class ChecksumField(WrappedFieldMixin, Field):
+    ALGORITHMS = {
+        'crc32': lambda: _ZlibChecksum(zlib.crc32, 0),
+        'adler32': lambda: _ZlibChecksum(zlib.adler32, 1),
+    }
+
+    def __init__(self, base_field, fields, algorithm='crc32', *args, verify=True, **kwargs):
+        self.digest_fields = list(fields)
+        self.algorithm = algorithm
+        self.verify = verify
+
+        if not self.digest_fields:
+            raise DefinitionError("{} must specify at least one field".format(self.__class__.__name__))
+        if isinstance(algorithm, str) and algorithm not in self.ALGORITHMS and \
+                algorithm not in hashlib.algorithms_available:
+            raise DefinitionError("Unknown algorithm {} for {}".format(algorithm, self.__class__.__name__))
+
+        super().__init__(base_field, *args, **kwargs)
+
+    def initialize(self):
+        super().initialize()
+
+        names = [field.name for field in self.bound_structure._meta.fields]
+        for name in self.digest_fields:
+            if name not in names or names.index(name) >= names.index(self.name):
+                raise DefinitionError("The field {} of {} must be a field preceding it".format(name, self.full_name))
+
+        # the bytes from the first to the last field are used when the digest is calculated by reading them again
+        first = names.index(self.digest_fields[0])
+        if self.digest_fields != names[first:first + len(self.digest_fields)]:
+            raise DefinitionError("The fields of {} must be consecutive fields of the structure, in order"
+                                  .format(self.full_name))
+
+    def __len__(self):
+        return len(self.base_field)
+
+    @property
+    def stream_wrappers(self):
+        return {DigestStream} | set(self.base_field.stream_wrappers)
+
+    def create_digest(self):
+        """Returns a new digest object, which has an ``update(data)`` and ``digest()`` method."""
+        if callable(self.algorithm):
+            return self.algorithm()
+        elif self.algorithm in self.ALGORITHMS:
+            return self.ALGORITHMS[self.algorithm]()
+        return hashlib.new(self.algorithm)
+
+    def calculate(self, stream, context):
+        """Returns the checksum of the fields in :attr:`digest_fields`. This uses the digest that was calculated by
+        the :class:`DigestStream` while the fields were read or written. If it does not cover exactly these fields,
+        e.g. because one of them is lazy, the fields are read again from the stream.
+        """
+        first = context.fields[self.digest_fields[0]]
+        last = context.fields[self.digest_fields[-1]]
+        start, stop = first.offset, last.offset + last.length
+
+        digest_stream = context.stream
+        while digest_stream is not None and not isinstance(digest_stream, DigestStream):
+            digest_stream = getattr(digest_stream, 'raw', None)
+        running = digest_stream.digests.get(self.name) if digest_stream is not None else None
+        if running is not None and running.start == start and running.stop == stop:
+            return running.digest.digest()
+
+        digest = self.create_digest()
+        current_offset = stream.tell()
+        stream.seek(start)
+        try:
+            remaining = stop - start
+            while remaining > 0:
+                data = stream.read(min(remaining, io.DEFAULT_BUFFER_SIZE))
+                if not data:
+                    raise StreamExhaustedError("Could not read the data of the checksum {}".format(self.full_name))
+                digest.update(data)
+                remaining -= len(data)
+        finally:
+            stream.seek(current_offset)
+        return digest.digest()
+
+    def from_stream(self, stream, context):
+        value, length = self.base_field.decode_from_stream(stream, context)
+
+        if self.verify and value != self.calculate(stream, context):
+            raise WrongChecksumError("The checksum of {} does not match".format(self.full_name))
+
+        return value, length
+
+    def to_stream(self, stream, value, context):
+        if not self.has_override:
+            value = self.calculate(stream, context)
+            context.get_field_context(self).value = value
+        return self.base_field.encode_to_stream(stream, value, context)
@@ -0,0 +1,306 @@
+import collections
+import concurrent.futures
+import contextlib
+import enum
+import functools
+import gc
+import io
+import mmap
+import os
+
+from .exceptions import ImpossibleToCalculateLengthError, ParseError
+from .parsing import ParsingContext, Substream
+from .structures import Structure
+
+
+__all__ = ['parse_file', 'parse_many', 'to_payload', 'find_boundaries', 'gc_paused']
+
+# Fields with a static length of at most this many bytes are decoded while scanning for record boundaries, as they
+# are likely to be referenced by other fields (e.g. a length prefix). Larger fields are seeked over.
+_SCAN_DECODE_LIMIT = 64
+
+
+class _BufferReader:
+    """Minimal read-only stream over a buffer, such as a :class:`mmap.mmap`. Contrary to :class:`io.BytesIO`, this
+    does not copy the buffer, so all workers share the same pages of the mapped file.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._position = 0
+
+    def _end(self, size):
+        if size is None or size < 0:
+            return len(self._buffer)
+        return min(len(self._buffer), self._position + size)
+
+    def read(self, size=-1):
+        end = self._end(size)
+        result = self._buffer[self._position:end]
+        self._position = max(self._position, end)
+        return result
+
+    read1 = read
+
+    def peek(self, size=1):
+        return self._buffer[self._position:self._end(max(size, 1))]
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._buffer) + offset
+        else:
+            raise ValueError("unsupported whence value")
+        if position < 0:
+            raise ValueError("negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+
+def to_payload(structure):
+    """Converts a :class:`Structure` to a compact, picklable payload: a tuple of its field values in definition order.
+    Nested structures and lists are converted recursively, and lazy values are resolved. This is the default conversion
+    used by :func:`parse_file`.
+    """
+    return tuple(_to_payload_value(getattr(structure, field.name)) for field in structure._meta.fields)
+
+
+def _to_payload_value(value):
+    if hasattr(value, '__wrapped__'):
+        value = value.__wrapped__
+    if isinstance(value, Structure):
+        return to_payload(value)
+    elif isinstance(value, list):
+        return [_to_payload_value(v) for v in value]
+    elif isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _scan_record(structure, stream):
+    """Determines the length of the record at the current position of the stream without fully decoding it. Only
+    fields with a small static length and fields that are not able to determine their end are decoded. All other
+    fields are seeked over using :meth:`Field.seek_end`.
+    """
+    context = ParsingContext()
+    context.stream = stream = structure._prepare_stream(stream, context)
+    context.initialize_from_meta(structure._meta)
+
+    start_offset = max_offset = offset = stream.tell()
+    for field in structure._meta.fields:
+        new_offset = field._seek_start(stream, context, offset - start_offset)
+        if new_offset is not None:
+            offset = new_offset
+
+        end = None
+        try:
+            decode = len(field) <= _SCAN_DECODE_LIMIT
+        except ImpossibleToCalculateLengthError:
+            decode = False
+        if not decode:
+            end = field.seek_end(stream, context, offset - start_offset)
+
+        if end is None:
+            value, consumed = field.decode_from_stream(stream, context)
+            context.fields[field.name].add_parse_info(value=value, offset=offset, length=consumed)
+            end = offset + consumed
+
+        offset = end
+        max_offset = max(offset, max_offset)
+
+    if structure._meta.length is not None:
+        return structure._meta.length
+    return max_offset - start_offset
+
+
+def find_boundaries(structure, buffer, *, start=0, stop=None, chunk_size=1 << 24, boundary=None):
+    """Splits the range *start*–*stop* of *buffer* into a list of ``(start, stop)`` byte ranges of approximately
+    *chunk_size* bytes, that each hold a whole number of consecutive records of *structure*.
+
+    If the length of *structure* can be calculated, the ranges are simply aligned to the record size. Otherwise, all
+    records are scanned by seeking over fields where possible, or by calling ``boundary(buffer, offset)``, which must
+    return the length of the record at *offset*.
+    """
+    if stop is None:
+        stop = len(buffer)
+
+    record_size = None
+    if boundary is None:
+        try:
+            record_size = len(structure)
+        except ImpossibleToCalculateLengthError:
+            pass
+
+    if record_size:
+        chunk_size = max(1, chunk_size // record_size) * record_size
+        return [(i, min(i + chunk_size, stop)) for i in range(start, stop, chunk_size)]
+
+    ranges = []
+    reader = _BufferReader(buffer)
+    chunk_start = offset = start
+    while offset < stop:
+        if boundary is not None:
+            length = boundary(buffer, offset)
+        else:
+            reader.seek(offset)
+            length = _scan_record(structure, Substream(reader, offset, stop))
+        if length <= 0:
+            raise ParseError("Record of {} at offset {} has no length".format(structure._meta.structure_name, offset))
+
+        offset += length
+        if offset - chunk_start >= chunk_size:
+            ranges.append((chunk_start, offset))
+            chunk_start = offset
+
+    if chunk_start < offset:
+        ranges.append((chunk_start, min(offset, stop)))
+    return ranges
+
+
+@contextlib.contextmanager
+def gc_paused(freeze=False):
+    """Context manager that disables the cyclic garbage collector while parsing many records. As parsed structures
+    are freed by reference counting, pausing the collector only avoids the cost of collections that are triggered by
+    the amount of allocated objects, without growing memory.
+
+    If *freeze* is true, :func:`gc.freeze` is called as well, so all objects that exist before parsing are ignored by
+    any collection while paused. As :func:`gc.unfreeze` can not distinguish between frozen objects, nothing is frozen
+    if the application has already frozen objects itself, so these are not unfrozen afterwards.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    frozen = freeze and gc.get_freeze_count() == 0
+    if frozen:
+        gc.freeze()
+    try:
+        yield
+    finally:
+        if frozen:
+            gc.unfreeze()
+        if enabled:
+            gc.enable()
+
+
+def _gc_paused(pause):
+    return gc_paused() if pause else contextlib.ExitStack()
+
+
+def _parse_range(structure, path, start, stop, convert, pause_gc=False):
+    """Worker function: parses all records in the byte range *start*–*stop* of the file at *path*."""
+    results = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer, _gc_paused(pause_gc):
+        substream = Substream(_BufferReader(buffer), start, stop)
+        length = stop - start
+        offset = 0
+        while offset < length:
+            # structures that are returned as is must not refer to the file, which is closed afterwards
+            structure_instance, consumed = structure.from_stream(substream, keep_context=convert is not None)
+            if consumed <= 0:
+                raise ParseError("Record of {} at offset {} has no length".format(structure._meta.structure_name,
+                                                                                  start + offset))
+            offset += consumed
+            substream.seek(offset)
+            results.append(convert(structure_instance) if convert is not None else structure_instance)
+    return results
+
+
+def _iter_results(structure, path, ranges, workers, convert, pause_gc):
+    if workers == 1:
+        for start, stop in ranges:
+            yield from _parse_range(structure, path, start, stop, convert, pause_gc)
+        return
+
+    # We keep a bounded window of outstanding chunks, so results are yielded in order without loading all of them.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        ranges = iter(ranges)
+        for start, stop in ranges:
+            pending.append(executor.submit(_parse_range, structure, path, start, stop, convert, pause_gc))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            results = pending.popleft().result()
+            for start, stop in ranges:
+                pending.append(executor.submit(_parse_range, structure, path, start, stop, convert, pause_gc))
+                break
+            yield from results
+
+
+def parse_file(structure, path, workers=None, *, chunk_size=1 << 24, boundary=None, convert=to_payload,
+               reducer=None, initial=None, pause_gc=False):
+    """Parses a file consisting of consecutive records of *structure* using multiple processes.
+
+    The file is split in byte ranges of roughly *chunk_size* bytes (see :func:`find_boundaries`) that are parsed by a
+    :class:`concurrent.futures.ProcessPoolExecutor`. Each worker maps the file in memory, so the file is shared between
+    the workers rather than copied. As the structure is pickled by reference, it must be importable by the workers.
+
+    Each parsed record is passed through *convert* in the worker, so only compact payloads are transferred back to the
+    main process, rather than entire :class:`Structure` and :class:`ParsingContext` graphs. By default, this is
+    :func:`to_payload`. Set *convert* to :const:`None` to receive the :class:`Structure` objects themselves. These are
+    parsed with ``keep_context=False``, so their lazy fields are resolved and they do not refer to the file anymore
+    (see :meth:`Structure.detach_context`).
+
+    :param structure: The :class:`Structure` to parse the records with.
+    :param path: The path of the file to parse.
+    :param workers: The amount of worker processes. Defaults to the amount of CPUs. If this is 1, the file is parsed
+        in the current process.
+    :param chunk_size: The approximate amount of bytes that are parsed by a worker at once.
+    :param boundary: A callable ``boundary(buffer, offset)`` returning the length of the record at the given offset,
+        used to quickly split files with variable-length records.
+    :param convert: A picklable callable converting a :class:`Structure` to the result, or :const:`None`.
+    :param reducer: If set, the results are reduced in order using ``reducer(accumulator, result)`` and the final
+        value is returned, instead of an iterator over all results.
+    :param initial: The initial value for *reducer*.
+    :param pause_gc: If true, the cyclic garbage collector is paused while parsing a chunk (see :func:`gc_paused`).
+    :return: An iterator over all results in file order, or the reduced value if *reducer* is set.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            ranges = []
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                ranges = find_boundaries(structure, buffer, chunk_size=chunk_size, boundary=boundary)
+
+    results = _iter_results(structure, path, ranges, workers, convert, pause_gc)
+    if reducer is not None:
+        return functools.reduce(reducer, results, initial)
+    return results
+
+
+def _parse_one(structure, data, pause_gc=False):
+    with _gc_paused(pause_gc):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return structure.from_bytes(data)
+        return structure.from_stream(data)[0]
+
+
+def parse_many(structure, inputs, executor=None, *, pause_gc=False):
+    """Parses each of *inputs*, which may be bytes-like objects or streams, with *structure* and returns an iterator
+    over the resulting :class:`Structure` objects in the order of the inputs.
+
+    If *executor* is provided, e.g. a :class:`concurrent.futures.ThreadPoolExecutor`, the inputs are parsed
+    concurrently using that executor. As all parsing state is kept in the :class:`ParsingContext`, the same
+    :class:`Structure` can safely be parsed from multiple threads at once.
+
+    If *pause_gc* is true, the cyclic garbage collector is paused while parsing each input (see :func:`gc_paused`).
+    """
+    func = functools.partial(_parse_one, structure, pause_gc=pause_gc)
+    if executor is None:
+        return map(func, inputs)
+    return executor.map(func, inputs)
@@ -1,3 +1,7 @@
 from .context import *
 from .streams import *
+from .sources import *
+from .compressed import *
+from .segments import *
+from .events import *
 from .expression import this, len_
@@ -0,0 +1,323 @@
+import bisect
+import io
+import json
+import zlib
+
+__all__ = ['SeekableGzipStream', 'DecompressingStream', 'CompressingStream']
+
+
+class _Checkpoint:
+    __slots__ = ('offset', 'compressed_offset', 'decompressor')
+
+    def __init__(self, offset, compressed_offset, decompressor=None):
+        self.offset = offset
+        self.compressed_offset = compressed_offset
+        # None indicates the start of a gzip member, which does not require any state
+        self.decompressor = decompressor
+
+
+class SeekableGzipStream(io.RawIOBase):
+    """A read-only, seekable stream of the decompressed contents of a gzip-compressed stream. While reading, the state
+    of the decompressor is stored every *spacing* decompressed bytes, so seeking to an arbitrary offset only requires
+    decompressing from the nearest checkpoint before it, rather than from the start of the file as with
+    :class:`gzip.GzipFile`.
+
+    The stream can be passed to :meth:`Structure.from_stream` as is, so lazy fields, :attr:`Field.offset` and
+    :class:`Substream` work as they would on the uncompressed data::
+
+        with open("records.gz", "rb") as f:
+            stream = SeekableGzipStream(f, spacing=4 * 1024 * 1024)
+            for record in Record.iter_stream(stream):
+                ...
+
+    Checkpoints within a gzip member hold a copy of the decompressor, which can not be serialized. Resuming a deflate
+    stream from the preceding 32 KiB of decompressed data instead, as ``zran`` does, requires starting at the bit
+    position of a deflate block, which :mod:`zlib` does not support. The index that is written by :meth:`save_index`
+    therefore only contains the starts of the gzip members in the file. For files that consist of many members (e.g.
+    as written by ``bgzip`` or ``pigz --independent``), this allows seeking without reading the file first, but for a
+    file with a single member, a loaded index only provides its :attr:`size`. Data after the last member that does
+    not start a new gzip member, such as zero padding, is ignored.
+
+    :param raw: The compressed stream, which must be seekable.
+    :param int spacing: The amount of decompressed bytes between checkpoints.
+    :param int chunk_size: The amount of compressed bytes that is read from *raw* at once.
+    :param index: A file object to read an index from that was written by :meth:`save_index`.
+    """
+
+    def __init__(self, raw, spacing=1024 * 1024, chunk_size=64 * 1024, index=None):
+        self.raw = raw
+        self.spacing = spacing
+        self.chunk_size = chunk_size
+        try:
+            self._start = self._raw_position = raw.tell()
+        except (AttributeError, OSError):
+            self._start = self._raw_position = 0
+
+        self.size = None
+        self._checkpoints = [_Checkpoint(0, 0)]
+        self._offsets = [0]
+        self._position = 0
+        self._restore(self._checkpoints[0])
+
+        if index is not None:
+            self.load_index(index)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.build_index().size + offset
+        else:
+            raise ValueError("unsupported whence value")
+        if position < 0:
+            raise ValueError("negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        self._move_to(self._position)
+        written = 0
+        while written < len(view):
+            data = self._inflate(len(view) - written)
+            if not data:
+                break
+            view[written:written + len(data)] = data
+            written += len(data)
+        self._position += written
+        return written
+
+    def build_index(self):
+        """Decompresses the remainder of the stream, creating all checkpoints and determining :attr:`size`. Returns the
+        stream itself.
+        """
+        if self.size is None:
+            self._move_to(self._offsets[-1])
+            while self._inflate(self.chunk_size):
+                pass
+        return self
+
+    def save_index(self, fp):
+        """Writes the starts of all gzip members that have been found so far to the provided text file, as JSON. The
+        checkpoints within members are not included, as these can not be serialized.
+        """
+        members = [[c.offset, c.compressed_offset] for c in self._checkpoints if c.decompressor is None]
+        json.dump({'members': members, 'size': self.size}, fp)
+
+    def load_index(self, fp):
+        """Reads an index that was written by :meth:`save_index` from the provided text file."""
+        index = json.load(fp)
+        for offset, compressed_offset in index['members']:
+            self._add_checkpoint(_Checkpoint(offset, compressed_offset))
+        if index['size'] is not None:
+            self.size = index['size']
+
+    def _add_checkpoint(self, checkpoint):
+        i = bisect.bisect(self._offsets, checkpoint.offset)
+        if self._offsets[i - 1] != checkpoint.offset:
+            self._checkpoints.insert(i, checkpoint)
+            self._offsets.insert(i, checkpoint.offset)
+        elif checkpoint.decompressor is None:
+            # the start of a member is preferred, as it is included in the saved index
+            self._checkpoints[i - 1] = checkpoint
+
+    def _restore(self, checkpoint):
+        self._decompressor = checkpoint.decompressor.copy() if checkpoint.decompressor is not None else None
+        self._offset = checkpoint.offset
+        self._compressed_offset = checkpoint.compressed_offset
+        self._input = b""
+
+    def _move_to(self, position):
+        """Moves the decompressor to *position*, restoring the nearest checkpoint if needed."""
+        if position == self._offset:
+            return
+        checkpoint = self._checkpoints[bisect.bisect(self._offsets, position) - 1]
+        if position < self._offset or checkpoint.offset > self._offset:
+            self._restore(checkpoint)
+        while self._offset < position:
+            if not self._inflate(min(position - self._offset, self.chunk_size)):
+                break
+
+    def _inflate(self, size):
+        """Returns at most *size* decompressed bytes from the current state, or no bytes at the end of the stream."""
+        while True:
+            if not self._input:
+                if self._raw_position != self._start + self._compressed_offset:
+                    self.raw.seek(self._start + self._compressed_offset)
+                self._input = self.raw.read(self.chunk_size)
+                self._raw_position = self._start + self._compressed_offset + len(self._input)
+                if not self._input:
+                    if self._decompressor is not None:
+                        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+                    self.size = self._offset
+                    return b""
+
+            if self._decompressor is None:
+                if self._compressed_offset and len(self._input) < 2:
+                    # the input ends right after the previous member
+                    more = self.raw.read(self.chunk_size)
+                    self._input += more
+                    self._raw_position += len(more)
+                if self._compressed_offset and not self._input.startswith(b"\x1f\x8b"):
+                    # data after the last member that is not a gzip member, e.g. zero padding, is ignored
+                    self.size = self._offset
+                    self._input = b""
+                    return b""
+                self._add_checkpoint(_Checkpoint(self._offset, self._compressed_offset))
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+            data = self._decompressor.decompress(self._input, size)
+            if self._decompressor.eof:
+                remaining = self._decompressor.unused_data
+                self._decompressor = None
+            else:
+                remaining = self._decompressor.unconsumed_tail
+            self._compressed_offset += len(self._input) - len(remaining)
+            self._input = remaining
+            self._offset += len(data)
+
+            if self._decompressor is not None and \
+                    self._offset >= self._offsets[bisect.bisect(self._offsets, self._offset) - 1] + self.spacing:
+                self._add_checkpoint(_Checkpoint(self._offset, self._compressed_offset, self._decompressor.copy()))
+            if data:
+                return data
+
+
+class DecompressingStream(io.RawIOBase):
+    """A read-only stream of the data that is decompressed from *raw* while it is read, using a decompressor object
+    such as the one returned by :func:`zlib.decompressobj` or :class:`lzma.LZMADecompressor`. The compressed data is
+    never read as a whole. The stream can only be seeked forwards, which is done by decompressing and discarding the
+    data in between.
+
+    :param raw: The stream to read the compressed data from.
+    :param decompressor: The decompressor object.
+    :param int length: If set, at most this amount of bytes is read from *raw*.
+    :param int chunk_size: The amount of compressed bytes that is read from *raw* at once.
+    """
+
+    def __init__(self, raw, decompressor, length=None, chunk_size=16 * 1024):
+        self.raw = raw
+        self.decompressor = decompressor
+        self.length = length
+        self.chunk_size = chunk_size
+        self.consumed = 0
+        self._position = 0
+        self._input = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        else:
+            raise io.UnsupportedOperation("can not seek relative to the end of a decompressed stream")
+        if position < self._position:
+            raise io.UnsupportedOperation("can only seek forwards in a decompressed stream")
+        while self._position < position:
+            data = self._decompress(min(position - self._position, self.chunk_size))
+            if not data:
+                break
+            self._position += len(data)
+        return self._position
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        written = 0
+        while written < len(view):
+            data = self._decompress(len(view) - written)
+            if not data:
+                break
+            view[written:written + len(data)] = data
+            written += len(data)
+        self._position += written
+        return written
+
+    def finish(self):
+        """Decompresses and discards the remainder of the compressed data, and returns the amount of bytes of *raw*
+        that belong to the compressed data. As more bytes may have been read from *raw* than that, the caller may need
+        to seek back.
+        """
+        while self._decompress(self.chunk_size):
+            pass
+        unused = len(self.decompressor.unused_data) if self.decompressor.eof else 0
+        return self.consumed - unused
+
+    def _read_input(self):
+        size = self.chunk_size if self.length is None else min(self.chunk_size, self.length - self.consumed)
+        data = self.raw.read(size) if size > 0 else b""
+        self.consumed += len(data)
+        return data
+
+    def _decompress(self, size):
+        decompressor = self.decompressor
+        while not decompressor.eof:
+            if hasattr(decompressor, 'unconsumed_tail'):
+                # zlib keeps the input it did not process in unconsumed_tail
+                if not self._input:
+                    self._input = self._read_input()
+                    if not self._input:
+                        return b""
+                data = decompressor.decompress(self._input, size)
+                self._input = decompressor.unconsumed_tail
+            else:
+                # lzma and bz2 keep the input in the decompressor, and tell us whether they need more
+                data = b""
+                if decompressor.needs_input:
+                    data = self._read_input()
+                    if not data:
+                        return b""
+                data = decompressor.decompress(data, size)
+            if data:
+                return data
+        return b""
+
+
+class CompressingStream(io.RawIOBase):
+    """A write-only stream that compresses all data that is written to it into *raw*, using a compressor object such
+    as the one returned by :func:`zlib.compressobj` or :class:`lzma.LZMACompressor`. :meth:`finish` must be called
+    to write the remaining compressed data. :meth:`tell` returns the amount of uncompressed bytes written.
+    """
+
+    def __init__(self, raw, compressor):
+        self.raw = raw
+        self.compressor = compressor
+        self.written = 0
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, b):
+        data = self.compressor.compress(b)
+        if data:
+            self.written += self.raw.write(data)
+        self._position += len(b)
+        return len(b)
+
+    def finish(self):
+        """Writes the remaining compressed data to *raw* and returns the total amount of compressed bytes written."""
+        self.written += self.raw.write(self.compressor.flush())
+        return self.written
@@ -1,23 +1,75 @@
+import functools
 import io
+import threading
 import types
+import weakref
 
 from .. import NOT_PROVIDED
 from .streams import CaptureStream
-from ..exceptions import UnknownDependentFieldError
+from ..exceptions import UnknownDependentFieldError, ImpossibleToCalculateLengthError
+
+
+class _StrongRef:
+    """Callable with the same interface as :class:`weakref.ref`, but holding a strong reference."""
+
+    __slots__ = ('_obj', )
+
+    def __init__(self, obj):
+        self._obj = obj
+
+    def __call__(self):
+        return self._obj
+
+
+class _Defaults(threading.local):
+    """The defaults for new contexts in the current thread."""
+
+    profiler = None
+
+
+_defaults = _Defaults()
 
 
 class ParsingContext:
     """A context that is passed around to different methods during reading from and writing to a stream. It is used
     to contain context for the field that is being parsed.
+
+    To ensure that parsed structures are freed by reference counting alone, references are only strong in the
+    direction of ownership: a context owns its :class:`FieldContext` objects, and these own their subcontexts. The
+    references back to the owner (:attr:`FieldContext.context`, the context of :attr:`f`, and :attr:`parent` and
+    :attr:`parent_field` of subcontexts created by :meth:`FieldContext.create_subcontext`) are weak. When a context
+    is freed while one of its subcontexts is still referenced, e.g. by a nested :class:`Structure` that outlives the
+    structure containing it, the subcontext receives a copy of the context that only holds the values of fields
+    without a subcontext, so it can still access its parents without creating a reference cycle.
     """
 
-    def __init__(self, structure=None, *, parent=None, parent_field=None, flat=False, stream=None, capture_raw=False):
-        self.parent = parent
-        self.parent_field = parent_field
+    # defaults for new contexts, the default profiler of a thread is set by destructify.profiling.enable
+    profiler = None
+    listener = None
+    # set by FieldContext.create_subcontext, only contexts with subcontexts have to do something when they are freed
+    _has_subcontexts = False
+
+    def __init__(self, structure=None, *, parent=None, parent_field=None, flat=False, stream=None, capture_raw=False,
+                 projection=None, listener=None, profiler=None):
+        self._parent = _StrongRef(parent)
+        self._parent_field = _StrongRef(parent_field)
         self.flat = flat
         self.stream = stream
         self.capture_raw = capture_raw
+        self.projection = projection
+        if parent is not None:
+            self.profiler = parent.profiler
+            self.listener = parent.listener
+        elif _defaults.profiler is not None:
+            self.profiler = _defaults.profiler
+        if listener is not None:
+            self.listener = listener
+        if profiler is not None:
+            self.profiler = profiler
         self.done = False
+        self.current_field_name = None
+        self.offset = None
+        self.length = None
 
         self.fields = {}
         self.f = ParsingContext.F(self)
@@ -31,26 +83,68 @@ class ParsingContext:
         """
 
         def __init__(self, context):
-            self.__context = context
+            self.__context = weakref.ref(context)
 
         def __getattr__(self, item):
-            return self.__context[item]
+            return self.__context()[item]
 
         def __getitem__(self, name):
-            return self.__context[name]
+            return self.__context()[name]
 
         @property
         def _context(self):
-            return self.__context
+            return self.__context()
 
         @property
         def _(self):
-            if self.__context.parent:
-                return self.__context.parent.f
+            if self.__context().parent:
+                return self.__context().parent.f
 
         @property
         def _root(self):
-            return self.__context.root.f
+            return self.__context().root.f
+
+    def __del__(self):
+        if not self._has_subcontexts:
+            return
+        # subcontexts that outlive this context get a copy of it, which does not own them
+        copy = None
+        for name, field_context in self.fields.items():
+            subcontext = field_context.subcontext
+            if subcontext is not None and subcontext._parent() is self:
+                if copy is None:
+                    copy = self._detached_copy()
+                subcontext._parent = _StrongRef(copy)
+                subcontext._parent_field = _StrongRef(copy.fields[name])
+
+    def _detached_copy(self):
+        """Returns a shallow copy of this context that holds its parents strongly, and only holds the values of fields
+        that have no subcontext, as the other values own the subcontexts that refer to this copy.
+        """
+        copy = self.__class__.__new__(self.__class__)
+        copy.__dict__.update(self.__dict__)
+        copy._parent = _StrongRef(self.parent)
+        copy._parent_field = _StrongRef(self.parent_field)
+        copy._has_subcontexts = False
+        copy.f = ParsingContext.F(copy)
+        copy.fields = {name: field_context._detached_copy(copy) for name, field_context in self.fields.items()}
+        return copy
+
+    @property
+    def parent(self):
+        return self._parent()
+
+    @parent.setter
+    def parent(self, value):
+        self._parent = _StrongRef(value)
+
+    @property
+    def parent_field(self):
+        return self._parent_field()
+
+    @parent_field.setter
+    def parent_field(self, value):
+        self._parent_field = _StrongRef(value)
 
     def initialize_from_meta(self, meta, structure=None):
         """Adds fields to the context based on the provided StructureOptions. If *structure* is provided, the values
@@ -65,6 +159,15 @@ class ParsingContext:
 
         self.capture_raw = self.capture_raw or meta.capture_raw
 
+    def get_field_context(self, field):
+        """Returns the :class:`FieldContext` of the provided field. If :attr:`current_field_name` is set, the field is
+        being processed under that name (e.g. as an item of an :class:`ArrayField`) and that :class:`FieldContext` is
+        returned. Otherwise, the field's own name is used.
+        """
+        if self.current_field_name is not None:
+            return self.fields[self.current_field_name]
+        return self.fields[field.name]
+
     def _add_values(self, values):
         """Method for easily adding :class:`FieldContext` objects to this context. Used only by testing."""
         if values:
@@ -83,6 +186,32 @@ class ParsingContext:
         """
         return types.MappingProxyType({k: v.value for k, v in self.fields.items()})
 
+    def lazy_ranges(self, *names):
+        """Returns a list of ``(offset, length)`` tuples of all lazy fields in this context and its subcontexts whose
+        values have not been read yet, for use with :meth:`PrefetchStream.prefetch`. The offsets are relative to the
+        stream that was passed to :meth:`Structure.from_stream`. Lazy fields whose length can not be determined
+        without parsing them are left out.
+
+        :param names: If provided, only these fields (and their nested fields) are included.
+        """
+        ranges = []
+        for name, field_context in self.fields.items():
+            if names and name not in names:
+                continue
+            if field_context.lazy:
+                if field_context.offset is None:
+                    continue
+                length = field_context.length
+                if length is None:
+                    try:
+                        length = len(field_context.field)
+                    except ImpossibleToCalculateLengthError:
+                        continue
+                ranges.append((field_context.absolute_offset, length))
+            elif field_context.subcontext is not None and field_context.subcontext.fields:
+                ranges.extend(field_context.subcontext.lazy_ranges())
+        return ranges
+
     @property
     def root(self):
         """Retrieves the uppermost :class:`ParsingContext` from this :class:`ParsingContext`. May return itself."""
@@ -108,8 +237,8 @@ class FieldContext:
     """This class contains information about the parsing state of the specified field."""
 
     def __init__(self, field, context, value=NOT_PROVIDED, *, field_name=None,
-                 parsed=False, offset=None, length=None, lazy=False, raw=None):
-        self.context = context
+                 parsed=False, offset=None, length=None, lazy=False, raw=None, projection=None):
+        self._context = weakref.ref(context)
         self.field = field
         self._value = value
         self.field_name = field_name
@@ -118,6 +247,8 @@ class FieldContext:
         self.length = length
         self.lazy = lazy
         self.raw = raw
+        self.projection = projection
+        self.skipped = False
         self.subcontext = None
 
     def __repr__(self):
@@ -130,6 +261,13 @@ class FieldContext:
         values.insert(1, ('value=%r' % self._value) if not self.lazy else 'value=(lazy)')
         return '%s(%s)' % (self.__class__.__name__, ", ".join(values))
 
+    @property
+    def context(self):
+        """The :class:`ParsingContext` this :class:`FieldContext` is part of. This is a weak reference, as the context
+        owns the :class:`FieldContext`.
+        """
+        return self._context()
+
     @property
     def absolute_offset(self):
         """Returns the absolute offset of the field in the stream."""
@@ -155,25 +293,33 @@ class FieldContext:
 
         if self.lazy:
             import lazy_object_proxy
-            return lazy_object_proxy.Proxy(self._lazy_get)
+            # the proxy keeps the context alive, so it can be resolved as long as it is referenced
+            return lazy_object_proxy.Proxy(functools.partial(self._lazy_get, self.context))
         return self._value
 
     @value.setter
     def value(self, value):
         self._value = value
 
-    def _lazy_get(self):
-        current_offset = self.context.stream.tell()
-        self.context.stream.seek(self.offset)
+    def _lazy_get(self, context):
+        current_offset = context.stream.tell()
+        current_field_name = context.current_field_name
+        context.stream.seek(self.offset)
         try:
-            with self.field.with_name(name=self.field_name) as field_instance:
-                value, length = field_instance.decode_from_stream(self.context.stream, self.context)
+            context.current_field_name = self.field.name if self.field_name is None else self.field_name
+            if context.profiler is None:
+                value, length = self.field.decode_from_stream(context.stream, context)
+            else:
+                value, length = context.profiler.decode(self.field, context.stream, context)
             # if the context is not yet done, we can update the field to its final value
-            if not self.context.done:
+            if not context.done:
                 self.add_parse_info(offset=self.offset, length=length, value=value, lazy=False)
+            if context.listener is not None:
+                context.listener.lazy_resolved(self, value)
             return value
         finally:
-            self.context.stream.seek(current_offset)
+            context.current_field_name = current_field_name
+            context.stream.seek(current_offset)
 
     def add_parse_info(self, offset, length, value=NOT_PROVIDED, lazy=False):
         """Call that is used when the value has been parsed. This fills all information in te structure.
@@ -192,6 +338,8 @@ class FieldContext:
         self.offset = offset
         self.length = length
         self.lazy = lazy
+        if not lazy:
+            self.skipped = False
 
         if self.context.capture_raw and self.context.stream is not None and length is not None and not lazy:
             self._capture_raw(self.context.stream)
@@ -204,6 +352,22 @@ class FieldContext:
             stream.seek(-self.length, io.SEEK_CUR)
             self.raw = stream.read(self.length)
 
+    def _detached_copy(self, context):
+        """Returns a shallow copy of this field context for :meth:`ParsingContext._detached_copy`."""
+        copy = self.__class__.__new__(self.__class__)
+        copy.__dict__.update(self.__dict__)
+        copy._context = weakref.ref(context)
+        if self.subcontext is not None:
+            copy._value = NOT_PROVIDED
+            copy.subcontext = None
+        return copy
+
     def create_subcontext(self, **kwargs):
-        self.subcontext = self.context.__class__(parent=self.context, parent_field=self, **kwargs)
+        kwargs.setdefault('projection', self.projection)
+        context = self.context
+        self.subcontext = context.__class__(parent=context, parent_field=self, **kwargs)
+        # the subcontext is owned by this field context, so it only weakly references its parents
+        self.subcontext._parent = weakref.ref(context)
+        self.subcontext._parent_field = weakref.ref(self)
+        context._has_subcontexts = True
         return self.subcontext
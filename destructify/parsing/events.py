@@ -0,0 +1,47 @@
+class ParsingListener:
+    """Base class for receiving events while structures are parsed or written. Set an instance as
+    :attr:`ParsingContext.listener` to receive the events of that context and all of its subcontexts. All methods do
+    nothing by default, so you only need to override the events you are interested in.
+
+    Events are emitted both while parsing and while writing. The items of an :class:`ArrayField` are reported as
+    fields of the subcontext of the array, using the base field of the array.
+    """
+
+    def field_start(self, field_context, offset):
+        """Called before a field is read or written at *offset*, relative to the start of the structure."""
+
+    def field_end(self, field_context):
+        """Called after a field has been read, written or skipped. The offset, length and value are available in the
+        :class:`FieldContext`. If the field is lazy, its value has not been read yet.
+        """
+
+    def lazy_resolved(self, field_context, value):
+        """Called when the value of a lazy field has been read from the stream."""
+
+    def check_failed(self, context, check):
+        """Called when *check*, one of :attr:`StructureOptions.checks`, has failed, just before :exc:`CheckError` is
+        raised.
+        """
+
+
+class ParsingListenerGroup(ParsingListener):
+    """Dispatches all events to each of the provided listeners, in order."""
+
+    def __init__(self, *listeners):
+        self.listeners = list(listeners)
+
+    def field_start(self, field_context, offset):
+        for listener in self.listeners:
+            listener.field_start(field_context, offset)
+
+    def field_end(self, field_context):
+        for listener in self.listeners:
+            listener.field_end(field_context)
+
+    def lazy_resolved(self, field_context, value):
+        for listener in self.listeners:
+            listener.lazy_resolved(field_context, value)
+
+    def check_failed(self, context, check):
+        for listener in self.listeners:
+            listener.check_failed(context, check)
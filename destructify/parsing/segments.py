@@ -0,0 +1,174 @@
+import bisect
+import io
+import os
+import socket
+
+__all__ = ['SegmentStream', 'write_segments']
+
+
+class SegmentStream(io.RawIOBase):
+    """A stream that collects the data written to it as a list of segments, rather than as a single buffer. Writes of
+    at least *threshold* bytes are kept as a reference to the written object, so large payloads are not copied.
+    Smaller writes, such as headers, are collected together in a :class:`bytearray`.
+
+    The segments can be written using :func:`write_segments`, which uses :func:`os.writev` or
+    :meth:`socket.socket.sendmsg` where possible::
+
+        stream = SegmentStream()
+        record.to_stream(stream)
+        write_segments(sock, stream.segments())
+
+    As the written objects are referenced, mutable objects (such as a :class:`bytearray`) must not be changed until
+    the segments have been written.
+
+    :param int threshold: The minimal size of a write that is referenced rather than copied.
+    """
+
+    def __init__(self, threshold=io.DEFAULT_BUFFER_SIZE):
+        self.threshold = threshold
+        self._segments = []
+        self._starts = []
+        self._size = 0
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError("unsupported whence value")
+        if position < 0:
+            raise ValueError("negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def write(self, b):
+        view = memoryview(b).cast('B')
+        written = len(view)
+
+        if self._position < self._size:
+            # overwrite the data that has already been written, e.g. when a deferred value is patched
+            overlap = min(len(view), self._size - self._position)
+            self._overwrite(self._position, view[:overlap])
+            self._position += overlap
+            view = view[overlap:]
+        if view and self._position > self._size:
+            self._append(bytes(self._position - self._size))
+
+        if view:
+            self._append(view)
+            self._position += len(view)
+        return written
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        end = min(self._position + len(view), self._size)
+        result = 0
+        while self._position < end:
+            i = bisect.bisect(self._starts, self._position) - 1
+            segment_offset = self._position - self._starts[i]
+            data = memoryview(self._segments[i])[segment_offset:segment_offset + end - self._position]
+            view[result:result + len(data)] = data
+            result += len(data)
+            self._position += len(data)
+        return result
+
+    def segments(self):
+        """Returns the list of written segments, as :class:`memoryview` objects."""
+        return [memoryview(segment) for segment in self._segments]
+
+    def getvalue(self):
+        """Returns all written data as a single :class:`bytes` object, which copies all segments."""
+        return b"".join(self._segments)
+
+    def _append(self, view):
+        if len(view) >= self.threshold:
+            self._starts.append(self._size)
+            self._segments.append(view)
+        else:
+            try:
+                if not isinstance(self._segments[-1], bytearray):
+                    raise IndexError()
+                self._segments[-1] += view
+            except (IndexError, BufferError):
+                # a new bytearray is needed if the last one is referenced by a memoryview returned by segments()
+                self._starts.append(self._size)
+                self._segments.append(bytearray(view))
+        self._size += len(view)
+
+    def _overwrite(self, position, view):
+        while view:
+            i = bisect.bisect(self._starts, position) - 1
+            segment = self._segments[i]
+            if not isinstance(segment, bytearray):
+                # referenced objects are not changed, so the segment is copied first
+                segment = self._segments[i] = bytearray(segment)
+            segment_offset = position - self._starts[i]
+            count = min(len(view), len(segment) - segment_offset)
+            segment[segment_offset:segment_offset + count] = view[:count]
+            position += count
+            view = view[count:]
+
+
+def _iov_max():
+    """Returns the maximum amount of buffers that can be passed to :func:`os.writev` at once."""
+    try:
+        iov_max = os.sysconf('SC_IOV_MAX')
+    except (AttributeError, ValueError, OSError):
+        iov_max = -1
+    return iov_max if iov_max > 0 else 1024
+
+
+def write_segments(target, segments):
+    """Writes all *segments* to *target* using as few system calls as possible, and returns the amount of bytes
+    written. If *target* is a :class:`socket.socket`, :meth:`socket.socket.sendmsg` is used. If it has a file
+    descriptor and :func:`os.writev` is available, the file is flushed and the segments are written to the file
+    descriptor. Otherwise, each segment is written using ``target.write``.
+    """
+    segments = [memoryview(segment).cast('B') for segment in segments if len(segment)]
+
+    if isinstance(target, socket.socket):
+        send = target.sendmsg
+    else:
+        send = None
+        if hasattr(os, 'writev'):
+            try:
+                fd = target.fileno()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
+            else:
+                if hasattr(target, 'flush'):
+                    target.flush()
+                send = lambda buffers: os.writev(fd, buffers)
+
+    if send is None:
+        return sum(target.write(segment) for segment in segments)
+
+    total = 0
+    i = 0
+    iov_max = _iov_max()
+    while i < len(segments):
+        sent = send(segments[i:i + iov_max])
+        total += sent
+        # skip the segments that were sent entirely, and the sent part of a partially sent segment
+        while i < len(segments) and sent >= len(segments[i]):
+            sent -= len(segments[i])
+            i += 1
+        if sent:
+            segments[i] = segments[i][sent:]
+    return total
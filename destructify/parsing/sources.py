@@ -0,0 +1,199 @@
+import collections
+import io
+import os
+import urllib.request
+
+__all__ = ['RangeSource', 'BytesRangeSource', 'FileRangeSource', 'CallableRangeSource', 'HTTPRangeSource',
+           'RangeStream']
+
+
+class RangeSource:
+    """Base class for random-access sources of bytes. Subclasses implement :meth:`read_at`, and set :attr:`size` if
+    the total size of the source is known.
+    """
+
+    size = None
+
+    def read_at(self, offset, size):
+        """Returns at most *size* bytes starting at *offset*. Less bytes are only returned at the end of the source."""
+        raise NotImplementedError()
+
+
+class BytesRangeSource(RangeSource):
+    """A :class:`RangeSource` reading from a bytes-like object, e.g. :class:`bytes` or an :class:`mmap.mmap`."""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.size = len(buffer)
+
+    def read_at(self, offset, size):
+        return bytes(self.buffer[offset:offset + size])
+
+
+class FileRangeSource(RangeSource):
+    """A :class:`RangeSource` reading from a file object. If the file has a file descriptor, :func:`os.pread` is used,
+    so the position of the file is not changed. Otherwise, the file is seeked before every read.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        try:
+            self._fd = file.fileno()
+        except (AttributeError, OSError):
+            self._fd = None
+        if self._fd is not None and hasattr(os, 'pread'):
+            self.size = os.fstat(self._fd).st_size
+        else:
+            self._fd = None
+            self.size = file.seek(0, io.SEEK_END)
+
+    def read_at(self, offset, size):
+        if self._fd is None:
+            self.file.seek(offset)
+            return self.file.read(size)
+
+        result = bytearray()
+        while len(result) < size:
+            data = os.pread(self._fd, size - len(result), offset + len(result))
+            if not data:
+                break
+            result += data
+        return bytes(result)
+
+
+class CallableRangeSource(RangeSource):
+    """A :class:`RangeSource` that calls ``fetch(offset, size)`` for every read, allowing any other source of bytes to
+    be used.
+    """
+
+    def __init__(self, fetch, size=None):
+        self.fetch = fetch
+        self.size = size
+
+    def read_at(self, offset, size):
+        return self.fetch(offset, size)
+
+
+class HTTPRangeSource(RangeSource):
+    """A :class:`RangeSource` reading from a HTTP server using range requests. The size of the resource is obtained
+    using a ``HEAD`` request when it is needed.
+
+    :param str url: The URL of the resource.
+    :param dict headers: Additional headers to send with each request.
+    :param timeout: The timeout of each request, passed to :func:`urllib.request.urlopen`.
+    """
+
+    def __init__(self, url, headers=None, timeout=None):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self._size = None
+
+    @property
+    def size(self):
+        if self._size is None:
+            request = urllib.request.Request(self.url, headers=self.headers, method='HEAD')
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                length = response.headers.get('Content-Length')
+            if length is not None:
+                self._size = int(length)
+        return self._size
+
+    def read_at(self, offset, size):
+        if size <= 0:
+            return b""
+        headers = dict(self.headers, Range="bytes={}-{}".format(offset, offset + size - 1))
+        request = urllib.request.Request(self.url, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status == 206:
+                return response.read(size)
+            # the server does not support range requests and returns the entire resource
+            return response.read()[offset:offset + size]
+
+
+class RangeStream(io.RawIOBase):
+    """A read-only, seekable stream on top of a :class:`RangeSource`. Data is fetched in blocks of *block_size* bytes,
+    of which the *cache_size* most recently used blocks are kept. When a block is fetched, up to *read_ahead*
+    following blocks are fetched in the same call to :meth:`RangeSource.read_at`.
+
+    This stream can be used anywhere a stream is accepted, e.g. in :meth:`Structure.from_stream`::
+
+        stream = RangeStream(HTTPRangeSource("https://example.com/large.bin"), block_size=256 * 1024)
+        header, _ = Header.from_stream(stream)
+    """
+
+    def __init__(self, source, block_size=64 * 1024, cache_size=64, read_ahead=0):
+        if block_size <= 0 or cache_size <= 0 or read_ahead < 0:
+            raise ValueError("RangeStream requires a positive block_size and cache_size, and non-negative read_ahead")
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = BytesRangeSource(source)
+        self.source = source
+        self.block_size = block_size
+        self.cache_size = cache_size
+        self.read_ahead = read_ahead
+        self.fetches = 0
+        self._position = 0
+        self._blocks = collections.OrderedDict()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            if self.source.size is None:
+                raise io.UnsupportedOperation("The size of the source is not known")
+            position = self.source.size + offset
+        else:
+            raise ValueError("unsupported whence value")
+        if position < 0:
+            raise ValueError("negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        written = 0
+        while written < len(view):
+            index, start = divmod(self._position, self.block_size)
+            data = self._get_block(index)[start:start + len(view) - written]
+            if not data:
+                break
+            view[written:written + len(data)] = data
+            written += len(data)
+            self._position += len(data)
+        return written
+
+    def clear_cache(self):
+        """Removes all cached blocks."""
+        self._blocks.clear()
+
+    def _get_block(self, index):
+        try:
+            self._blocks.move_to_end(index)
+            return self._blocks[index]
+        except KeyError:
+            pass
+
+        # fetch the block and the following blocks that are not cached yet, in a single read
+        count = 1
+        while count <= self.read_ahead and index + count not in self._blocks:
+            count += 1
+        data = self.source.read_at(index * self.block_size, count * self.block_size)
+        self.fetches += 1
+
+        # the requested block is added last, so it is the last to be evicted
+        for i in reversed(range(count)):
+            self._blocks[index + i] = data[i * self.block_size:(i + 1) * self.block_size]
+        while len(self._blocks) > self.cache_size:
+            self._blocks.popitem(last=False)
+        return data[:self.block_size]
@@ -1,6 +1,10 @@
+import bisect
+import collections
+import contextlib
 import functools
 import io
 
+from .events import ParsingListener, ParsingListenerGroup
 from ..exceptions import MisalignedFieldError, StreamExhaustedError
 
 
@@ -198,14 +202,13 @@ class Substream(_PurePythonIOImplementationMixin):
             self._tellable = True
 
             # seek to the start of the substream, if the position is before the start of it
-            # also seek to the current position to determine if we are a seekable stream
             # this makes no sense if we are not in a tellable stream
-            try:
-                self.raw.seek(self.start + max(0, self._position))
-            except (AttributeError, OSError):
-                if self._position != 0:
+            if self._position < 0:
+                try:
+                    self.raw.seek(self.start)
+                except (AttributeError, OSError):
                     raise OSError("The stream is not at its starting position, and cannot seek to starting position.")
-            self._position = max(0, self._position)
+                self._position = 0
 
         # put stop in the place of length if we have defined it.
         # there's a check above to verify that not both stop and length are set.
@@ -327,6 +330,502 @@ class Substream(_PurePythonIOImplementationMixin):
         return result
 
 
+class IOStats:
+    """Statistics of the calls made to a stream, as collected by :class:`StatsStream`."""
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.bytes = collections.Counter()
+        self.read_sizes = collections.Counter()
+
+    def __repr__(self):
+        return '<%s: calls=%r, bytes=%r>' % (self.__class__.__name__, dict(self.calls), dict(self.bytes))
+
+    def add(self, call, count=0):
+        self.calls[call] += 1
+        self.bytes[call] += count
+        if call == 'read':
+            self.read_sizes[1 << (count - 1).bit_length() if count else 0] += 1
+
+    def as_dict(self):
+        return {'calls': dict(self.calls), 'bytes': dict(self.bytes), 'read_sizes': dict(self.read_sizes)}
+
+
+class _StatsListener(ParsingListener):
+    """Keeps track of the field that is currently processed, for attributing statistics. When a field ends, the field
+    containing it is processed again, so no stack of fields has to be kept.
+    """
+
+    def __init__(self):
+        self.context = None
+        self.field_context = None
+
+    @contextlib.contextmanager
+    def attached(self, context):
+        """Adds this listener to the listeners of *context* while it is processed. Afterwards, also if an exception
+        was raised, calls are attributed to the field that was processed before again.
+        """
+        listener = context.listener
+        if listener is None:
+            context.listener = self
+        elif listener is not self and self not in getattr(listener, 'listeners', ()):
+            context.listener = ParsingListenerGroup(listener, self)
+
+        previous = self.context, self.field_context
+        self.context = context
+        try:
+            yield
+        finally:
+            self.context, self.field_context = previous
+
+    @property
+    def field_name(self):
+        return self.field_context.field.full_name if self.field_context is not None else None
+
+    def field_start(self, field_context, offset):
+        self.field_context = field_context
+
+    def field_end(self, field_context):
+        context = field_context.context
+        self.field_context = context.parent_field if context is not None else None
+
+
+class StatsStream(_PurePythonIOImplementationMixin):
+    """Stream wrapper that counts the ``read``, ``peek``, ``seek``, ``tell`` and ``write`` calls that are made to the
+    underlying stream, and the amount of bytes they move.
+
+    When the stream is passed to :meth:`Structure.from_stream` or :meth:`Structure.to_stream`, :attr:`listener` is
+    added to the listeners of the context, so the statistics are also attributed to the field that is processed::
+
+        stream = StatsStream(f)
+        MyStructure.from_stream(stream)
+        print(stream.total, stream.fields)
+    """
+
+    def __init__(self, raw):
+        """
+        :param raw: The raw underlying stream.
+        """
+
+        self.raw = raw
+        self.listener = _StatsListener()
+        self.reset()
+        try:
+            self._position = self.raw.tell()
+        except (AttributeError, OSError):  # raised when this is not a tellable stream
+            self._position = None
+
+    def reset(self):
+        """Resets all statistics."""
+        self.total = IOStats()
+        self.fields = collections.defaultdict(IOStats)
+
+    def __getattribute__(self, item):
+        if item in ('peek', 'read', 'read1', 'readall', 'readinto', 'readinto1', 'readline', 'readlines', 'write') and \
+                not hasattr(self.raw, item):
+            raise AttributeError()
+        return super().__getattribute__(item)
+
+    def __getattr__(self, item):
+        # All unimplemented methods go to the raw stream directly.
+        return getattr(self.raw, item)
+
+    def _record(self, call, count=0):
+        self.total.add(call, count)
+        self.fields[self.listener.field_name].add(call, count)
+
+    def close(self):
+        pass  # StatsStream is not intended to be closed
+
+    def detach(self):
+        return self.raw
+
+    def _read(self, size, func):
+        result = func(size)
+        self._record('read', len(result))
+        if self._position is not None:
+            self._position += len(result)
+        return result
+
+    def peek(self, size=0):
+        result = self.raw.peek(size)
+        self._record('peek', len(result))
+        return result
+
+    def seek(self, offset, whence=0):
+        result = self.raw.seek(offset, whence)
+        self._record('seek', abs(result - self._position) if self._position is not None else 0)
+        self._position = result
+        return result
+
+    def tell(self):
+        result = self.raw.tell()
+        self._record('tell')
+        return result
+
+    def write(self, b):
+        result = self.raw.write(b)
+        self._record('write', result)
+        if self._position is not None:
+            self._position += result
+        return result
+
+
+class PrefetchStream(_PurePythonIOImplementationMixin):
+    """Stream wrapper that serves reads from byte ranges that were fetched in advance using :meth:`prefetch`. This is
+    useful when a structure contains many lazy fields, or fields at absolute offsets, that would otherwise each require
+    a seek and a small read on the underlying stream. Reads outside the prefetched ranges are passed to the underlying
+    stream. The position is kept by this wrapper, so :meth:`tell` does not hit the underlying stream.
+
+    Typical use is to parse a structure from this stream and prefetch all of its lazy fields afterwards::
+
+        stream = PrefetchStream(f)
+        directory, _ = Directory.from_stream(stream)
+        stream.prefetch(directory._context.lazy_ranges())
+    """
+
+    def __init__(self, raw, gap=4096):
+        """
+        :param raw: The raw underlying stream.
+        :param int gap: Ranges that are at most this amount of bytes apart are fetched in a single read.
+        """
+
+        self.raw = raw
+        self.gap = gap
+        self.discard()
+        try:
+            self._position = self._raw_position = self.raw.tell()
+        except (AttributeError, OSError):  # raised when this is not a tellable stream
+            self._position = self._raw_position = 0
+
+    def __getattribute__(self, item):
+        if item in ('peek', 'read', 'read1', 'readall', 'readinto', 'readinto1', 'readline', 'readlines', 'write') and \
+                not hasattr(self.raw, item):
+            raise AttributeError()
+        return super().__getattribute__(item)
+
+    def __getattr__(self, item):
+        # All unimplemented methods go to the raw stream directly.
+        return getattr(self.raw, item)
+
+    def close(self):
+        pass  # PrefetchStream is not intended to be closed
+
+    def detach(self):
+        return self.raw
+
+    def discard(self):
+        """Removes all prefetched data."""
+        self._starts = []
+        self._buffers = []
+
+    def plan(self, ranges):
+        """Sorts the provided ``(offset, length)`` ranges and merges the ranges that overlap or that are at most
+        :attr:`gap` bytes apart. Ranges that have already been prefetched are left out. Returns a list of
+        ``(start, stop)`` tuples.
+        """
+        merged = []
+        for offset, length in sorted(ranges):
+            if length <= 0 or self._cached(offset, length) is not None:
+                continue
+            if merged and offset - merged[-1][1] <= self.gap:
+                merged[-1][1] = max(merged[-1][1], offset + length)
+            else:
+                merged.append([offset, offset + length])
+        return [(start, stop) for start, stop in merged]
+
+    def prefetch(self, ranges):
+        """Fetches the provided ``(offset, length)`` ranges from the underlying stream, issuing a single read for each
+        group of nearby ranges as determined by :meth:`plan`. Returns the list of ``(start, stop)`` tuples that were
+        read.
+        """
+        planned = self.plan(ranges)
+        for start, stop in planned:
+            self.raw.seek(start)
+            data = self.raw.read(stop - start)
+            self._raw_position = start + len(data)
+            index = bisect.bisect(self._starts, start)
+            self._starts.insert(index, start)
+            self._buffers.insert(index, data)
+        return planned
+
+    def _cached(self, offset, size):
+        """Returns a view of the prefetched data at *offset*, up to *size* bytes, or None if it is not available."""
+        index = bisect.bisect(self._starts, offset) - 1
+        if index < 0:
+            return None
+        start, data = self._starts[index], self._buffers[index]
+        if offset >= start + len(data):
+            return None
+        if size is None or size < 0:
+            return data[offset - start:]
+        return data[offset - start:offset - start + size]
+
+    def _read(self, size, func):
+        result = self._cached(self._position, size)
+        if result is not None:
+            self._position += len(result)
+            if size is None or size < 0 or len(result) < size:
+                # the read continues beyond the prefetched data
+                result += self._read_raw(-1 if size is None or size < 0 else size - len(result), func)
+            return result
+        return self._read_raw(size, func)
+
+    def _read_raw(self, size, func):
+        if self._raw_position != self._position:
+            self.raw.seek(self._position)
+        result = func(size)
+        self._position += len(result)
+        self._raw_position = self._position
+        return result
+
+    def peek(self, size=0):
+        result = self._cached(self._position, -1)
+        if result:
+            return result
+        if self._raw_position != self._position:
+            self.raw.seek(self._position)
+            self._raw_position = self._position
+        return self.raw.peek(size)
+
+    def readline(self, size=-1):
+        # lines are not split by the prefetched data, so these are always read from the underlying stream
+        return self._read_raw(size, self.raw.readline)
+
+    def seek(self, offset, whence=0):
+        if whence == io.SEEK_SET:
+            if offset < 0:
+                raise ValueError("negative seek position {}".format(offset))
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position = max(0, self._position + offset)
+        elif whence == io.SEEK_END:
+            self._position = self._raw_position = self.raw.seek(offset, io.SEEK_END)
+        else:
+            raise ValueError("unsupported whence value")
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def write(self, b):
+        self.discard()
+        if self._raw_position != self._position:
+            self.raw.seek(self._position)
+        result = self.raw.write(b)
+        self._position += result
+        self._raw_position = self._position
+        return result
+
+
+class DigestStream(_PurePythonIOImplementationMixin):
+    """Stream wrapper that feeds the bytes of fields into digests while they are read or written, so checksums can be
+    calculated without capturing or re-reading the bytes. It is added to the stream of a :class:`Structure`
+    automatically when it contains a :class:`ChecksumField`.
+
+    The field that is currently processed is obtained from :attr:`ParsingContext.current_field_name`. Fields with a
+    ``digest_fields`` attribute list the names of the fields whose bytes they need, and provide a new digest object
+    using ``create_digest()``.
+    """
+
+    requires_context = True
+
+    def __init__(self, raw, context=None):
+        """
+        :param raw: The raw underlying stream.
+        :param ParsingContext context: The context of the structure that is processed.
+        """
+
+        self.raw = raw
+        self.context = context
+        self.digests = {}
+        self._targets = None
+        try:
+            self._position = self.raw.tell()
+        except (AttributeError, OSError):  # raised when this is not a tellable stream
+            self._position = 0
+
+    def __getattribute__(self, item):
+        if item in ('peek', 'read', 'read1', 'readall', 'readinto', 'readinto1', 'readline', 'readlines', 'write') and \
+                not hasattr(self.raw, item):
+            raise AttributeError()
+        return super().__getattribute__(item)
+
+    def __getattr__(self, item):
+        # All unimplemented methods go to the raw stream directly.
+        return getattr(self.raw, item)
+
+    def close(self):
+        pass  # DigestStream is not intended to be closed
+
+    def detach(self):
+        return self.raw
+
+    def _feed(self, data):
+        if self._targets is None:
+            # maps the name of each field to the digests that need its bytes
+            self._targets = collections.defaultdict(list)
+            for name, field_context in self.context.fields.items():
+                for digest_field in getattr(field_context.field, 'digest_fields', ()):
+                    digest = self.digests[name] = RunningDigest(field_context.field.create_digest())
+                    self._targets[digest_field].append(digest)
+
+        for digest in self._targets.get(self.context.current_field_name, ()):
+            digest.update(self._position, data)
+
+    def _read(self, size, func):
+        result = func(size)
+        if self.context is not None and result:
+            self._feed(result)
+        self._position += len(result)
+        return result
+
+    def seek(self, offset, whence=0):
+        self._position = self.raw.seek(offset, whence)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def write(self, b):
+        result = self.raw.write(b)
+        if self.context is not None and result:
+            self._feed(b[:result])
+        self._position += result
+        return result
+
+
+class RunningDigest:
+    """A digest that is updated by :class:`DigestStream` with contiguous bytes of the stream. It keeps track of the
+    range of the stream it covers, so the user can verify it covers the expected bytes.
+    """
+
+    def __init__(self, digest):
+        self.digest = digest
+        self.start = None
+        self.stop = None
+
+    def update(self, offset, data):
+        if self.digest is None:
+            return
+        if self.start is None:
+            self.start = self.stop = offset
+        elif offset != self.stop:
+            # the bytes are not contiguous, so the digest is unusable
+            self.digest = self.start = self.stop = None
+            return
+        self.digest.update(data)
+        self.stop += len(data)
+
+
+class BufferStream(io.RawIOBase):
+    """A seekable stream that reads from and writes directly into a preallocated bytes-like object, such as a
+    :class:`bytearray`, :class:`memoryview` or :class:`mmap.mmap`, starting at *offset*. Positions are relative to
+    *offset*. Bytes that are skipped over while writing are set to zero, as they would be in a :class:`io.BytesIO`.
+    Writing beyond the end of the buffer raises an :exc:`IOError`.
+
+    :param buffer: The writable buffer to use.
+    :param int offset: The offset in the buffer the stream starts at.
+    """
+
+    def __init__(self, buffer, offset=0):
+        self.buffer = memoryview(buffer).cast('B')[offset:]
+        self._position = 0
+        self._end = 0
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return not self.buffer.readonly
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self.buffer) + offset
+        else:
+            raise ValueError("unsupported whence value")
+        if position < 0:
+            raise ValueError("negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def readinto(self, b):
+        data = self.buffer[self._position:self._position + len(b)]
+        memoryview(b).cast('B')[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def write(self, b):
+        end = self._position + len(b)
+        self._reserve(end)
+        self.buffer[self._position:end] = b
+        self._position = end
+        return len(b)
+
+    def pack_into(self, struct, *values):
+        """Writes *values* using :meth:`struct.Struct.pack_into` at the current position, without creating an
+        intermediate :class:`bytes` object. Returns the amount of bytes written.
+        """
+        end = self._position + struct.size
+        self._reserve(end)
+        struct.pack_into(self.buffer, self._position, *values)
+        self._position = end
+        return struct.size
+
+    def fill(self, end):
+        """Sets the bytes that have not been written up to *end* to zero."""
+        if end > self._end:
+            if end > len(self.buffer):
+                raise IOError("Attempting to fill up to {} bytes in a buffer of {} bytes".format(end, len(self.buffer)))
+            self.buffer[self._end:end] = bytes(end - self._end)
+            self._end = end
+
+    def _reserve(self, end):
+        if end > len(self.buffer):
+            raise IOError("Attempting to write up to {} bytes in a buffer of {} bytes".format(end, len(self.buffer)))
+        if self._position > self._end:
+            self.buffer[self._end:self._position] = bytes(self._position - self._end)
+        self._end = max(self._end, end)
+
+
+class _NullStream(io.RawIOBase):
+    """A seekable stream that discards all data that is written, keeping track of the position only."""
+
+    def __init__(self):
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("can not seek relative to the end of a null stream")
+        self._position = offset
+        return offset
+
+    def write(self, b):
+        self._position += len(b)
+        return len(b)
+
+
 class BitStream:
     """A object that acts as if it is a stream, but adds methods for reading bits"""
 
@@ -0,0 +1,147 @@
+import contextlib
+import json
+import time
+
+from .parsing.context import _defaults
+
+
+__all__ = ['Profiler', 'FieldStats', 'enable', 'disable', 'profile']
+
+
+class FieldStats:
+    """Statistics of a single field, aggregated over all structures that were processed by a :class:`Profiler`."""
+
+    __slots__ = ('calls', 'time', 'bytes', 'seeks', 'errors')
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.bytes = 0
+        self.seeks = 0
+        self.errors = 0
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__,
+                             ", ".join("%s=%r" % (a, getattr(self, a)) for a in self.__slots__))
+
+    def as_dict(self):
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+
+class Profiler:
+    """Records per-field statistics while parsing and writing structures: the amount of calls, the cumulative time
+    spent, the amount of bytes read or written, the amount of seeks that were issued for the field and the amount of
+    exceptions raised. The statistics are aggregated by :attr:`Field.full_name`, so all items of an :class:`ArrayField`
+    are aggregated under the name of its base field.
+
+    The time of a field includes the time of all fields it contains, e.g. the fields of a :class:`StructureField`.
+
+    :param int sample_interval: Only every *n*-th structure that is processed (not counting structures that are part
+        of another structure) is profiled, reducing the overhead of profiling.
+    """
+
+    def __init__(self, sample_interval=1):
+        self.sample_interval = sample_interval
+        self.stats = {}
+        self._count = 0
+
+    def reset(self):
+        """Removes all recorded statistics."""
+        self.stats = {}
+        self._count = 0
+
+    def sample(self):
+        """Called for every root structure that is processed and returns whether it should be profiled."""
+        self._count += 1
+        return (self._count - 1) % self.sample_interval == 0
+
+    def get_stats(self, field):
+        """Returns the :class:`FieldStats` of the provided field."""
+        try:
+            return self.stats[field.full_name]
+        except KeyError:
+            stats = self.stats[field.full_name] = FieldStats()
+            return stats
+
+    def decode(self, field, stream, context):
+        """Calls :meth:`Field.decode_from_stream` and records its statistics."""
+        stats = self.get_stats(field)
+        start = time.perf_counter()
+        try:
+            value, consumed = field.decode_from_stream(stream, context)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.calls += 1
+            stats.time += time.perf_counter() - start
+        stats.bytes += consumed
+        return value, consumed
+
+    def encode(self, field, stream, value, context):
+        """Calls :meth:`Field.encode_to_stream` and records its statistics."""
+        stats = self.get_stats(field)
+        start = time.perf_counter()
+        try:
+            written = field.encode_to_stream(stream, value, context)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.calls += 1
+            stats.time += time.perf_counter() - start
+        stats.bytes += written
+        return written
+
+    def seek(self, field):
+        """Records that a seek was issued for the provided field, e.g. for moving to its offset or skipping it."""
+        self.get_stats(field).seeks += 1
+
+    def as_dict(self):
+        """Returns the statistics as a dictionary of field names to a dictionary of their statistics."""
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def to_json(self, **kwargs):
+        """Returns the statistics as JSON. All keyword arguments are passed to :func:`json.dumps`."""
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def table(self, sort='time'):
+        """Returns the statistics as a table, sorted descending by the provided statistic."""
+        rows = sorted(self.stats.items(), key=lambda item: getattr(item[1], sort), reverse=True)
+        width = max([len(name) for name in self.stats] + [5])
+        lines = ["{:<{}} {:>10} {:>12} {:>12} {:>8} {:>8}".format("field", width, "calls", "time (s)", "bytes",
+                                                                  "seeks", "errors")]
+        for name, stats in rows:
+            lines.append("{:<{}} {:>10} {:>12.6f} {:>12} {:>8} {:>8}".format(name, width, stats.calls, stats.time,
+                                                                             stats.bytes, stats.seeks, stats.errors))
+        return "\n".join(lines)
+
+
+def enable(profiler=None):
+    """Enables profiling of all structures that are parsed or written in new contexts in the current thread, using the
+    provided :class:`Profiler` or a new one, and returns the profiler. To profile a single call, you can pass the
+    profiler to the :class:`ParsingContext` instead, e.g. ``ParsingContext(profiler=profiler)``.
+    """
+    if profiler is None:
+        profiler = Profiler()
+    _defaults.profiler = profiler
+    return profiler
+
+
+def disable():
+    """Disables profiling in the current thread and returns the :class:`Profiler` that was enabled, if any."""
+    profiler, _defaults.profiler = _defaults.profiler, None
+    return profiler
+
+
+@contextlib.contextmanager
+def profile(sample_interval=1):
+    """Context manager that enables a new :class:`Profiler` in the current thread while in the block, and yields the
+    profiler.
+    """
+    previous = _defaults.profiler
+    profiler = enable(Profiler(sample_interval))
+    try:
+        yield profiler
+    finally:
+        _defaults.profiler = previous
@@ -1,34 +1,457 @@
-import contextlib
+import collections
+import concurrent.futures
+import enum
+import functools
 import inspect
 import io
-
-from ..fields import BitField
-from ..exceptions import CheckError, WriteError, ParseError, ImpossibleToCalculateLengthError
-from ..parsing import ParsingContext, CaptureStream
-from ..parsing.streams import BitStream, Substream
+import itertools
+import operator
+import struct
+
+from ..fields import BitField, Field, Deferred
+from ..fields.base import _retrieve_property
+from .. import UNLOADED
+from ..exceptions import CheckError, WriteError, ParseError, ImpossibleToCalculateLengthError, \
+    UnknownDependentFieldError
+from ..parsing import ParsingContext, CaptureStream, SegmentStream
+from ..parsing.context import _defaults
+from ..parsing.streams import BitStream, Substream, BufferStream, DigestStream, StatsStream, _NullStream
 from .options import StructureOptions
 
 
-class _recapture(contextlib.AbstractContextManager):
-    """Context manager to recapture exceptions raised by methods that may not be a DestructifyError, indicating where
-    the error originated from.
+def _reraise(exc_value, error_class, message, *args):
+    """Re-raises an exception raised by methods that may not be a DestructifyError, indicating where the error
+    originated from. Must be called from an ``except`` clause, so the message is only formatted when an error occurs.
 
-    If the captured error is a (subclass of) the provided exception, a new error is raised of the same type as the error
-    that was raised. If the captured error is of a different type, the argument is raised.
+    If *exc_value* is a (subclass of) *error_class*, a new error is raised of the same type as *exc_value*. If it is of
+    a different type, an *error_class* is raised. In both cases, *message* is formatted with *args*.
     """
+    message = message.format(*args)
+    if isinstance(exc_value, error_class):
+        raise exc_value.__class__(message) from exc_value
+    raise error_class(message) from exc_value
 
-    def __init__(self, exc):
-        self._exc = exc
 
-    def __enter__(self):
-        pass
+def _getstate_slots(self):
+    """Used as ``__getstate__`` for structures with :attr:`StructureOptions.slots`: returns the field values."""
+    return {field.name: getattr(self, field.name) for field in self._meta.fields if hasattr(self, field.name)}
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        if exc_type is not None and issubclass(exc_type, Exception):
-            if not issubclass(exc_type, self._exc.__class__):
-                raise self._exc from exc_value
-            else:
-                raise exc_type(str(self._exc)) from exc_value
+
+def _setstate_slots(self, state):
+    """Used as ``__setstate__`` for structures with :attr:`StructureOptions.slots`."""
+    for name, value in state.items():
+        setattr(self, name, value)
+
+
+def _projection(only):
+    """Converts an iterable of (dotted) field names to a dict that maps each field name to the projection of its
+    nested fields, or :const:`None` if the field is to be loaded entirely. A single string is a single field name.
+    """
+    if isinstance(only, str):
+        only = (only, )
+    nested = {}
+    for path in only:
+        name, _, rest = path.partition('.')
+        if not rest:
+            nested[name] = None
+        elif nested.get(name, ()) is not None:
+            nested.setdefault(name, []).append(rest)
+    return {name: None if rest is None else _projection(rest) for name, rest in nested.items()}
+
+
+_INTEGER_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+_BYTE_ORDERS = {'big': '>', 'little': '<'}
+
+
+def _fixed_layout(structure):
+    """Returns a :class:`struct.Struct` that packs the values of all fields of *structure* at once, or :const:`None`
+    if the structure can not be written that way. This is only possible if all fields are plain :class:`IntegerField`
+    or single-value :class:`StructField` objects with the same byte order, and nothing else affects the output.
+    """
+    # imported here, as the fields import this module
+    from ..fields import IntegerField, StructField
+
+    meta = structure._meta
+    if meta.checks or meta.length is not None or meta.alignment is not None or meta.capture_raw or \
+            meta.stream_wrappers or structure.finalize is not Structure.finalize or \
+            ParsingContext.listener is not None or _defaults.profiler is not None:
+        return None
+
+    byte_order = None
+    formats = []
+    for field in meta.fields:
+        if field.has_override or field.has_encoder or field.offset is not None or field.skip is not None:
+            return None
+        if type(field) is IntegerField and field.length in _INTEGER_FORMATS:
+            order = _BYTE_ORDERS.get(field.byte_order) if field.length > 1 else None
+            if field.length > 1 and order is None:
+                return None
+            code = _INTEGER_FORMATS[field.length]
+            formats.append(code.lower() if field.signed else code)
+        elif type(field) is StructField and not field.multibyte and field.byte_order in ('<', '>'):
+            order = field.byte_order
+            formats.append(field.format)
+        else:
+            return None
+
+        if order is not None:
+            if byte_order not in (None, order):
+                return None
+            byte_order = order
+    return struct.Struct((byte_order or '>') + "".join(formats))
+
+
+def _chunked(iterable, size):
+    """Yields lists of *size* consecutive items of *iterable*."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _write_records(structure, records):
+    """Returns the bytes of all *records*, written consecutively. Used by the workers of
+    :meth:`Structure.write_many`.
+    """
+    stream = io.BytesIO()
+    structure.write_many(records, stream)
+    return stream.getvalue()
+
+
+def _is_seekable(stream):
+    """Returns whether *stream* can be seeked, assuming it can if it does not say otherwise."""
+    try:
+        return stream.seekable()
+    except AttributeError:
+        return True
+
+
+def _write_deferred(stream, field, context, placeholder):
+    """Resolves the :class:`Deferred` value of *field* and writes it over its placeholder, which was written at
+    *placeholder* with the returned length. The stream is left at the end of the field.
+    """
+    field_context = context.fields[field.name]
+    try:
+        field_context.value = field_context.value.resolve(context.f)
+        stream.seek(field_context.offset)
+        context.current_field_name = field.name
+        written = field.encode_to_stream(stream, field_context.value, context)
+        context.current_field_name = None
+    except Exception as e:
+        _reraise(e, WriteError, "Error while writing deferred field {}", field)
+    if written != placeholder:
+        raise WriteError("The deferred value of {} is {} bytes long, but its placeholder is {} bytes long"
+                         .format(field.full_name, written, placeholder))
+
+
+def _evaluate_where(context, where):
+    """Evaluates the predicate *where* in the context, returning :const:`None` if it references a field that is not
+    yet available.
+    """
+    try:
+        return bool(_retrieve_property(context, where))
+    except UnknownDependentFieldError:
+        return None
+
+
+def _failed_check(context, checks):
+    """Returns the first of *checks* that fails in the context, or :const:`None` if all checks pass."""
+    for check in checks:
+        if not check(context.f):
+            return check
+    return None
+
+
+def _detach_value(value):
+    if isinstance(value, Structure):
+        value.detach_context()
+    elif isinstance(value, list):
+        for v in value:
+            _detach_value(v)
+
+
+def _value_pins_stream(value):
+    if isinstance(value, Structure):
+        return value.pins_stream()
+    elif isinstance(value, list):
+        return any(_value_pins_stream(v) for v in value)
+    return False
+
+
+# values of these types can not be changed in place, so they are unchanged if they equal the parsed value
+_IMMUTABLE_TYPES = (int, float, complex, bytes, str, tuple, frozenset, enum.Enum, type(None))
+
+
+class _LengthChanged(Exception):
+    """Raised while collecting the changes of a structure if a change can not be written in place."""
+
+
+def _parsed_context(structure):
+    context = getattr(structure, '_context', None)
+    if context is None or context.stream is None:
+        raise ValueError("{} was not parsed from a stream".format(structure._meta.structure_name))
+    return context
+
+
+def _is_parsed_proxy(value, field_context):
+    """Returns whether *value* is a lazy proxy that was created by *field_context*."""
+    factory = getattr(value, '__factory__', None)
+    return getattr(getattr(factory, 'func', None), '__self__', None) is field_context
+
+
+def _is_unchanged(value, field_context):
+    """Returns whether *value* is known to equal the value that was parsed into *field_context*."""
+    if field_context.lazy:
+        if not _is_parsed_proxy(value, field_context):
+            return False
+        return not value.__resolved__ or isinstance(value.__wrapped__, _IMMUTABLE_TYPES)
+
+    original = field_context.value
+    if value is original:
+        subcontext = field_context.subcontext
+        if isinstance(value, Structure):
+            return subcontext is not None and getattr(value, '_context', None) is subcontext and \
+                not value.changed_fields()
+        if isinstance(value, list):
+            return subcontext is not None and len(value) == len(subcontext.fields) and \
+                all(_is_unchanged(v, subcontext.fields[i]) for i, v in enumerate(value))
+        return value is UNLOADED or isinstance(value, _IMMUTABLE_TYPES)
+    return type(value) is type(original) and isinstance(value, _IMMUTABLE_TYPES) and value == original
+
+
+def _stream_origin(stream):
+    """Follows *stream* through :class:`Substream`, :class:`CaptureStream` and :class:`DigestStream` objects, and
+    returns the underlying stream and the offset in it that position 0 of *stream* corresponds to.
+    """
+    origin = 0
+    while isinstance(stream, (Substream, CaptureStream, DigestStream)):
+        if isinstance(stream, Substream):
+            origin += stream.start
+        stream = stream.raw
+    return stream, origin
+
+
+def _field_raw(field_context):
+    """Returns the raw bytes of *field_context*. If they were not captured, they are taken from the raw bytes of the
+    field that contains it, if that field was captured and the offsets of its nested fields are relative to it.
+    """
+    if field_context.raw is not None:
+        return field_context.raw
+    context = field_context.context
+    parent = context.parent_field
+    if parent is None or parent.offset is None or field_context.offset is None or field_context.length is None:
+        return None
+    root, origin = _stream_origin(context.stream)
+    parent_root, parent_origin = _stream_origin(parent.context.stream)
+    if root is not parent_root or origin != parent_origin + parent.offset:
+        return None
+    raw = _field_raw(parent)
+    if raw is None or field_context.offset + field_context.length > len(raw):
+        return None
+    return raw[field_context.offset:field_context.offset + field_context.length]
+
+
+def _captured_raw(structure):
+    """Returns the raw bytes *structure* was parsed from, if they were captured by a containing structure and
+    *structure* did not change since, or :const:`None` otherwise.
+    """
+    parsed_context = getattr(structure, '_context', None)
+    field_context = parsed_context.parent_field if parsed_context is not None else None
+    if field_context is None or field_context.subcontext is not parsed_context or field_context.lazy:
+        return None
+    raw = _field_raw(field_context)
+    if raw is None or not _is_unchanged(structure, field_context):
+        return None
+    return raw
+
+
+def _parents_unchanged(context, parsed_context):
+    """Returns whether the structures containing the structure that is written in *context* are written with the values
+    they were parsed with into the parents of *parsed_context*, so the written structure does not depend on a changed
+    value through e.g. ``this._`` or an override. The fields containing the structure itself are not compared.
+    """
+    while context.parent is not None:
+        path = context.parent_field
+        context, parsed_context = context.parent, parsed_context.parent
+        if parsed_context is None:
+            return False
+        if context.flat:
+            # the other items of an array are not compared
+            continue
+        if context.fields.keys() != parsed_context.fields.keys():
+            return False
+        for name, field_context in context.fields.items():
+            if field_context is not path and not _is_unchanged(field_context.value, parsed_context.fields[name]):
+                return False
+    return True
+
+
+def _encode_field(field, value, context, name):
+    buffer = io.BytesIO()
+    context.current_field_name = name
+    try:
+        field.encode_to_stream(buffer, value, context)
+    except Exception as e:
+        _reraise(e, WriteError, "Error while writing field {}", field)
+    finally:
+        context.current_field_name = None
+    return buffer.getvalue()
+
+
+def _collect_changes(structure, context, parsed_context, root):
+    """Returns a list of ``(offset, data, field_context, value, written_context)`` tuples for the fields of *structure*
+    that changed since they were parsed into *parsed_context*, where *offset* is relative to the stream *root* and
+    *written_context* is the :class:`FieldContext` the value was encoded with. The values are prepared in *context* as
+    :meth:`Structure.to_stream` would. Raises :class:`_LengthChanged` if a change can not be
+    written in place.
+    """
+    meta = structure._meta
+    context.initialize_from_meta(meta, structure=structure)
+
+    for field in meta.fields:
+        parsed, field_context = parsed_context.fields[field.name], context.fields[field.name]
+        value = field_context.value
+        if not _is_parsed_proxy(value, parsed) and hasattr(value, '__wrapped__'):
+            value = value.__wrapped__
+        field_context.value = field.get_final_value(value, context)
+        # the lengths are unchanged if the changes can be written in place, so deferred values resolve as parsed
+        field_context.offset, field_context.length = parsed.offset, parsed.length
+
+    structure.finalize(context)
+    if _failed_check(context, meta.checks) is not None:
+        raise CheckError("One of the checks for {} failed.".format(meta.structure_name))
+
+    for field in meta.fields:
+        field_context = context.fields[field.name]
+        # isinstance would resolve a lazy proxy
+        if not _is_parsed_proxy(field_context.value, parsed_context.fields[field.name]) and \
+                isinstance(field_context.value, Deferred):
+            field_context.value = field_context.value.resolve(context.f)
+
+    _, origin = _stream_origin(parsed_context.stream)
+    changes = []
+    for field in meta.fields:
+        parsed, field_context = parsed_context.fields[field.name], context.fields[field.name]
+        value = field_context.value
+        if _is_unchanged(value, parsed):
+            continue
+
+        nested = None
+        if not parsed.lazy and value is parsed.value and parsed.subcontext is not None:
+            if isinstance(value, Structure):
+                nested = _collect_nested_changes(value, parsed, field_context, root)
+            elif isinstance(value, list) and hasattr(field, 'base_field') and \
+                    len(value) == len(parsed.subcontext.fields):
+                subcontext = field_context.create_subcontext(flat=True)
+                nested = []
+                for i, element in enumerate(value):
+                    element_parsed = parsed.subcontext.fields[i]
+                    subcontext.fields[i] = field.base_field.field_context(subcontext, field_name=i, value=element)
+                    if _is_unchanged(element, element_parsed):
+                        continue
+                    element_changes = _collect_nested_changes(element, element_parsed, subcontext.fields[i], root)
+                    if element_changes is None:
+                        # the element is written as a whole, e.g. if it is not a structure or has a checksum
+                        data = _encode_field(field.base_field, element, subcontext, i)
+                        if parsed.offset is None or element_parsed.offset is None or \
+                                len(data) != element_parsed.length:
+                            raise _LengthChanged()
+                        element_changes = [(origin + parsed.offset + element_parsed.offset, data, element_parsed,
+                                            element, subcontext.fields[i])]
+                    else:
+                        _patch_raw(element_parsed, element_changes, origin + parsed.offset + element_parsed.offset)
+                    nested.extend(element_changes)
+        if nested is not None:
+            _patch_raw(parsed, nested, origin + parsed.offset)
+            changes.extend(nested)
+            continue
+
+        length = parsed.length
+        if length is None:
+            # the length of a lazy field is not always known, but it can be determined for fixed-length fields
+            try:
+                length = len(field)
+            except ImpossibleToCalculateLengthError:
+                raise _LengthChanged()
+        data = _encode_field(field, value, context, field.name)
+        if parsed.offset is None or len(data) != length:
+            raise _LengthChanged()
+        changes.append((origin + parsed.offset, data, parsed, value, field_context))
+    return changes
+
+
+def _attach_written_context(value, field_context):
+    """Sets the :attr:`Structure._context` of the nested structures in *value* to the subcontexts they were written
+    with, so they are compared to the written values afterwards.
+    """
+    subcontext = field_context.subcontext
+    if subcontext is None or not subcontext.fields:
+        # e.g. a structure that was written using its captured raw bytes
+        return
+    if isinstance(value, Structure):
+        value._context = subcontext
+        for name, nested_context in subcontext.fields.items():
+            _attach_written_context(getattr(value, name), nested_context)
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            if i in subcontext.fields:
+                _attach_written_context(v, subcontext.fields[i])
+
+
+def _parsed_length(structure, context):
+    """Returns the length of *structure* as parsed into *context*, including lazy fields at its end whose length was
+    not determined while parsing.
+    """
+    length = context.length
+    for field in structure._meta.fields:
+        field_context = context.fields[field.name]
+        if field_context.offset is not None and field_context.length is None:
+            try:
+                length = max(length, field_context.offset - context.offset + len(field))
+            except ImpossibleToCalculateLengthError:
+                pass
+    return length
+
+
+def _merge_changes(changes):
+    """Merges the data of adjacent changes, which must be sorted by offset, and yields ``(offset, data)`` tuples."""
+    offset = end = None
+    parts = []
+    for change_offset, data, *_ in changes:
+        if parts and change_offset != end:
+            yield offset, b"".join(parts)
+            parts = []
+        if not parts:
+            offset = change_offset
+        parts.append(data)
+        end = change_offset + len(data)
+    if parts:
+        yield offset, b"".join(parts)
+
+
+def _patch_raw(field_context, changes, offset):
+    """Applies *changes* to the captured raw bytes of *field_context*, which starts at *offset*, so they match the
+    written data.
+    """
+    if field_context.raw is None or not changes:
+        return
+    raw = bytearray(field_context.raw)
+    for change_offset, data, *_ in changes:
+        raw[change_offset - offset:change_offset - offset + len(data)] = data
+    field_context.raw = bytes(raw)
+
+
+def _collect_nested_changes(value, parsed, field_context, root):
+    """Returns the changes of the nested structure *value* that was parsed into *parsed*, or :const:`None` if they can
+    not be written field by field.
+    """
+    subcontext = parsed.subcontext
+    if not isinstance(value, Structure) or subcontext is None or getattr(value, '_context', None) is not subcontext \
+            or value._meta.stream_wrappers or _stream_origin(subcontext.stream)[0] is not root:
+        return None
+    return _collect_changes(value, field_context.create_subcontext(), subcontext, root)
 
 
 class StructureBase(type):
@@ -45,10 +468,17 @@ class StructureBase(type):
         classcell = namespace.pop('__classcell__', None)
         if classcell is not None:
             new_attrs['__classcell__'] = classcell
-        new_class = super().__new__(cls, name, bases, new_attrs, **kwargs)
 
         attr_meta = namespace.pop('Meta', None)
-        meta = attr_meta or getattr(new_class, 'Meta', None)
+        meta = attr_meta or next((b.Meta for b in bases if hasattr(b, 'Meta')), None)
+
+        # Slots must be known when creating the class, so we can't rely on the StructureOptions for this.
+        if getattr(meta, 'slots', False):
+            new_attrs['__slots__'] = tuple(n for n, v in namespace.items() if isinstance(v, Field)) + ('_context', )
+            new_attrs['__getstate__'] = _getstate_slots
+            new_attrs['__setstate__'] = _setstate_slots
+
+        new_class = super().__new__(cls, name, bases, new_attrs, **kwargs)
         new_class.add_to_class('_meta', StructureOptions(meta))
 
         # Add all attributes to the class.
@@ -84,6 +514,8 @@ class StructureBase(type):
 
 
 class Structure(metaclass=StructureBase):
+    __slots__ = ()
+
     def __init__(self, _context=None, **kwargs):
         """A base structure. It is the basis for all structures. You can pass in keyword arguments to provide
         different values than the field's defaults.
@@ -91,12 +523,12 @@ class Structure(metaclass=StructureBase):
         :param _context: The context of the field, only provided by :meth:`from_stream`.
         :param kwargs:
         """
-        if _context is None:
+        new_context = False
+        if _context is not None:
+            self._context = _context
+        elif self._meta.defaults_take_context:
             _context = ParsingContext(structure=self)
             new_context = True
-        else:
-            self._context = _context
-            new_context = False
 
         for field in self._meta.fields:
             try:
@@ -111,6 +543,137 @@ class Structure(metaclass=StructureBase):
 
         super().__init__()
 
+    @classmethod
+    def _from_context(cls, context):
+        """Internal constructor used by :meth:`from_stream`, that assigns the parsed values in the context directly to
+        a new instance, bypassing the keyword argument handling of :meth:`__init__`. If a subclass overrides
+        :meth:`__init__`, it is called as normal.
+        """
+        if cls.__init__ is not Structure.__init__:
+            return cls(_context=context, **context.field_values)
+
+        self = cls.__new__(cls)
+        self._context = context
+        for name, field_context in context.fields.items():
+            setattr(self, name, field_context.value)
+        return self
+
+    def detach_context(self):
+        """Resolves all lazy fields and removes the reference to the :class:`ParsingContext` from this structure and
+        all nested structures. This releases the context, including the :class:`FieldContext` objects and the stream
+        that was parsed, when it is no longer referenced elsewhere. After this call, :attr:`_context` is undefined.
+        """
+        for field in self._meta.fields:
+            value = getattr(self, field.name)
+            if hasattr(value, '__wrapped__'):
+                value = value.__wrapped__
+                setattr(self, field.name, value)
+            _detach_value(value)
+
+        try:
+            del self._context
+        except AttributeError:
+            pass
+
+    def pins_stream(self):
+        """Returns whether this structure, or any of its nested structures, still holds a reference to the
+        :class:`ParsingContext` it was parsed with, and therefore to the stream it was parsed from.
+        """
+        if hasattr(self, '_context'):
+            return True
+        return any(_value_pins_stream(getattr(self, field.name)) for field in self._meta.fields)
+
+    def changed_fields(self):
+        """Returns the names of the fields whose value changed since this :class:`Structure` was parsed by
+        :meth:`from_stream`. Immutable values are compared to the parsed value, while nested structures and lists are
+        changed if any of their values changed. Values of other mutable types are changed unless they were never
+        replaced or resolved, as changes to them can not be detected.
+
+        :raises ValueError: if this structure was not parsed from a stream, or its context was detached.
+        """
+        context = _parsed_context(self)
+        return [field.name for field in self._meta.fields
+                if not _is_unchanged(getattr(self, field.name), context.fields[field.name])]
+
+    def save_changes(self, stream, *, allow_resize=False):
+        """Writes the changes made to this :class:`Structure` since it was parsed by :meth:`from_stream` to *stream*,
+        which must contain the parsed data at the same offsets, e.g. the parsed file opened for writing. Returns the
+        amount of bytes written.
+
+        Only the fields that changed, as returned by :meth:`changed_fields`, are written at the offsets they were read
+        from. Nested structures and arrays that were changed in place are written field by field and element by
+        element as well. If a change alters the length of a field, or the structure uses stream wrappers (e.g. for
+        :class:`BitField`), the entire structure is written using :meth:`to_stream` at the offset it was parsed from
+        instead.
+
+        If the length of the structure changes, a :class:`ValueError` is raised before anything is written, unless
+        *allow_resize* is true. In that case, the data following the structure is read and written directly after the
+        new structure, so *stream* must be readable as well. Note that the length and offset fields of other
+        structures are not updated.
+
+        Afterwards, the written values are the new parsed values, so calling this method again only writes new
+        changes.
+
+        :raises ValueError: if this structure was not parsed from a stream, or its context was detached, or if its
+            length changed and *allow_resize* is false.
+        """
+        parsed_context = _parsed_context(self)
+        root, origin = _stream_origin(parsed_context.stream)
+
+        changes = None
+        if not self._meta.stream_wrappers:
+            try:
+                changes = _collect_changes(self, ParsingContext(parent=parsed_context.parent), parsed_context, root)
+            except _LengthChanged:
+                pass
+
+        start = origin + parsed_context.offset
+        parsed_length = _parsed_length(self, parsed_context)
+        tail = None
+        if changes is None:
+            if allow_resize:
+                stream.seek(start + parsed_length)
+                tail = stream.read()
+            elif self.byte_size(ParsingContext(parent=parsed_context.parent)) != parsed_length:
+                raise ValueError("The length of {} changed, which requires allow_resize=True"
+                                 .format(self._meta.structure_name))
+
+        # the raw bytes of the structures containing this one are outdated once the changes are written
+        field_context = parsed_context.parent_field
+        while field_context is not None:
+            field_context.raw = None
+            field_context = field_context.context.parent_field
+
+        if changes is None:
+            stream.seek(start)
+            context = ParsingContext(parent=parsed_context.parent)
+            written = self.to_stream(stream, context)
+            if tail is not None and written != parsed_length:
+                # move the data after the structure, which is never truncated
+                stream.seek(start + written)
+                stream.write(tail)
+                stream.truncate()
+            self._context = context
+            for name, field_context in context.fields.items():
+                _attach_written_context(getattr(self, name), field_context)
+            return written
+
+        written = 0
+        changes.sort(key=lambda change: change[0])
+        for offset, data in _merge_changes(changes):
+            stream.seek(offset)
+            written += stream.write(data)
+
+        for _, data, field_context, value, written_context in changes:
+            field_context.lazy = False
+            field_context.value = value
+            # nested values are compared to the values they were written with from now on
+            field_context.subcontext = written_context.subcontext
+            _attach_written_context(value, written_context)
+            if field_context.raw is not None:
+                field_context.raw = data
+        return written
+
     def __repr__(self):
         return '<%s: %s>' % (self.__class__.__name__, self)
 
@@ -152,25 +715,31 @@ class Structure(metaclass=StructureBase):
         pass
 
     @classmethod
-    def _prepare_stream(cls, stream):
-        """Prepares the stream for parsing with this Structure by wrapping it in the necessary stream wrappers."""
+    def _prepare_stream(cls, stream, context=None):
+        """Prepares the stream for parsing with this Structure by wrapping it in the necessary stream wrappers. If
+        :attr:`ParsingContext.capture_raw` is set on the provided context, the stream is wrapped in a
+        :class:`CaptureStream` even if :attr:`StructureOptions.capture_raw` is not set.
+        """
 
         # wrap the stream in a Substream to enable the length specifier to work
         if cls._meta.length is not None:
             stream = Substream(stream, length=cls._meta.length)
 
         # wrap the stream in CaptureStream if capture_raw is True
-        if cls._meta.capture_raw:
+        if cls._meta.capture_raw or (context is not None and context.capture_raw):
             stream = CaptureStream(stream)
 
         # wrap the stream in a BitStream to enable bit-based methods
-        for w in cls._meta.get_stream_wrappers():
-            stream = w(stream)
+        for w in cls._meta.stream_wrappers:
+            if getattr(w, 'requires_context', False):
+                stream = w(stream, context)
+            else:
+                stream = w(stream)
 
         return stream
 
     @classmethod
-    def from_stream(cls, stream, context=None):
+    def from_stream(cls, stream, context=None, *, keep_context=True, only=None, where=None):
         """Reads a stream and converts it to a :class:`Structure` instance. You can explicitly provide a
         :class:`ParsingContext`, otherwise one will be created automatically.
 
@@ -181,6 +750,16 @@ class Structure(metaclass=StructureBase):
 
         :param stream: A buffered bytes stream.
         :param ParsingContext context: A context to use while parsing the stream.
+        :param bool keep_context: If false, :meth:`detach_context` is called on the constructed :class:`Structure`,
+            so it does not keep the context and the stream alive.
+        :param only: If set, a field name or an iterable of field names to decode. Nested fields can be specified
+            using dotted names, e.g. ``'chunks.chunk_type'``. Other fields are seeked over where possible and are set
+            to :const:`UNLOADED`, unless they are needed to decode the requested fields.
+            :attr:`StructureOptions.checks` are not run in this case.
+        :param where: If set, a predicate that is evaluated as soon as the fields it references have been parsed,
+            either a ``this`` expression or a callable that gets the :class:`ParsingContext.F` object. If it is false,
+            the remaining fields are seeked over where possible and :const:`None` is returned instead of a
+            :class:`Structure`, without running :attr:`StructureOptions.checks`.
         :rtype: Structure, int
         :return: A tuple of the constructed :class:`Structure` and the amount of bytes read (defined as the last
             position of the read bytes).
@@ -189,7 +768,24 @@ class Structure(metaclass=StructureBase):
         if context is None:
             context = ParsingContext()
 
-        context.stream = stream = cls._prepare_stream(stream)
+        if only is not None:
+            context.projection = _projection(only)
+        projection = context.projection
+        if projection is not None:
+            for name in projection:
+                if not any(field.name == name for field in cls._meta.fields):
+                    raise ValueError("Unknown field {} in projection of {}".format(name, cls._meta.structure_name))
+
+        if isinstance(stream, StatsStream) and stream.listener.context is not context:
+            with stream.listener.attached(context):
+                return cls.from_stream(stream, context, keep_context=keep_context, where=where)
+
+        context.stream = stream = cls._prepare_stream(stream, context)
+
+        profiler = context.profiler
+        if profiler is not None and context.parent is None and not profiler.sample():
+            context.profiler = profiler = None
+        listener = context.listener
 
         # Fill the context with all fields from the context
         context.initialize_from_meta(cls._meta)
@@ -202,27 +798,90 @@ class Structure(metaclass=StructureBase):
 
         # Resolve lazy fields that have absolute offsets first
         # This allows referencing fields that are defined later, and absolute offset fields can simply be referenced
+        preparsed = False
         for field in cls._meta.fields:
             if field.preparsable:
-                with _recapture(ParseError("Error while seeking the start of lazy field {}".format(field.full_name))):
-                    offset = field.seek_start(stream, context, offset - start_offset)
-                context.fields[field.name].add_parse_info(value=None, offset=offset, length=None, lazy=True)
+                try:
+                    field_offset = field._seek_start(stream, context, offset - start_offset)
+                except Exception as e:
+                    _reraise(e, ParseError, "Error while seeking the start of lazy field {}", field)
+                context.fields[field.name].add_parse_info(value=None, offset=field_offset, length=None, lazy=True)
+                preparsed = True
+
+        if preparsed:
+            stream.seek(start_offset)
+
+        # Seeking over fields that have already been resolved is postponed until the stream is used again, so that
+        # consecutive resolved fields only require a single seek.
+        pending_seek = 0
 
-        stream.seek(start_offset)
+        # The predicate is evaluated before each field, until all fields it references are available
+        matches = True if where is None else None
 
         # Now do all the fields, this includes all already resolved fields.
         for field in cls._meta.fields:
-            with _recapture(ParseError("Error while seeking the start of field {}".format(field.full_name))):
-                offset = field.seek_start(stream, context, offset - start_offset)
+            if matches is None:
+                matches = _evaluate_where(context, where)
+
+            # fields with an offset seek to an absolute position, so they do not require the pending seek
+            if pending_seek and field.offset is None:
+                stream.seek(pending_seek, io.SEEK_CUR)
+                pending_seek = 0
+
+            try:
+                new_offset = field._seek_start(stream, context, offset - start_offset)
+            except Exception as e:
+                _reraise(e, ParseError, "Error while seeking the start of field {}", field)
+            if new_offset is not None:
+                if profiler is not None:
+                    profiler.seek(field)
+                offset, pending_seek = new_offset, 0
+            elif pending_seek:
+                # the offset of the field turned out to be None, so it starts at the current position after all
+                stream.seek(pending_seek, io.SEEK_CUR)
+                pending_seek = 0
 
             # check if this field has already been resolved
             # this is possible if it was a lazy field, but also required by another field
             if context.fields[field.name].resolved:
-                stream.seek(context.fields[field.name].length, io.SEEK_CUR)
+                if profiler is not None:
+                    profiler.seek(field)
+                pending_seek += context.fields[field.name].length
                 offset += context.fields[field.name].length
                 max_offset = max(offset, max_offset)
                 continue
 
+            if listener is not None:
+                listener.field_start(context.fields[field.name], offset - start_offset)
+
+            # fields that are not in the projection, or all fields after the predicate turned out false, are skipped
+            # if we can find their end. They are registered as lazy fields, so they are still resolved when another
+            # field depends on them.
+            skip = matches is False
+            if projection is not None:
+                if field.name in projection:
+                    context.fields[field.name].projection = projection[field.name]
+                else:
+                    skip = True
+            if skip:
+                try:
+                    skip_offset = field.seek_end(stream, context, offset - start_offset)
+                except Exception as e:
+                    _reraise(e, ParseError, "Error while seeking the end of field {}", field)
+                if skip_offset is not None:
+                    if profiler is not None:
+                        profiler.seek(field)
+                    context.fields[field.name].add_parse_info(offset=offset, length=skip_offset - offset, lazy=True)
+                    context.fields[field.name].skipped = True
+                    offset = skip_offset
+                    max_offset = max(offset, max_offset)
+                    if listener is not None:
+                        listener.field_end(context.fields[field.name])
+                    continue
+                if matches is False:
+                    # a rejected record only needs its length, so we decode none of the nested fields we can skip
+                    context.fields[field.name].projection = {}
+
             # we check whether we need a lazy length by checking whether we have a next field that has no
             # absolute offset
             need_lazy_offset, lazy_offset = False, None
@@ -232,13 +891,22 @@ class Structure(metaclass=StructureBase):
 
                 # obtain the lazy length if we need it
                 if need_lazy_offset:
-                    with _recapture(ParseError("Error while seeking the end of field {}".format(field.full_name))):
+                    try:
                         lazy_offset = field.seek_end(stream, context, offset - start_offset)
+                    except Exception as e:
+                        _reraise(e, ParseError, "Error while seeking the end of field {}", field)
 
             # if we are not a lazy field or we haven't found a lazy length while we need it, parse the field as needed
             if not field.lazy or (lazy_offset is None and need_lazy_offset):
-                with _recapture(ParseError("Error while parsing field {}".format(field.full_name))):
-                    result, consumed = field.decode_from_stream(stream, context)
+                context.current_field_name = field.name
+                try:
+                    if profiler is None:
+                        result, consumed = field.decode_from_stream(stream, context)
+                    else:
+                        result, consumed = profiler.decode(field, stream, context)
+                except Exception as e:
+                    _reraise(e, ParseError, "Error while parsing field {}", field)
+                context.current_field_name = None
                 context.fields[field.name].add_parse_info(value=result, offset=offset, length=consumed)
                 offset += consumed
                 max_offset = max(offset, max_offset)
@@ -247,18 +915,53 @@ class Structure(metaclass=StructureBase):
                 context.fields[field.name].add_parse_info(offset=offset,
                                                           length=None if lazy_offset is None else lazy_offset - offset,
                                                           lazy=True)
+                if lazy_offset is not None:
+                    if profiler is not None:
+                        profiler.seek(field)
+                    offset = lazy_offset
+
+            if listener is not None:
+                listener.field_end(context.fields[field.name])
+
+        # leave the stream at the end of the structure, so the next read continues from there
+        if max_offset != offset - pending_seek:
+            stream.seek(max_offset - offset + pending_seek, io.SEEK_CUR)
+
+        if matches is None:
+            matches = bool(_retrieve_property(context, where))
+        if not matches:
+            context.done = True
+            return None, max_offset - start_offset
 
         # Load the initial values
         for field in cls._meta.fields:
-            context.fields[field.name].value = field.get_initial_value(context.fields[field.name].value, context)
+            field_context = context.fields[field.name]
+            if field_context.skipped:
+                field_context.lazy = False
+                field_context.value = UNLOADED
+                continue
+
+            lazy = field_context.lazy
+            value = field.get_initial_value(field_context.value, context)
+            # a lazy field always returns a new proxy, and storing it would create a reference cycle
+            if not lazy:
+                field_context.value = value
 
         cls.initialize(context)
 
-        if not all((f(context.f) for f in cls._meta.checks)):
-            raise CheckError("One of the checks for {} failed.".format(cls._meta.structure_name))
+        if projection is None:
+            failed = _failed_check(context, cls._meta.checks)
+            if failed is not None:
+                if listener is not None:
+                    listener.check_failed(context, failed)
+                raise CheckError("One of the checks for {} failed.".format(cls._meta.structure_name))
 
         context.done = True
-        return cls(_context=context, **context.field_values), max_offset - start_offset
+        context.offset, context.length = start_offset, max_offset - start_offset
+        result = cls._from_context(context)
+        if not keep_context:
+            result.detach_context()
+        return result, max_offset - start_offset
 
     def to_stream(self, stream, context=None):
         """Writes the current :class:`Structure` to the provided stream. You can explicitly provide a
@@ -277,57 +980,170 @@ class Structure(metaclass=StructureBase):
         if context is None:
             context = ParsingContext()
 
-        context.stream = stream = self._prepare_stream(stream)
-
-        # Fill the context with all fields from the context
-        context.initialize_from_meta(self._meta, structure=self)
-
-        # done in two loops to allow for finalizing
-        for field in self._meta.fields:
-            # Resolve __wrapped__ objects
-            v = getattr(self, field.name)
-            if hasattr(v, '__wrapped__'):
-                v = v.__wrapped__
-
-            context.fields[field.name].value = field.get_final_value(v, context)
-
-        self.finalize(context)
-
-        if not all((f(context.f) for f in self._meta.checks)):
+        if isinstance(stream, StatsStream) and stream.listener.context is not context:
+            with stream.listener.attached(context):
+                return self.to_stream(stream, context)
+
+        # an unchanged nested structure is written as the bytes it was parsed from, if these were captured and the
+        # structures containing it did not change either
+        if context.parent is not None and context.listener is None and context.profiler is None and \
+                type(self).finalize is Structure.finalize:
+            raw = _captured_raw(self)
+            if raw is not None and _parents_unchanged(context, self._context):
+                try:
+                    offset = stream.tell()
+                except (OSError, AttributeError):
+                    offset = 0
+                context.stream = stream
+                written = stream.write(raw)
+                context.done = True
+                context.offset, context.length = offset, written
+                return written
+
+        context.stream = stream = self._prepare_stream(stream, context)
+
+        profiler = context.profiler
+        if profiler is not None and context.parent is None and not profiler.sample():
+            context.profiler = profiler = None
+        listener = context.listener
+
+        has_deferred = self._initialize_write_context(context)
+
+        failed = _failed_check(context, self._meta.checks)
+        if failed is not None:
+            if listener is not None:
+                listener.check_failed(context, failed)
             raise CheckError("One of the checks for {} failed.".format(self._meta.structure_name))
 
+        if has_deferred and not _is_seekable(stream):
+            # the placeholders can not be overwritten, so we write the structure to a buffer first
+            buffer = io.BytesIO()
+            written = self.to_stream(buffer, context)
+            stream.write(buffer.getvalue())
+            return written
+
         # We keep track of our starting offset, the current offset and the max offset.
         try:
             start_offset = max_offset = offset = stream.tell()
         except (OSError, AttributeError):
             start_offset = max_offset = offset = 0
 
-        for field in self._meta.fields:
-            with _recapture(WriteError("Error while seeking start of field {}".format(field.full_name))):
-                offset = field.seek_start(stream, context, offset - start_offset)
-            with _recapture(WriteError("Error while writing field {}".format(field.full_name))):
-                written = field.encode_to_stream(stream, context.fields[field.name].value, context)
+        # maps the names of the fields that deferred fields wait for, to the deferred fields and their lengths
+        pending = {}
+        written_names = set()
 
-            context.fields[field.name].add_parse_info(offset=offset, length=written)
+        for field in self._meta.fields:
+            try:
+                new_offset = field._seek_start(stream, context, offset - start_offset)
+            except Exception as e:
+                _reraise(e, WriteError, "Error while seeking start of field {}", field)
+            if new_offset is not None:
+                if profiler is not None:
+                    profiler.seek(field)
+                offset = new_offset
+            field_context = context.fields[field.name]
+            if listener is not None:
+                listener.field_start(field_context, offset - start_offset)
+            context.current_field_name = field.name
+            value = field_context.value
+            try:
+                if has_deferred and isinstance(value, Deferred) and value.after in written_names:
+                    field_context.value = value = value.resolve(context.f)
+                if has_deferred and isinstance(value, Deferred):
+                    # write a placeholder, which is overwritten when the value is known
+                    written = stream.write(bytes(len(field)))
+                    pending.setdefault(value.after, []).append((field, written))
+                elif profiler is None:
+                    written = field.encode_to_stream(stream, value, context)
+                else:
+                    written = profiler.encode(field, stream, value, context)
+            except Exception as e:
+                _reraise(e, WriteError, "Error while writing field {}", field)
+            context.current_field_name = None
+
+            field_context.add_parse_info(offset=offset, length=written)
+            if listener is not None:
+                listener.field_end(field_context)
 
             offset += written
-            max_offset = max(offset, max_offset)
+            if offset > max_offset:
+                max_offset = offset
+
+            if has_deferred:
+                written_names.add(field.name)
+                if field.name in pending:
+                    for deferred_field, placeholder in pending.pop(field.name):
+                        _write_deferred(stream, deferred_field, context, placeholder)
+                    stream.seek(offset)
+
+        if pending:
+            for deferred_fields in pending.values():
+                for deferred_field, placeholder in deferred_fields:
+                    _write_deferred(stream, deferred_field, context, placeholder)
+            stream.seek(offset)
 
         if hasattr(stream, 'finalize'):
             offset += stream.finalize()
         max_offset = max(offset, max_offset)
 
         context.done = True
+        context.offset, context.length = start_offset, max_offset - start_offset
 
         return max_offset - start_offset
 
+    def _initialize_write_context(self, context):
+        """Fills the context with the final values of all fields and finalizes it. Returns whether any of the values
+        is :class:`Deferred`.
+        """
+        # Fill the context with all fields from the context
+        context.initialize_from_meta(self._meta, structure=self)
+
+        # done in two loops to allow for finalizing
+        has_deferred = False
+        for field in self._meta.fields:
+            # Resolve __wrapped__ objects
+            v = getattr(self, field.name)
+            if hasattr(v, '__wrapped__'):
+                v = v.__wrapped__
+            if v is UNLOADED:
+                raise WriteError("Field {} of {} was not loaded and can not be written"
+                                 .format(field.name, self._meta.structure_name))
+
+            v = context.fields[field.name].value = field.get_final_value(v, context)
+            if isinstance(v, Deferred):
+                has_deferred = True
+
+        self.finalize(context)
+        return has_deferred
+
     @classmethod
-    def from_bytes(cls, bytes, context=None):
+    def from_bytes(cls, bytes, context=None, *, keep_context=True, only=None, where=None):
         """A short-hand method of calling :meth:`from_stream`, using bytes rather than a stream, and returns the
         constructed :class:`Structure` immediately.
         """
 
-        return cls.from_stream(io.BytesIO(bytes), context)[0]
+        return cls.from_stream(io.BytesIO(bytes), context, keep_context=keep_context, only=only, where=where)[0]
+
+    @classmethod
+    def iter_stream(cls, stream, where=None, *, keep_context=True, only=None):
+        """Parses consecutive records of this :class:`Structure` from a seekable stream until it is exhausted, and
+        yields the constructed :class:`Structure` objects. If *where* is set, only the records matching this predicate
+        are yielded. The remainder of a rejected record is seeked over where possible, see :meth:`from_stream`.
+        """
+
+        # from_stream leaves the stream at the end of the record, so we only need to track the offset
+        offset = stream.tell()
+        while True:
+            if not stream.read(1):
+                return
+            stream.seek(offset)
+
+            result, consumed = cls.from_stream(stream, keep_context=keep_context, only=only, where=where)
+            if consumed <= 0:
+                raise ParseError("Record of {} at offset {} has no length".format(cls._meta.structure_name, offset))
+            offset += consumed
+            if result is not None:
+                yield result
 
     def to_bytes(self, context=None):
         """A short-hand method of calling :meth:`to_stream`, writing to bytes rather than to a stream. It returns the
@@ -337,6 +1153,157 @@ class Structure(metaclass=StructureBase):
         self.to_stream(bytesio, context)
         return bytesio.getvalue()
 
+    def to_buffer(self, buffer, offset=0, context=None):
+        """Writes the structure directly into a preallocated, writable bytes-like object, such as a :class:`bytearray`,
+        :class:`memoryview` or :class:`mmap.mmap`, starting at *offset*. Use :meth:`byte_size` to determine the size
+        that is required. Returns the amount of bytes written.
+
+        Raises a :exc:`WriteError` if the structure does not fit in the buffer.
+        """
+        stream = BufferStream(buffer, offset)
+        written = self.to_stream(stream, context)
+        try:
+            stream.fill(written)
+        except IOError as e:
+            _reraise(e, WriteError, "Error while writing {} to buffer", self._meta.structure_name)
+        return written
+
+    def to_segments(self, context=None):
+        """Writes the structure to a :class:`SegmentStream` and returns the written segments as a list of
+        :class:`memoryview` objects. Large values, such as the payload of a :class:`BytesField`, are referenced rather
+        than copied. The segments can be written using :func:`write_segments`.
+        """
+        stream = SegmentStream()
+        self.to_stream(stream, context)
+        return stream.segments()
+
+    def byte_size(self, context=None):
+        """Returns the amount of bytes this structure is written with. If the structure has a fixed length, this is
+        ``len(structure)`` and the structure is not written at all. Otherwise, the sizes of the fields with a fixed
+        length are added up, and only the other fields are written, to a stream that discards the data. If the
+        position of the fields depends on each other, e.g. due to :attr:`Field.offset`, :attr:`Field.skip`,
+        :attr:`StructureOptions.alignment` or :class:`BitField`, or if a field without a fixed length requires a stream
+        wrapper, the entire structure is written instead.
+        """
+        try:
+            return len(self.__class__)
+        except ImpossibleToCalculateLengthError:
+            pass
+
+        meta = self._meta
+        if meta.alignment is not None or meta.length is not None or BitStream in meta.stream_wrappers or \
+                any(field.offset is not None or field.skip is not None for field in meta.fields):
+            return self.to_stream(_NullStream(), context)
+
+        lengths = {}
+        for field in meta.fields:
+            try:
+                lengths[field.name] = len(field)
+            except ImpossibleToCalculateLengthError:
+                if field.stream_wrappers:
+                    return self.to_stream(_NullStream(), context)
+
+        if context is None:
+            context = ParsingContext()
+        self._initialize_write_context(context)
+
+        size = 0
+        stream = _NullStream()
+        for field in meta.fields:
+            if field.name in lengths:
+                size += lengths[field.name]
+                continue
+            context.current_field_name = field.name
+            try:
+                size += field.encode_to_stream(stream, context.fields[field.name].value, context)
+            except Exception as e:
+                _reraise(e, WriteError, "Error while writing field {}", field)
+            context.current_field_name = None
+        return size
+
+    @classmethod
+    def write_many(cls, records, stream, *, buffer_size=1 << 16, workers=1, chunk_size=1024):
+        """Writes all *records*, which are instances of this :class:`Structure`, consecutively to *stream* and returns
+        the amount of bytes written. The records are written to an in-memory buffer first, which is written to
+        *stream* in chunks of about *buffer_size* bytes, rather than writing every field to *stream* separately. If the
+        structure only consists of fixed-length integers and single-value :class:`StructField` objects, the values of
+        each record are packed at once using :mod:`struct`.
+
+        If *workers* is larger than 1, chunks of *chunk_size* records are written to bytes by a
+        :class:`concurrent.futures.ProcessPoolExecutor`, while the output remains in the order of *records*. This
+        requires the records to be picklable, and the structure to be importable by the workers.
+        """
+        if workers > 1:
+            return cls._write_many_parallel(records, stream, workers, chunk_size)
+
+        layout = _fixed_layout(cls)
+        if layout is not None:
+            return cls._write_many_fixed(records, stream, layout, buffer_size)
+
+        # fields with an absolute offset must be written relative to the start of the record
+        relative = any(field.offset is not None for field in cls._meta.fields)
+
+        total = 0
+        buffer = io.BytesIO()
+        position = 0
+        for record in records:
+            if relative:
+                position += record.to_stream(Substream(buffer, position))
+            else:
+                position += record.to_stream(buffer)
+            buffer.seek(position)
+            if position >= buffer_size:
+                # a new buffer is used every time, as the stream may keep a reference to the written data
+                total += stream.write(buffer.getvalue())
+                buffer = io.BytesIO()
+                position = 0
+        if position:
+            total += stream.write(buffer.getvalue())
+        return total
+
+    @classmethod
+    def _write_many_fixed(cls, records, stream, layout, buffer_size):
+        """Writes *records* by packing the values of their fields using the :class:`struct.Struct` *layout*, as
+        returned by :func:`_fixed_layout`, bypassing :meth:`to_stream`.
+        """
+        pack = layout.pack
+        names = [field.name for field in cls._meta.fields]
+        get_values = operator.attrgetter(*names) if len(names) > 1 else lambda record: (getattr(record, names[0]),)
+
+        total = 0
+        buffer = bytearray()
+        for record in records:
+            try:
+                if type(record) is not cls:
+                    raise TypeError()
+                buffer += pack(*get_values(record))
+            except (struct.error, TypeError):
+                # e.g. a value that is out of range, which to_stream reports properly
+                buffer += record.to_bytes()
+            if len(buffer) >= buffer_size:
+                total += stream.write(buffer)
+                buffer = bytearray()
+        if buffer:
+            total += stream.write(buffer)
+        return total
+
+    @classmethod
+    def _write_many_parallel(cls, records, stream, workers, chunk_size):
+        func = functools.partial(_write_records, cls)
+        chunks = _chunked(records, chunk_size)
+
+        # We keep a bounded window of outstanding chunks, so the records are not all pickled at once.
+        total = 0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque(executor.submit(func, chunk)
+                                        for chunk in itertools.islice(chunks, workers * 2))
+            while pending:
+                data = pending.popleft().result()
+                for chunk in itertools.islice(chunks, 1):
+                    pending.append(executor.submit(func, chunk))
+                total += stream.write(data)
+        return total
+
     @classmethod
     def as_cstruct(cls):
         result = "struct {} {{\n".format(cls._meta.structure_name)
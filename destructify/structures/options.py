@@ -1,5 +1,7 @@
 from bisect import bisect
 
+from ..fields.base import _takes_context
+
 
 class StructureOptions:
     def __init__(self, meta=None):
@@ -15,6 +17,10 @@ class StructureOptions:
         self.checks = ()
         self.capture_raw = False
         self.length = None
+        self.slots = False
+
+        self.defaults_take_context = False
+        self.stream_wrappers = ()
 
     def contribute_to_class(self, cls, name):
         setattr(cls, '_meta', self)
@@ -29,7 +35,7 @@ class StructureOptions:
                 if name.startswith('_'):
                     del meta_attrs[name]
             for attr_name in ('structure_name', 'byte_order', 'encoding',
-                              'alignment', 'checks', 'capture_raw', 'length'):
+                              'alignment', 'checks', 'capture_raw', 'length', 'slots'):
                 if attr_name in meta_attrs:
                     setattr(self, attr_name, meta_attrs.pop(attr_name))
                 elif hasattr(self.meta, attr_name):
@@ -82,3 +88,11 @@ class StructureOptions:
     def initialize_fields(self):
         for field in self.fields:
             field.initialize()
+
+        # If none of the defaults depend on other fields, we do not need a ParsingContext to construct a Structure
+        self.defaults_take_context = any(field.has_default and _takes_context(field.default) for field in self.fields)
+
+        # The stream wrappers are determined once, as they are needed for every structure that is parsed or written.
+        # Wrappers that follow the fields in the context (e.g. DigestStream) go first, so they see all bytes.
+        self.stream_wrappers = tuple(sorted(self.get_stream_wrappers(),
+                                            key=lambda w: not getattr(w, 'requires_context', False)))
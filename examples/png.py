@@ -1,6 +1,5 @@
 import destructify
 import enum
-from binascii import crc32
 
 
 class ChunkType(destructify.PseudoMemberEnumMixin, enum.Enum):
@@ -36,7 +35,7 @@ class PngChunk_IHDR(destructify.Structure):
 
 class PngChunk_tEXt(destructify.Structure):
     keyword = destructify.StringField(terminator=b"\x00", encoding="latin1")
-    text = destructify.StringField(length=lambda f: f._.length - (len(f.keyword) + 1), encoding="latin1")
+    text = destructify.StringField(length=-1, encoding="latin1")
 
 
 class PaletteEntry(destructify.Structure):
@@ -60,15 +59,8 @@ class PngChunk_pHYs(destructify.Structure):
     unit = destructify.EnumField(destructify.IntegerField(1), PhysUnit)
 
 
-def calculate_crc(f):
-    crc = 0
-    crc = crc32(f._context.fields['chunk_type'].raw, crc)
-    crc = crc32(f._context.fields['chunk_data'].raw, crc)
-    return crc
-
-
 class PngChunk(destructify.Structure):
-    length = destructify.IntegerField(4, "big")
+    length = destructify.IntegerField(4, "big", override=destructify.Deferred.length_of('chunk_data'))
     chunk_type = destructify.EnumField(destructify.StringField(length=4, encoding="ascii"), enum=ChunkType)
     chunk_data = destructify.SwitchField(
         cases={
@@ -81,13 +73,12 @@ class PngChunk(destructify.Structure):
         switch="chunk_type",
         other=destructify.FixedLengthField("length")
     )
-    crc = destructify.IntegerField(4, "big", override=lambda f, v: calculate_crc(f))
+    crc = destructify.ChecksumField(destructify.IntegerField(4, "big"), fields=['chunk_type', 'chunk_data'])
 
     class Meta:
-        capture_raw = True
         checks = [
-            lambda f: f._context.fields['chunk_data'].length == f.length,
-            lambda f: calculate_crc(f) == f.crc,
+            # the length of the chunk data is not known yet when writing, as it is derived from the chunk data
+            lambda f: f._context.fields['chunk_data'].length in (None, f.length),
         ]
 
 
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from destructify import Structure, IntField, StructField, DefinitionError, Field, FixedLengthField, IntegerField
@@ -61,3 +62,22 @@ class FieldTest(DestructifyTestCase):
         with f.with_name(name=None) as field_instance:
             self.assertEqual("blah", field_instance.name)
         self.assertEqual("blah", f.name)
+
+    def test_seek_start_returns_offset(self):
+        stream = io.BytesIO(b"abcdef")
+        stream.seek(2)
+        self.assertEqual(2, FixedLengthField(1).seek_start(stream, None, 0))
+        self.assertEqual(4, FixedLengthField(1, skip=2).seek_start(stream, None, 0))
+        self.assertEqual(1, FixedLengthField(1, offset=1).seek_start(stream, None, 0))
+
+    def test_overridden_seek_start(self):
+        class SkippingField(FixedLengthField):
+            def seek_start(self, stream, context, offset):
+                return stream.seek(1, io.SEEK_CUR)
+
+        class Struct(Structure):
+            f1 = FixedLengthField(1)
+            f2 = SkippingField(1)
+
+        s = Struct.from_bytes(b"a_b")
+        self.assertEqual(b"b", s.f2)
@@ -3,7 +3,7 @@ import unittest
 
 from destructify import Structure, BitField, FixedLengthField, StructureField, MisalignedFieldError, \
     StringField, IntegerField, BytesField, VariableLengthIntegerField, ParsingContext, ParseError, \
-    ImpossibleToCalculateLengthError, SwitchField
+    ImpossibleToCalculateLengthError, SwitchField, Deferred
 from destructify.exceptions import DefinitionError, StreamExhaustedError, WriteError
 from tests import DestructifyTestCase
 
@@ -388,6 +388,41 @@ class StructureFieldTest(DestructifyTestCase):
         self.assertStructureStreamEqual(b"\x01\x02\x03\x00\x00\x06\x07\x08",
                                         StructureThatSkips(s=ShortStructure(text=b"\x01\x02\x03"), text=b"\x06\x07\x08"))
 
+    def test_length_field_written_afterwards(self):
+        class Inner(Structure):
+            length = IntegerField(length=1)
+            data = BytesField(length='length')
+
+        class Outer(Structure):
+            length = IntegerField(length=2, byte_order='big', override=Deferred.length_of('inner'))
+            inner = StructureField(Inner, length='length')
+            tail = IntegerField(length=1)
+
+        self.assertStructureStreamEqual(b"\x00\x04\x03abc\x07", Outer(length=4, inner=Inner(length=3, data=b"abc"),
+                                                                        tail=7))
+        self.assertEqual(b"\x00\x04\x03abc\x07", Outer(inner=Inner(data=b"abc"), tail=7).to_bytes())
+
+    def test_length_field_value_is_kept(self):
+        class Inner(Structure):
+            data = BytesField(length=-1)
+
+        class Outer(Structure):
+            length = IntegerField(length=1)
+            inner = StructureField(Inner, length='length')
+            tail = IntegerField(length=1)
+
+        self.assertEqual(b"\x04ab\0\0\x07", Outer(length=4, inner=Inner(data=b"ab"), tail=7).to_bytes())
+
+    def test_variable_length_field_not_deferred(self):
+        class Inner(Structure):
+            data = BytesField(length=-1)
+
+        class Outer(Structure):
+            length = VariableLengthIntegerField()
+            inner = StructureField(Inner, length='length')
+
+        self.assertEqual(b"\x02ab", Outer(length=2, inner=Inner(data=b"ab")).to_bytes())
+
     def test_fieldcontext(self):
         class Struct1(Structure):
             byte1 = FixedLengthField(length=1)
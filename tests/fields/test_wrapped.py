@@ -1,10 +1,14 @@
 import enum
+import hashlib
+import lzma
 import sys
 import unittest
+import zlib
 
 from destructify import Structure, BitField, FixedLengthField, DefinitionError, WrappedFieldMixin, Field, EnumField, \
     IntegerField, ByteField, ConditionalField, ArrayField, SwitchField, ConstantField, WrongMagicError, WriteError, \
-    ParseError, io, ParsingContext, StreamExhaustedError, PseudoMemberEnumMixin, StructureField
+    ParseError, io, ParsingContext, StreamExhaustedError, PseudoMemberEnumMixin, StructureField, CompressedField, \
+    BytesField, ChecksumField, WrongChecksumError, StatsStream
 from tests import DestructifyTestCase
 
 
@@ -313,3 +317,155 @@ class PseudoMemberEnumMixinTest(DestructifyTestCase):
         else:
             self.assertEqual("PseudoEnum.'bar'", str(PseudoEnum('bar')))
             self.assertEqual("<PseudoEnum.'bar': 'bar'>", repr(PseudoEnum('bar')))
+
+
+class CompressedFieldTest(DestructifyTestCase):
+    def test_bytes(self):
+        self.assertFieldStreamEqual(zlib.compress(b"hello" * 10), b"hello" * 10,
+                                    CompressedField(BytesField(length=-1)))
+
+    def test_compressions(self):
+        for compression in CompressedField.COMPRESSIONS:
+            with self.subTest(compression=compression):
+                field = CompressedField(BytesField(length=-1), compression)
+                data = self.call_field_to_stream(field, b"hello" * 10)
+                self.assertEqual((b"hello" * 10, len(data)), self.call_field_from_stream(field, data + b"trailing"))
+
+    def test_custom_compression(self):
+        field = CompressedField(BytesField(length=-1), (lambda: lzma.LZMADecompressor(lzma.FORMAT_XZ),
+                                                        lambda: lzma.LZMACompressor(lzma.FORMAT_XZ)))
+        self.assertFieldStreamEqual(lzma.compress(b"hello"), b"hello", field)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(DefinitionError):
+            CompressedField(BytesField(length=-1), 'unknown')
+
+    def test_structure(self):
+        class Inner(Structure):
+            length = IntegerField(length=1)
+            data = FixedLengthField(length='length')
+
+        class TestStructure(Structure):
+            length = IntegerField(length=2, byte_order='big')
+            inner = CompressedField(ArrayField(StructureField(Inner), length=-1), length='length')
+            tail = IntegerField(length=1)
+
+        compressed = zlib.compress(b"\x02ab\x01c")
+        data = len(compressed).to_bytes(2, 'big') + compressed + b"\x07"
+        s = TestStructure.from_bytes(data)
+        self.assertEqual([Inner(length=2, data=b"ab"), Inner(length=1, data=b"c")], s.inner)
+        self.assertEqual(7, s.tail)
+        self.assertEqual(data, TestStructure(inner=s.inner, tail=7).to_bytes())
+
+    def test_trailing_data(self):
+        class TestStructure(Structure):
+            data = CompressedField(FixedLengthField(length=2))
+            tail = IntegerField(length=1)
+
+        # the remainder of the compressed data is skipped, and the stream is positioned after it
+        s = TestStructure.from_bytes(zlib.compress(b"abcdef") + b"\x07")
+        self.assertEqual(b"ab", s.data)
+        self.assertEqual(7, s.tail)
+
+    def test_length(self):
+        field = CompressedField(BytesField(length=-1), length=20)
+        compressed = zlib.compress(b"abc")
+        self.assertFieldFromStreamEqual(compressed + b"\0" * (20 - len(compressed)), b"abc", field, expected_read=20)
+        with self.assertRaises(WriteError):
+            self.call_field_to_stream(CompressedField(BytesField(length=-1), length=5), b"abc")
+
+
+class ChecksumFieldTest(DestructifyTestCase):
+    def test_parse_and_write(self):
+        class TestStructure(Structure):
+            length = IntegerField(length=1)
+            data = FixedLengthField(length='length')
+            crc = ChecksumField(IntegerField(4, 'big'), fields=['length', 'data'])
+
+        data = b"\x03abc" + zlib.crc32(b"\x03abc").to_bytes(4, 'big')
+        s = TestStructure.from_bytes(data)
+        self.assertEqual(zlib.crc32(b"\x03abc"), s.crc)
+        self.assertEqual(data, TestStructure(data=b"abc").to_bytes())
+
+        with self.assertRaises(WrongChecksumError):
+            TestStructure.from_bytes(b"\x03abc\x00\x00\x00\x00")
+
+    def test_algorithms(self):
+        for algorithm, expected in [('adler32', zlib.adler32(b"abc").to_bytes(4, 'big')),
+                                    ('md5', hashlib.md5(b"abc").digest())]:
+            with self.subTest(algorithm=algorithm):
+                class TestStructure(Structure):
+                    data = FixedLengthField(length=3)
+                    digest = ChecksumField(IntegerField(4, 'big') if algorithm == 'adler32' else BytesField(length=16),
+                                           fields=['data'], algorithm=algorithm)
+
+                s = TestStructure.from_bytes(b"abc" + expected)
+                self.assertEqual(b"abc" + expected, s.to_bytes())
+
+    def test_callable_algorithm(self):
+        class TestStructure(Structure):
+            data = FixedLengthField(length=3)
+            digest = ChecksumField(BytesField(length=32), fields=['data'], algorithm=hashlib.sha256)
+
+        self.assertEqual(b"abc" + hashlib.sha256(b"abc").digest(), TestStructure(data=b"abc").to_bytes())
+
+    def test_no_verify(self):
+        class TestStructure(Structure):
+            data = FixedLengthField(length=1)
+            crc = ChecksumField(IntegerField(4, 'big'), fields=['data'], verify=False)
+
+        self.assertEqual(0, TestStructure.from_bytes(b"a\x00\x00\x00\x00").crc)
+
+    def test_reads_once(self):
+        class TestStructure(Structure):
+            data = FixedLengthField(length=3)
+            crc = ChecksumField(IntegerField(4, 'big'), fields=['data'])
+
+        stream = StatsStream(io.BytesIO(b"abc" + zlib.crc32(b"abc").to_bytes(4, 'big')))
+        TestStructure.from_stream(stream)
+        self.assertEqual(7, stream.total.bytes['read'])
+        self.assertEqual(0, stream.total.calls['seek'])
+
+    def test_lazy_field(self):
+        class TestStructure(Structure):
+            data = FixedLengthField(length=3, lazy=True)
+            crc = ChecksumField(IntegerField(4, 'big'), fields=['data'])
+
+        # the lazy field is not read while parsing, so the checksum is calculated by reading it separately
+        s = TestStructure.from_bytes(b"abc" + zlib.crc32(b"abc").to_bytes(4, 'big'))
+        self.assertEqual(b"abc", s.data)
+
+    def test_fields_with_gap(self):
+        class TestStructure(Structure):
+            a = FixedLengthField(length=1)
+            b = FixedLengthField(length=1, skip=1)
+            crc = ChecksumField(IntegerField(4, 'big'), fields=['a', 'b'])
+
+        # the bytes between the fields are covered as well, both while parsing and writing
+        data = b"a\x00b" + zlib.crc32(b"a\x00b").to_bytes(4, 'big')
+        self.assertEqual(data, TestStructure(a=b"a", b=b"b").to_bytes())
+        self.assertEqual(b"b", TestStructure.from_bytes(data).b)
+
+    def test_invalid_fields(self):
+        with self.assertRaises(DefinitionError):
+            class TestStructure(Structure):
+                crc = ChecksumField(IntegerField(4, 'big'), fields=['data'])
+                data = FixedLengthField(length=3)
+
+        with self.assertRaises(DefinitionError):
+            class TestStructure(Structure):
+                a = FixedLengthField(length=1)
+                b = FixedLengthField(length=1)
+                c = FixedLengthField(length=1)
+                crc = ChecksumField(IntegerField(4, 'big'), fields=['a', 'c'])
+
+        with self.assertRaises(DefinitionError):
+            class TestStructure(Structure):
+                a = FixedLengthField(length=1)
+                b = FixedLengthField(length=1)
+                crc = ChecksumField(IntegerField(4, 'big'), fields=['b', 'a'])
+
+        with self.assertRaises(DefinitionError):
+            ChecksumField(IntegerField(4, 'big'), fields=[])
+        with self.assertRaises(DefinitionError):
+            ChecksumField(IntegerField(4, 'big'), fields=['data'], algorithm='unknown')
@@ -0,0 +1,114 @@
+import gzip
+import io
+import lzma
+import random
+import unittest
+import zlib
+
+from destructify import SeekableGzipStream, DecompressingStream, CompressingStream, StatsStream, Structure, \
+    IntegerField, FixedLengthField
+
+_random = random.Random(0)
+DATA = bytes(_random.getrandbits(8) for _ in range(50000)) + bytes(50000)
+
+
+class Record(Structure):
+    length = IntegerField(length=2, byte_order='little')
+    data = FixedLengthField(length='length', lazy=True)
+    tail = IntegerField(length=1)
+
+
+class SeekableGzipStreamTest(unittest.TestCase):
+    def test_read(self):
+        stream = SeekableGzipStream(io.BytesIO(gzip.compress(DATA)), spacing=10000, chunk_size=1024)
+        self.assertEqual(DATA[:100], stream.read(100))
+        self.assertEqual(DATA[100:], stream.read())
+        self.assertEqual(b"", stream.read(1))
+        self.assertEqual(len(DATA), stream.size)
+
+    def test_seek(self):
+        raw = StatsStream(io.BytesIO(gzip.compress(DATA)))
+        stream = SeekableGzipStream(raw, spacing=10000, chunk_size=1024)
+        stream.build_index()
+        self.assertEqual(len(DATA), stream.seek(0, io.SEEK_END))
+
+        rnd = random.Random(1)
+        for i in range(50):
+            offset = rnd.randrange(len(DATA))
+            self.assertEqual(offset, stream.seek(offset))
+            self.assertEqual(DATA[offset:offset + 100], stream.read(100))
+
+        # seeking backwards only decompresses from the nearest checkpoint
+        raw.reset()
+        stream.seek(45000)
+        stream.read(1)
+        self.assertLess(raw.total.bytes['read'], 20000)
+
+    def test_members(self):
+        compressed = b"".join(gzip.compress(DATA[i:i + 10000]) for i in range(0, len(DATA), 10000))
+        stream = SeekableGzipStream(io.BytesIO(compressed), spacing=len(DATA))
+        self.assertEqual(DATA, stream.read())
+
+        index = io.StringIO()
+        stream.save_index(index)
+        index.seek(0)
+
+        raw = StatsStream(io.BytesIO(compressed))
+        stream = SeekableGzipStream(raw, index=index)
+        self.assertEqual(len(DATA) - 10, stream.seek(-10, io.SEEK_END))
+        self.assertEqual(DATA[-10:], stream.read())
+        self.assertLess(raw.total.bytes['read'], len(compressed) - 10000)
+
+    def test_trailing_padding(self):
+        for padding in (b"\0", bytes(1000)):
+            with self.subTest(padding=len(padding)):
+                stream = SeekableGzipStream(io.BytesIO(gzip.compress(DATA) + padding), chunk_size=1024)
+                self.assertEqual(DATA, stream.read())
+                self.assertEqual(len(DATA), stream.size)
+                self.assertEqual(len(DATA) - 10, stream.seek(-10, io.SEEK_END))
+                self.assertEqual(DATA[-10:], stream.read())
+
+    def test_truncated(self):
+        stream = SeekableGzipStream(io.BytesIO(gzip.compress(DATA)[:-100]))
+        with self.assertRaises(EOFError):
+            stream.read()
+
+    def test_structure(self):
+        records = [Record(data=bytes([i]) * (i * 100), tail=i) for i in range(20)]
+        stream = SeekableGzipStream(io.BytesIO(gzip.compress(b"".join(r.to_bytes() for r in records))), spacing=1000)
+        parsed = list(Record.iter_stream(stream))
+        self.assertEqual([r.tail for r in records], [r.tail for r in parsed])
+        self.assertEqual(records[5].data, parsed[5].data)
+
+
+class DecompressingStreamTest(unittest.TestCase):
+    def test_read(self):
+        for decompressor, compress in ((zlib.decompressobj, zlib.compress),
+                                       (lzma.LZMADecompressor, lzma.compress)):
+            with self.subTest(decompressor=decompressor):
+                raw = io.BytesIO(compress(DATA) + b"trailing")
+                stream = DecompressingStream(raw, decompressor(), chunk_size=1024)
+                self.assertEqual(DATA[:10], stream.read(10))
+                self.assertEqual(1000, stream.seek(1000))
+                self.assertEqual(DATA[1000:1010], stream.read(10))
+                with self.assertRaises(io.UnsupportedOperation):
+                    stream.seek(0)
+                self.assertEqual(len(compress(DATA)), stream.finish())
+
+    def test_length(self):
+        compressed = zlib.compress(DATA)
+        stream = DecompressingStream(io.BytesIO(compressed), zlib.decompressobj(), length=100)
+        self.assertLess(len(stream.read()), len(DATA))
+        self.assertEqual(100, stream.consumed)
+
+
+class CompressingStreamTest(unittest.TestCase):
+    def test_write(self):
+        raw = io.BytesIO()
+        stream = CompressingStream(raw, zlib.compressobj())
+        stream.write(DATA[:10])
+        stream.write(DATA[10:])
+        self.assertEqual(len(DATA), stream.tell())
+        written = stream.finish()
+        self.assertEqual(len(raw.getvalue()), written)
+        self.assertEqual(DATA, zlib.decompress(raw.getvalue()))
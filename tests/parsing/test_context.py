@@ -1,6 +1,9 @@
+import gc
 import io
+import weakref
 
-from destructify import ParsingContext, Structure, FixedLengthField, StringField, StructureField
+from destructify import ParsingContext, Structure, FixedLengthField, StringField, StructureField, ArrayField, \
+    IntegerField, this, CaptureStream
 from tests import DestructifyTestCase
 
 
@@ -64,9 +67,23 @@ class CaptureRawTest(DestructifyTestCase):
             a = FixedLengthField(length=6)
 
         s = S.from_bytes(b"abcdef", ParsingContext(capture_raw=True))
-        self.assertFalse(hasattr(s._context.stream, 'cache_read_last'))
         self.assertEqual(b"abcdef", s._context.fields['a'].raw)
 
+    def test_capture_raw_from_context_wraps_stream(self):
+        class S(Structure):
+            a = FixedLengthField(length=6)
+
+        # like capture_raw in Meta, capture_raw in the context wraps the stream, so the fields are not read again
+        stream = io.BytesIO(b"abcdef")
+        s = S.from_stream(stream, ParsingContext(capture_raw=True))[0]
+        self.assertIsInstance(s._context.stream, CaptureStream)
+        self.assertIs(stream, s._context.stream.raw)
+
+        # without capturing, the stream is used as is
+        stream.seek(0)
+        s = S.from_stream(stream, ParsingContext())[0]
+        self.assertIs(stream, s._context.stream)
+
     def test_capture_raw_nested(self):
         class Inner(Structure):
             a = FixedLengthField(length=2)
@@ -103,3 +120,67 @@ class CaptureRawTest(DestructifyTestCase):
         self.assertEqual(b"cdef", s._context.fields['a'].raw)
         self.assertEqual(b"cd", s._context.fields['a'].subcontext.fields['o'].raw)
         self.assertEqual(b"ef", s._context.fields['a'].subcontext.fields['a'].raw)
+
+
+class ReferenceCycleTest(DestructifyTestCase):
+    def setUp(self):
+        gc.collect()
+        gc.disable()
+        self.addCleanup(gc.enable)
+
+    def test_freed_without_gc(self):
+        class Inner(Structure):
+            a = FixedLengthField(length=1, lazy=True)
+            b = FixedLengthField(length=1)
+
+        class S(Structure):
+            a = StructureField(Inner)
+            b = ArrayField(StructureField(Inner), count=2)
+
+            class Meta:
+                capture_raw = True
+
+        s = S.from_bytes(b"abcdef")
+        self.assertEqual(b"c", s.b[0].a)
+        context = weakref.ref(s._context)
+        subcontext = weakref.ref(s._context.fields['b'].subcontext)
+        del s
+        self.assertIsNone(context())
+        self.assertIsNone(subcontext())
+
+    def test_nested_structure_keeps_parents(self):
+        class Inner(Structure):
+            a = FixedLengthField(length=this._.length, lazy=True)
+
+        class S(Structure):
+            length = IntegerField(length=1)
+            b = ArrayField(StructureField(Inner), count=1)
+
+        s = S.from_bytes(b"\x02ab")
+        inner = s.b[0]
+        context = weakref.ref(s._context)
+        del s
+        self.assertIsNone(context())
+        self.assertEqual(b"ab", inner.a)
+        self.assertEqual(1, inner._context.fields['a'].absolute_offset)
+        self.assertEqual(2, inner._context.f._.length)
+
+        subcontext = weakref.ref(inner._context)
+        parent = weakref.ref(inner._context.parent)
+        del inner
+        self.assertIsNone(subcontext())
+        self.assertIsNone(parent())
+
+    def test_subcontext_parent(self):
+        context = ParsingContext()._add_values({'x': 1})
+        subcontext = context.fields['x'].create_subcontext()
+        self.assertIs(context, subcontext.parent)
+        self.assertIs(context.fields['x'], subcontext.parent_field)
+        self.assertIs(context, context.fields['x'].context)
+
+    def test_lazy_value_keeps_context(self):
+        class S(Structure):
+            a = FixedLengthField(length=1, lazy=True)
+
+        value = S.from_bytes(b"a").a
+        self.assertEqual(b"a", value)
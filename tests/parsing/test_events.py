@@ -0,0 +1,100 @@
+from destructify import ParsingContext, ParsingListener, ParsingListenerGroup, Structure, FixedLengthField, \
+    IntegerField, StructureField, ArrayField, CheckError
+from tests import DestructifyTestCase
+
+
+class RecordingListener(ParsingListener):
+    def __init__(self):
+        self.events = []
+
+    def field_start(self, field_context, offset):
+        self.events.append(('start', field_context.field.full_name, offset))
+
+    def field_end(self, field_context):
+        self.events.append(('end', field_context.field.full_name, field_context.offset, field_context.length,
+                            None if field_context.lazy else field_context.value))
+
+    def lazy_resolved(self, field_context, value):
+        self.events.append(('lazy', field_context.field.full_name, value))
+
+    def check_failed(self, context, check):
+        self.events.append(('check', check))
+
+
+class Inner(Structure):
+    x = IntegerField(length=1)
+
+
+class ListenerTest(DestructifyTestCase):
+    def test_parse(self):
+        class TestStructure(Structure):
+            a = FixedLengthField(length=2)
+            inner = ArrayField(StructureField(Inner), count=2)
+
+        listener = RecordingListener()
+        TestStructure.from_bytes(b"ab\x01\x02", ParsingContext(listener=listener))
+        self.assertEqual([
+            ('start', 'TestStructure.a', 0),
+            ('end', 'TestStructure.a', 0, 2, b"ab"),
+            ('start', 'TestStructure.inner', 2),
+            ('start', 'TestStructure.inner.inner', 0),
+            ('start', 'Inner.x', 0),
+            ('end', 'Inner.x', 0, 1, 1),
+            ('end', 'TestStructure.inner.inner', 0, 1, Inner(x=1)),
+            ('start', 'TestStructure.inner.inner', 1),
+            ('start', 'Inner.x', 0),
+            ('end', 'Inner.x', 0, 1, 2),
+            ('end', 'TestStructure.inner.inner', 1, 1, Inner(x=2)),
+            ('end', 'TestStructure.inner', 2, 2, [Inner(x=1), Inner(x=2)]),
+        ], listener.events)
+
+    def test_write(self):
+        class TestStructure(Structure):
+            a = FixedLengthField(length=2)
+            b = IntegerField(length=1)
+
+        listener = RecordingListener()
+        TestStructure(a=b"ab", b=3).to_bytes(ParsingContext(listener=listener))
+        self.assertEqual([
+            ('start', 'TestStructure.a', 0),
+            ('end', 'TestStructure.a', 0, 2, b"ab"),
+            ('start', 'TestStructure.b', 2),
+            ('end', 'TestStructure.b', 2, 1, 3),
+        ], listener.events)
+
+    def test_lazy_resolved(self):
+        class TestStructure(Structure):
+            a = FixedLengthField(length=2, lazy=True)
+            b = IntegerField(length=1)
+
+        listener = RecordingListener()
+        s = TestStructure.from_bytes(b"ab\x03", ParsingContext(listener=listener))
+        self.assertEqual(('end', 'TestStructure.a', 0, 2, None), listener.events[1])
+        self.assertEqual(b"ab", s.a)
+        self.assertEqual(('lazy', 'TestStructure.a', b"ab"), listener.events[-1])
+
+    def test_check_failed(self):
+        check = lambda f: f.a == 1
+
+        class TestStructure(Structure):
+            a = IntegerField(length=1)
+
+            class Meta:
+                checks = [check]
+
+        listener = RecordingListener()
+        with self.assertRaises(CheckError):
+            TestStructure.from_bytes(b"\x02", ParsingContext(listener=listener))
+        self.assertEqual(('check', check), listener.events[-1])
+
+    def test_group(self):
+        first, second = RecordingListener(), RecordingListener()
+        Inner.from_bytes(b"\x01", ParsingContext(listener=ParsingListenerGroup(first, second)))
+        self.assertEqual(2, len(first.events))
+        self.assertEqual(first.events, second.events)
+
+    def test_no_listener(self):
+        self.assertIsNone(ParsingContext().listener)
+        self.assertIsNone(ParsingContext(parent=ParsingContext()).listener)
+        listener = ParsingListener()
+        self.assertIs(listener, ParsingContext(parent=ParsingContext(listener=listener)).listener)
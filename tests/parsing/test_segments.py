@@ -0,0 +1,98 @@
+import io
+import socket
+import tempfile
+import unittest
+
+from destructify import SegmentStream, write_segments, Structure, IntegerField, BytesField, StructureField, Deferred
+
+
+class SegmentStreamTest(unittest.TestCase):
+    def test_small_writes_are_collected(self):
+        stream = SegmentStream()
+        stream.write(b"ab")
+        stream.write(b"cd")
+        self.assertEqual([b"abcd"], [bytes(segment) for segment in stream.segments()])
+        self.assertEqual(4, stream.tell())
+
+    def test_large_writes_are_referenced(self):
+        payload = b"x" * 16
+        stream = SegmentStream(threshold=8)
+        stream.write(b"ab")
+        stream.write(payload)
+        stream.write(b"cd")
+        segments = stream.segments()
+        self.assertEqual(3, len(segments))
+        self.assertIs(payload, segments[1].obj)
+        self.assertEqual(b"ab" + payload + b"cd", stream.getvalue())
+
+    def test_overwrite(self):
+        payload = b"x" * 16
+        stream = SegmentStream(threshold=8)
+        stream.write(b"ab")
+        stream.write(payload)
+        stream.seek(1)
+        stream.write(b"yz")
+        self.assertEqual(b"ayz" + b"x" * 15, stream.getvalue())
+        # the referenced object is not changed
+        self.assertEqual(b"x" * 16, payload)
+
+    def test_seek_beyond_end(self):
+        stream = SegmentStream()
+        stream.write(b"a")
+        stream.seek(3)
+        stream.write(b"b")
+        self.assertEqual(b"a\0\0b", stream.getvalue())
+
+    def test_read(self):
+        stream = SegmentStream(threshold=2)
+        stream.write(b"abc")
+        stream.write(b"d")
+        stream.seek(1)
+        self.assertEqual(b"bcd", stream.read())
+
+    def test_write_after_segments(self):
+        stream = SegmentStream()
+        stream.write(b"ab")
+        segments = stream.segments()
+        stream.write(b"cd")
+        self.assertEqual(b"ab", bytes(segments[0]))
+        self.assertEqual(b"abcd", stream.getvalue())
+
+
+class WriteSegmentsTest(unittest.TestCase):
+    segments = [b"ab", memoryview(b"cdef")[1:], bytearray(b""), b"g"]
+
+    def test_file(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b"0")
+            self.assertEqual(6, write_segments(f, self.segments))
+            f.seek(0)
+            self.assertEqual(b"0abdefg", f.read())
+
+    def test_socket(self):
+        a, b = socket.socketpair()
+        with a, b:
+            self.assertEqual(6, write_segments(a, self.segments))
+            self.assertEqual(b"abdefg", b.recv(16))
+
+    def test_stream(self):
+        stream = io.BytesIO()
+        self.assertEqual(6, write_segments(stream, self.segments))
+        self.assertEqual(b"abdefg", stream.getvalue())
+
+
+class ToSegmentsTest(unittest.TestCase):
+    def test_payload_is_not_copied(self):
+        class Inner(Structure):
+            data = BytesField(length=-1)
+
+        class TestStructure(Structure):
+            length = IntegerField(length=4, byte_order='big', override=Deferred.length_of('inner'))
+            inner = StructureField(Inner, length='length')
+            tail = BytesField(terminator=b"\0")
+
+        payload = b"x" * 100000
+        segments = TestStructure(inner=Inner(data=payload), tail=b"t").to_segments()
+        self.assertEqual(3, len(segments))
+        self.assertIs(payload, segments[1].obj)
+        self.assertEqual(b"\0\x01\x86\xa0" + payload + b"t\0", b"".join(segments))
@@ -0,0 +1,126 @@
+import http.server
+import io
+import tempfile
+import threading
+import unittest
+
+from destructify import RangeStream, BytesRangeSource, FileRangeSource, CallableRangeSource, HTTPRangeSource, \
+    Structure, IntegerField, FixedLengthField
+
+DATA = bytes(range(256)) * 4
+
+
+class Record(Structure):
+    length = IntegerField(length=1)
+    data = FixedLengthField(length='length')
+    tail = IntegerField(length=1, offset=-1)
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DATA)))
+        self.end_headers()
+
+    def do_GET(self):
+        start, stop = self.headers['Range'][len('bytes='):].split('-')
+        data = DATA[int(start):int(stop) + 1]
+        self.server.requests += 1
+        self.send_response(206)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RangeStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def fetch(offset, size):
+            self.calls.append((offset, size))
+            return DATA[offset:offset + size]
+        self.source = CallableRangeSource(fetch, size=len(DATA))
+
+    def test_read_blocks(self):
+        stream = RangeStream(self.source, block_size=16)
+        stream.seek(10)
+        self.assertEqual(DATA[10:40], stream.read(30))
+        self.assertEqual(DATA[40:42], stream.read(2))
+        self.assertEqual([(0, 16), (16, 16), (32, 16)], self.calls)
+
+    def test_seek(self):
+        stream = RangeStream(self.source, block_size=16)
+        self.assertEqual(1020, stream.seek(-4, io.SEEK_END))
+        self.assertEqual(DATA[1020:], stream.read())
+        self.assertEqual(b"", stream.read(1))
+        self.assertEqual(10, stream.seek(10))
+        self.assertEqual(12, stream.seek(2, io.SEEK_CUR))
+        self.assertEqual(DATA[12:14], stream.read(2))
+        with self.assertRaises(ValueError):
+            stream.seek(-1)
+
+    def test_lru(self):
+        stream = RangeStream(self.source, block_size=16, cache_size=2)
+        for offset in (0, 16, 0, 32, 0, 16):
+            stream.seek(offset)
+            stream.read(1)
+        self.assertEqual([(0, 16), (16, 16), (32, 16), (16, 16)], self.calls)
+        self.assertEqual(4, stream.fetches)
+
+    def test_read_ahead(self):
+        stream = RangeStream(self.source, block_size=16, read_ahead=2)
+        stream.read(40)
+        stream.read(40)
+        self.assertEqual([(0, 48), (48, 48)], self.calls)
+
+    def test_read_ahead_small_cache(self):
+        stream = RangeStream(self.source, block_size=16, cache_size=1, read_ahead=2)
+        self.assertEqual(DATA[:40], stream.read(40))
+
+    def test_structure(self):
+        stream = RangeStream(DATA[3:], block_size=8)
+        record, consumed = Record.from_stream(stream)
+        self.assertEqual(DATA[4:7], record.data)
+        self.assertEqual(DATA[-1], record.tail)
+
+
+class RangeSourceTest(unittest.TestCase):
+    def test_bytes(self):
+        source = BytesRangeSource(DATA)
+        self.assertEqual(len(DATA), source.size)
+        self.assertEqual(DATA[1020:], source.read_at(1020, 10))
+
+    def test_file(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(DATA)
+            f.seek(10)
+            source = FileRangeSource(f)
+            self.assertEqual(len(DATA), source.size)
+            self.assertEqual(DATA[100:110], source.read_at(100, 10))
+            self.assertEqual(DATA[1020:], source.read_at(1020, 10))
+
+    def test_file_without_descriptor(self):
+        source = FileRangeSource(io.BytesIO(DATA))
+        self.assertEqual(len(DATA), source.size)
+        self.assertEqual(DATA[100:110], source.read_at(100, 10))
+
+    def test_http(self):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+        server.requests = 0
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            source = HTTPRangeSource("http://127.0.0.1:{}/data".format(server.server_address[1]))
+            self.assertEqual(len(DATA), source.size)
+
+            stream = RangeStream(source, block_size=256)
+            record, consumed = Record.from_stream(stream)
+            self.assertEqual(DATA[1:1], record.data)
+            self.assertEqual(DATA[-1], record.tail)
+            self.assertEqual(2, server.requests)
+        finally:
+            server.shutdown()
+            server.server_close()
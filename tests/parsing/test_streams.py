@@ -1,7 +1,9 @@
 import io
+import struct
 import unittest
 
-from destructify import Substream, CaptureStream
+from destructify import Substream, CaptureStream, StatsStream, PrefetchStream, BufferStream, ParsingContext, \
+    Structure, IntegerField, FixedLengthField, StructureField, ParseError
 
 
 class TellableStream:
@@ -177,3 +179,163 @@ class CaptureStreamTest(unittest.TestCase):
         cs.write(b"borp")
         self.assertEqual(b"borp", cs.cache_read_last(4))
         self.assertEqual(b"borp", cs.cache_read_last(4))
+
+
+class StatsStreamTest(unittest.TestCase):
+    def test_counts(self):
+        ss = StatsStream(io.BytesIO(b"asdfasdfasddf"))
+        self.assertEqual(b"asdf", ss.read(4))
+        ss.seek(10)
+        ss.seek(-2, io.SEEK_CUR)
+        self.assertEqual(8, ss.tell())
+        ss.write(b"xy")
+        self.assertEqual({'read': 1, 'seek': 2, 'tell': 1, 'write': 1}, ss.total.calls)
+        self.assertEqual({'read': 4, 'seek': 8, 'tell': 0, 'write': 2}, ss.total.bytes)
+
+    def test_read_sizes(self):
+        ss = StatsStream(io.BytesIO(b"a" * 100))
+        for size in (1, 3, 4, 50, 50, 1):
+            ss.read(size)
+        self.assertEqual({0: 1, 1: 1, 4: 2, 64: 2}, ss.total.read_sizes)
+        self.assertEqual(100, ss.total.bytes['read'])
+
+    def test_peek_not_available(self):
+        self.assertFalse(hasattr(StatsStream(io.BytesIO(b"asdf")), 'peek'))
+        ss = StatsStream(io.BufferedReader(io.BytesIO(b"asdf")))
+        self.assertTrue(ss.peek(2).startswith(b"as"))
+        self.assertEqual(1, ss.total.calls['peek'])
+
+    def test_fields(self):
+        class Inner(Structure):
+            x = IntegerField(length=1)
+
+        class TestStructure(Structure):
+            a = FixedLengthField(length=2)
+            inner = StructureField(Inner)
+
+        ss = StatsStream(io.BytesIO(b"ab\x01"))
+        TestStructure.from_stream(ss, ParsingContext(listener=ss.listener))
+        self.assertEqual(1, ss.fields['TestStructure.a'].calls['read'])
+        self.assertEqual(2, ss.fields['TestStructure.a'].bytes['read'])
+        self.assertEqual(1, ss.fields['Inner.x'].calls['read'])
+        self.assertEqual(0, ss.fields['TestStructure.inner'].calls['read'])
+        self.assertEqual(ss.total.calls['tell'], sum(stats.calls['tell'] for stats in ss.fields.values()))
+        self.assertEqual(['calls', 'bytes', 'read_sizes'], list(ss.total.as_dict()))
+        ss.reset()
+        self.assertEqual(0, sum(ss.total.calls.values()))
+
+    def test_fields_listener_attached_automatically(self):
+        class TestStructure(Structure):
+            a = FixedLengthField(length=2)
+            b = IntegerField(length=1)
+
+        ss = StatsStream(io.BytesIO(b"ab"))
+        with self.assertRaises(ParseError):
+            TestStructure.from_stream(ss)
+        self.assertEqual(1, ss.fields['TestStructure.a'].calls['read'])
+        self.assertEqual(1, ss.fields['TestStructure.b'].calls['read'])
+
+        # calls after the failed field are not attributed to it
+        ss.seek(0)
+        self.assertEqual(1, ss.fields[None].calls['seek'])
+        ss.reset()
+        TestStructure(a=b"ab", b=1).to_stream(ss)
+        self.assertEqual(2, ss.fields['TestStructure.a'].bytes['write'])
+        self.assertEqual(1, ss.fields['TestStructure.b'].bytes['write'])
+
+
+class PrefetchStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.raw = StatsStream(io.BytesIO(bytes(range(100))))
+        self.stream = PrefetchStream(self.raw, gap=4)
+
+    def test_plan(self):
+        self.assertEqual([(0, 6), (20, 30), (50, 51)],
+                         self.stream.plan([(24, 6), (4, 2), (0, 2), (20, 2), (50, 1), (60, 0)]))
+
+    def test_prefetch(self):
+        self.assertEqual([(10, 20), (50, 52)], self.stream.prefetch([(10, 4), (16, 4), (50, 2)]))
+        self.assertEqual(2, self.raw.total.calls['read'])
+        self.raw.reset()
+
+        self.stream.seek(16)
+        self.assertEqual(b"\x10\x11", self.stream.read(2))
+        self.assertEqual(18, self.stream.tell())
+        self.stream.seek(50)
+        self.assertEqual(b"\x32\x33", self.stream.read(2))
+        self.assertEqual({}, self.raw.total.calls)
+
+        # already prefetched ranges are not read again
+        self.assertEqual([], self.stream.prefetch([(12, 2)]))
+
+    def test_read_beyond_prefetched(self):
+        self.stream.prefetch([(10, 4)])
+        self.stream.seek(12)
+        self.assertEqual(bytes(range(12, 18)), self.stream.read(6))
+        self.assertEqual(bytes(range(18, 20)), self.stream.read(2))
+        self.assertEqual(bytes(range(20, 100)), self.stream.read())
+
+    def test_write_discards(self):
+        stream = PrefetchStream(io.BytesIO(bytes(10)))
+        stream.prefetch([(0, 4)])
+        stream.seek(2)
+        stream.write(b"ab")
+        stream.seek(0)
+        self.assertEqual(b"\0\0ab", stream.read(4))
+
+    def test_lazy_fields(self):
+        class Inner(Structure):
+            x = IntegerField(length=1)
+            data = FixedLengthField(length=2, offset=6, lazy=True)
+
+        class TestStructure(Structure):
+            a = FixedLengthField(length=2, offset=20, lazy=True)
+            b = FixedLengthField(length=2, offset=24, lazy=True)
+            count = IntegerField(length=1)
+            inner = StructureField(Inner)
+
+        s, _ = TestStructure.from_stream(self.stream)
+        self.assertEqual([(20, 2), (24, 2), (33, 2)], s._context.lazy_ranges())
+        self.assertEqual([(20, 2)], s._context.lazy_ranges('a'))
+        self.assertEqual([(20, 26), (33, 35)], self.stream.prefetch(s._context.lazy_ranges()))
+        self.raw.reset()
+
+        self.assertEqual(b"\x14\x15", s.a)
+        self.assertEqual(b"\x18\x19", s.b)
+        self.assertEqual(b"\x21\x22", s.inner.data)
+        self.assertEqual({}, self.raw.total.calls)
+
+
+class BufferStreamTest(unittest.TestCase):
+    def test_write(self):
+        buffer = bytearray(b"xxxxxxxx")
+        stream = BufferStream(buffer, 2)
+        self.assertEqual(2, stream.write(b"ab"))
+        self.assertEqual(2, stream.tell())
+        stream.seek(4)
+        stream.write(b"c")
+        self.assertEqual(b"xxab\0\0cx", buffer)
+
+    def test_read(self):
+        stream = BufferStream(b"abcdef", 1)
+        self.assertEqual(b"bc", stream.read(2))
+        self.assertEqual(b"def", stream.read())
+        self.assertFalse(stream.writable())
+
+    def test_pack_into(self):
+        buffer = bytearray(4)
+        stream = BufferStream(buffer)
+        self.assertEqual(2, stream.pack_into(struct.Struct(">H"), 0x0102))
+        self.assertEqual(b"\x01\x02\0\0", buffer)
+
+    def test_fill(self):
+        buffer = bytearray(b"xxxx")
+        stream = BufferStream(buffer)
+        stream.write(b"a")
+        stream.fill(3)
+        self.assertEqual(b"a\0\0x", buffer)
+
+    def test_overflow(self):
+        stream = BufferStream(bytearray(2))
+        with self.assertRaises(IOError):
+            stream.write(b"abc")
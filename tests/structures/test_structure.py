@@ -1,13 +1,48 @@
+import gc
 import io
+import pickle
+import weakref
 from unittest import mock
 
 import lazy_object_proxy
 
 from destructify import ParsingContext, Structure, FixedLengthField, StringField, TerminatedField, IntegerField, \
-    Substream, CheckError, WriteError, ImpossibleToCalculateLengthError, Field
+    Substream, CheckError, WriteError, ImpossibleToCalculateLengthError, Field, StreamExhaustedError, \
+    StructureField, ArrayField, SwitchField, StatsStream, this, UNLOADED, Deferred, BytesField, \
+    StructField, ChecksumField
 from tests import DestructifyTestCase
 
 
+class Chunk(Structure):
+    length = IntegerField(length=1)
+    chunk_type = FixedLengthField(length=4)
+    data = SwitchField(cases={b'HEAD': IntegerField(length=2, byte_order='big')}, switch='chunk_type',
+                       other=FixedLengthField(length='length'))
+    crc = IntegerField(length=1)
+
+    class Meta:
+        checks = [lambda c: c.crc == 0xff]
+
+
+class Item(Structure):
+    x = IntegerField(length=2, byte_order='big')
+
+
+class Container(Structure):
+    count = IntegerField(length=1)
+    items = ArrayField(StructureField(Item), count='count')
+    name = StringField(terminator=b"\0", encoding='ascii')
+    tail = IntegerField(length=2, byte_order='big', lazy=True)
+
+
+class SlottedStructure(Structure):
+    field1 = IntegerField(length=1)
+    field2 = FixedLengthField(length=2)
+
+    class Meta:
+        slots = True
+
+
 class StructureDefaultTest(DestructifyTestCase):
     def test_default_from_other_field(self):
         class TestStructure(Structure):
@@ -16,6 +51,26 @@ class StructureDefaultTest(DestructifyTestCase):
 
         self.assertEqual(b"abcde", TestStructure(field0=b'abcde').field1)
 
+    def test_no_context_for_simple_defaults(self):
+        class TestStructure(Structure):
+            field0 = StringField(length=5, default="abcde")
+            field1 = StringField(length=5, default=lambda: "fghij")
+
+        self.assertFalse(TestStructure._meta.defaults_take_context)
+        with mock.patch('destructify.structures.base.ParsingContext') as mock_context:
+            s = TestStructure()
+        mock_context.assert_not_called()
+        self.assertEqual("abcde", s.field0)
+        self.assertEqual("fghij", s.field1)
+
+    def test_context_for_defaults_depending_on_fields(self):
+        class TestStructure(Structure):
+            field0 = StringField(length=5)
+            field1 = StringField(length=5, default=this.field0)
+
+        self.assertTrue(TestStructure._meta.defaults_take_context)
+        self.assertEqual(b"abcde", TestStructure(field0=b'abcde').field1)
+
 
 class StructureParsingTest(DestructifyTestCase):
     def test_raw_bytes_are_read(self):
@@ -42,6 +97,19 @@ class StructureParsingTest(DestructifyTestCase):
 
         self.assertIsInstance(TestStructure.from_bytes(b"asdfa")._context, ParsingContext)
 
+    def test_overridden_init_called_from_stream(self):
+        class TestStructure(Structure):
+            field0 = StringField(length=5)
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.initialized = True
+
+        s = TestStructure.from_bytes(b"asdfa")
+        self.assertTrue(s.initialized)
+        self.assertEqual("asdfa", s.field0)
+        self.assertIsInstance(s._context, ParsingContext)
+
 
 class ChecksTest(DestructifyTestCase):
     def test_checks_work(self):
@@ -267,3 +335,699 @@ class OffsetTest(DestructifyTestCase):
 
         self.assertStructureStreamEqual(b"abc\0\0fg", TestStructure(field1=b"abc", field2=b"fg"))
 
+
+
+class NonSeekableBytesIO(io.BytesIO):
+    def seekable(self):
+        return False
+
+
+class DeferredTest(DestructifyTestCase):
+    def test_length_of(self):
+        class TestStructure(Structure):
+            length = IntegerField(length=1, override=Deferred.length_of('data'))
+            data = BytesField(terminator=b"\0")
+
+        self.assertEqual(b"\x04abc\0", TestStructure(data=b"abc").to_bytes())
+
+    def test_offset_of(self):
+        class TestStructure(Structure):
+            offset = IntegerField(length=1, override=Deferred.offset_of('data'))
+            padding = BytesField(length=2)
+            data = BytesField(length=1)
+
+        self.assertEqual(b"\x03\0\0a", TestStructure(padding=b"\0\0", data=b"a").to_bytes())
+
+    def test_after_all_fields(self):
+        class TestStructure(Structure):
+            total = IntegerField(length=1, override=Deferred(lambda c: c.a + c.b))
+            a = IntegerField(length=1)
+            b = IntegerField(length=1)
+
+        context = ParsingContext()
+        self.assertEqual(b"\x03\x01\x02", TestStructure(a=1, b=2).to_bytes(context))
+        self.assertEqual(3, context.fields['total'].value)
+
+    def test_already_written(self):
+        class TestStructure(Structure):
+            data = BytesField(terminator=b"\0")
+            length = IntegerField(length=1, override=Deferred.length_of('data'))
+
+        self.assertEqual(b"ab\0\x03", TestStructure(data=b"ab").to_bytes())
+
+    def test_single_pass(self):
+        class Inner(Structure):
+            data = BytesField(length=-1)
+
+        class TestStructure(Structure):
+            length = IntegerField(length=1, override=Deferred.length_of('inner'))
+            inner = StructureField(Inner, length='length')
+
+        stream = StatsStream(io.BytesIO())
+        TestStructure(inner=Inner(data=b"abc")).to_stream(stream)
+        self.assertEqual(b"\x03abc", stream.getvalue())
+        self.assertEqual(5, stream.total.bytes['write'])
+
+    def test_bytes_field_with_deferred_length(self):
+        class TestStructure(Structure):
+            length = IntegerField(length=1, override=Deferred.length_of('data'))
+            data = BytesField(length='length')
+
+        self.assertEqual(b"\x03abc", TestStructure(data=b"abc").to_bytes())
+        self.assertEqual(b"abc", TestStructure.from_bytes(b"\x03abc").data)
+
+    def test_non_seekable(self):
+        class Inner(Structure):
+            data = BytesField(length=-1)
+
+        class TestStructure(Structure):
+            length = IntegerField(length=1, override=Deferred.length_of('inner'))
+            inner = StructureField(Inner, length='length')
+
+        stream = NonSeekableBytesIO()
+        self.assertEqual(4, TestStructure(inner=Inner(data=b"abc")).to_stream(stream))
+        self.assertEqual(b"\x03abc", stream.getvalue())
+
+    def test_not_deferred_by_default(self):
+        class Inner(Structure):
+            data = BytesField(length=this._.length, padding=b"\0")
+
+        class TestStructure(Structure):
+            length = IntegerField(length=1)
+            inner = StructureField(Inner, length='length')
+
+        self.assertEqual(b"\x04ab\0\0", TestStructure(length=4, inner=Inner(data=b"ab")).to_bytes())
+
+    def test_placeholder_length_mismatch(self):
+        class TestStructure(Structure):
+            length = BytesField(length=1, override=Deferred(lambda c: b"ab"))
+
+        with self.assertRaises(WriteError):
+            TestStructure().to_bytes()
+
+
+class ToBufferTest(DestructifyTestCase):
+    def test_fixed_length(self):
+        class TestStructure(Structure):
+            a = IntegerField(length=2, byte_order='big')
+            b = StructField('>HB', multibyte=True)
+            c = FixedLengthField(length=2, skip=1)
+
+        s = TestStructure(a=1, b=(2, 3), c=b"cd")
+        self.assertEqual(8, s.byte_size())
+        buffer = bytearray(b"x" * 10)
+        self.assertEqual(8, s.to_buffer(buffer, 1))
+        self.assertEqual(b"x" + s.to_bytes() + b"x", buffer)
+
+    def test_variable_length(self):
+        class TestStructure(Structure):
+            length = IntegerField(length=1)
+            data = BytesField(length='length')
+
+        s = TestStructure(data=b"abc")
+        self.assertEqual(4, s.byte_size())
+        buffer = memoryview(bytearray(4))
+        self.assertEqual(4, s.to_buffer(buffer))
+        self.assertEqual(b"\x03abc", buffer.tobytes())
+
+    def test_variable_length_encodes_variable_fields_only(self):
+        class Inner(Structure):
+            a = IntegerField(length=1)
+            b = BytesField(terminator=b"\0")
+
+        class TestStructure(Structure):
+            length = IntegerField(length=2, byte_order='big')
+            data = BytesField(length='length')
+            inner = StructureField(Inner)
+            tail = IntegerField(length=4, byte_order='big')
+
+        s = TestStructure(data=b"abc", inner=Inner(a=1, b=b"xy"), tail=2)
+        with mock.patch.object(IntegerField, 'to_stream', autospec=True,
+                               side_effect=IntegerField.to_stream) as to_stream:
+            self.assertEqual(len(s.to_bytes()), s.byte_size())
+            calls = to_stream.call_count
+            s.byte_size()
+        # only the IntegerField of the nested structure is written
+        self.assertEqual(1, to_stream.call_count - calls)
+
+    def test_variable_length_with_skip(self):
+        class TestStructure(Structure):
+            data = BytesField(terminator=b"\0")
+            tail = IntegerField(length=1, skip=2)
+
+        s = TestStructure(data=b"abc", tail=1)
+        self.assertEqual(7, s.byte_size())
+
+    def test_too_small(self):
+        class TestStructure(Structure):
+            data = BytesField(length=3)
+
+        with self.assertRaises(WriteError):
+            TestStructure(data=b"abc").to_buffer(bytearray(2))
+
+    def test_padding(self):
+        class Inner(Structure):
+            data = BytesField(length=1)
+
+        class TestStructure(Structure):
+            inner = StructureField(Inner, length=3)
+
+        buffer = bytearray(b"xxxx")
+        self.assertEqual(3, TestStructure(inner=Inner(data=b"a")).to_buffer(buffer))
+        self.assertEqual(b"a\0\0x", buffer)
+
+
+class WriteManyTest(DestructifyTestCase):
+    def assertWriteMany(self, structure, records, **kwargs):
+        stream = io.BytesIO()
+        expected = b"".join(record.to_bytes() for record in records)
+        self.assertEqual(len(expected), structure.write_many(records, stream, **kwargs))
+        self.assertEqual(expected, stream.getvalue())
+
+    def test_variable_length(self):
+        records = [Chunk(length=2, chunk_type=b"HEAD", data=i, crc=0xff) for i in range(10)] + \
+                  [Chunk(length=3, chunk_type=b"DATA", data=b"abc", crc=0xff)]
+        self.assertWriteMany(Chunk, records)
+        self.assertWriteMany(Chunk, records, buffer_size=10)
+
+    def test_fixed_layout(self):
+        class TestStructure(Structure):
+            a = IntegerField(length=2, byte_order='little', signed=True)
+            b = IntegerField(length=1)
+            c = StructField('<d', multibyte=False)
+
+        self.assertWriteMany(TestStructure, [TestStructure(a=-i, b=i, c=i / 2) for i in range(100)], buffer_size=7)
+
+    def test_fixed_layout_error(self):
+        class TestStructure(Structure):
+            a = IntegerField(length=1)
+
+        with self.assertRaises(WriteError):
+            TestStructure.write_many([TestStructure(a=1), TestStructure(a=256)], io.BytesIO())
+
+    def test_offset(self):
+        class TestStructure(Structure):
+            a = IntegerField(length=1, offset=1)
+            b = IntegerField(length=1, offset=0)
+
+        self.assertWriteMany(TestStructure, [TestStructure(a=1, b=2), TestStructure(a=3, b=4)])
+
+
+class SaveChangesTest(DestructifyTestCase):
+    def parse(self):
+        stream = io.BytesIO(b"xx\x02\x00\x01\x00\x02ab\0\x00\x03")
+        stream.seek(2)
+        return Container.from_stream(stream)[0], stream
+
+    def test_changed_fields(self):
+        s, _ = self.parse()
+        self.assertEqual([], s.changed_fields())
+        s.name = "ab"
+        s.items[0].x = 5
+        self.assertEqual(['items'], s.changed_fields())
+        # the value of a lazy field is not known, so it is changed when it is assigned
+        s.tail = 3
+        self.assertEqual(['items', 'tail'], s.changed_fields())
+        self.assertEqual(['x'], s.items[0].changed_fields())
+
+    def test_not_parsed(self):
+        with self.assertRaises(ValueError):
+            Container().changed_fields()
+
+    def test_patch(self):
+        s, stream = self.parse()
+        s.items[1].x = 0x102
+        s.tail = 4
+        self.assertEqual(4, s.save_changes(stream))
+        self.assertEqual(b"xx\x02\x00\x01\x01\x02ab\0\x00\x04", stream.getvalue())
+        self.assertEqual([], s.changed_fields())
+        self.assertEqual(0, s.save_changes(stream))
+
+    def test_lazy_is_not_resolved(self):
+        s, stream = self.parse()
+        s.name = "cd"
+        self.assertEqual(3, s.save_changes(stream))
+        self.assertEqual(b"xx\x02\x00\x01\x00\x02cd\0\x00\x03", stream.getvalue())
+        self.assertFalse(s.tail.__resolved__)
+
+    def test_length_changed(self):
+        s, stream = self.parse()
+        s.items.append(Item(x=3))
+        with self.assertRaises(ValueError):
+            s.save_changes(stream)
+        self.assertEqual(b"xx\x02\x00\x01\x00\x02ab\0\x00\x03", stream.getvalue())
+
+        self.assertEqual(12, s.save_changes(stream, allow_resize=True))
+        self.assertEqual(b"xx\x03\x00\x01\x00\x02\x00\x03ab\0\x00\x03", stream.getvalue())
+
+        # the nested structures are compared to the written values afterwards
+        s.items[2].x = 4
+        self.assertEqual(2, s.save_changes(stream))
+        self.assertEqual(b"xx\x03\x00\x01\x00\x02\x00\x04ab\0\x00\x03", stream.getvalue())
+
+    def test_array_of_values(self):
+        class TestStructure(Structure):
+            a = IntegerField(length=1)
+            values = ArrayField(IntegerField(length=1), count=3)
+
+        stream = io.BytesIO(b"\x01\x02\x03\x04")
+        s = TestStructure.from_stream(stream)[0]
+        s.values[1] = 5
+        self.assertEqual(1, s.save_changes(stream))
+        self.assertEqual(b"\x01\x02\x05\x04", stream.getvalue())
+        self.assertEqual([], s.changed_fields())
+
+    def test_element_with_checksum(self):
+        class Element(Structure):
+            a = IntegerField(length=1)
+            crc = ChecksumField(IntegerField(length=4, byte_order='big'), fields=['a'])
+
+        class TestStructure(Structure):
+            elements = ArrayField(StructureField(Element), count=2)
+
+        stream = io.BytesIO(TestStructure(elements=[Element(a=1), Element(a=2)]).to_bytes())
+        s = TestStructure.from_stream(stream)[0]
+        s.elements[1].a = 3
+        # the element is written as a whole, so its checksum is calculated
+        self.assertEqual(5, s.save_changes(stream))
+        self.assertEqual(TestStructure(elements=[Element(a=1), Element(a=3)]).to_bytes(), stream.getvalue())
+
+    def test_truncate(self):
+        s, stream = self.parse()
+        s.name = ""
+        self.assertEqual(8, s.save_changes(stream, allow_resize=True))
+        self.assertEqual(b"xx\x02\x00\x01\x00\x02\0\x00\x03", stream.getvalue())
+
+    def test_trailing_data(self):
+        class TestStructure(Structure):
+            n = IntegerField(length=1)
+            data = BytesField(length='n')
+
+        stream = io.BytesIO(b"\x02ab\x03xyz")
+        s = TestStructure.from_stream(stream)[0]
+        s.data = b"a"
+        with self.assertRaises(ValueError):
+            s.save_changes(stream)
+        self.assertEqual(b"\x02ab\x03xyz", stream.getvalue())
+
+        self.assertEqual(2, s.save_changes(stream, allow_resize=True))
+        self.assertEqual(b"\x01a\x03xyz", stream.getvalue())
+
+        s.data = b"abcd"
+        self.assertEqual(5, s.save_changes(stream, allow_resize=True))
+        self.assertEqual(b"\x04abcd\x03xyz", stream.getvalue())
+
+
+class CapturedRawTest(DestructifyTestCase):
+    class Inner(Structure):
+        name = BytesField(length=4, terminator=b"\0", padding=b"\0")
+
+    # the bytes after the terminator are not part of the value, so they are lost when the value is encoded again
+    data = b"ab\0zcd\0y"
+
+    def structure(self, **kwargs):
+        class TestStructure(Structure):
+            items = ArrayField(StructureField(self.Inner), count=2)
+            name = StructureField(self.Inner)
+
+            class Meta:
+                capture_raw = kwargs.get('capture_raw', True)
+
+        return TestStructure
+
+    def test_unchanged(self):
+        s = self.structure().from_bytes(self.data + b"ef\0x")
+        self.assertEqual(self.data + b"ef\0x", s.to_bytes())
+
+    def test_changed(self):
+        s = self.structure().from_bytes(self.data + b"ef\0x")
+        s.items[1].name = b"gh"
+        # the other items are written as captured, but name could depend on the changed items of its parent
+        self.assertEqual(b"ab\0zgh\0\0ef\0\0", s.to_bytes())
+        s.name.name = b"ij"
+        self.assertEqual(b"ab\0\0gh\0\0ij\0\0", s.to_bytes())
+
+    def test_restored(self):
+        s = self.structure().from_bytes(self.data + b"ef\0x")
+        s.items[1].name = b"gh"
+        s.items[1].name = b"cd"
+        self.assertEqual(self.data + b"ef\0x", s.to_bytes())
+
+    def test_not_captured(self):
+        s = self.structure(capture_raw=False).from_bytes(self.data + b"ef\0x")
+        self.assertEqual(b"ab\0\0cd\0\0ef\0\0", s.to_bytes())
+
+    def test_context(self):
+        s = self.structure(capture_raw=False).from_stream(io.BytesIO(self.data + b"ef\0x"),
+                                                          ParsingContext(capture_raw=True))[0]
+        self.assertEqual(self.data + b"ef\0x", s.to_bytes())
+
+    def test_save_changes(self):
+        stream = io.BytesIO(self.data + b"ef\0x")
+        s = self.structure().from_stream(stream)[0]
+        s.items[0].name = b"kl"
+        s.save_changes(stream)
+        self.assertEqual(b"kl\0\0cd\0yef\0x", stream.getvalue())
+        # the captured bytes are updated with the written changes
+        self.assertEqual(b"kl\0\0cd\0yef\0x", s.to_bytes())
+
+
+    def test_parent_length_changed(self):
+        class Inner(Structure):
+            data = BytesField(length=this._.n, padding=b"\0")
+
+        class TestStructure(Structure):
+            n = IntegerField(length=1)
+            inner = StructureField(Inner)
+
+            class Meta:
+                capture_raw = True
+
+        s = TestStructure.from_bytes(b"\x03abc")
+        self.assertEqual(b"\x03abc", s.to_bytes())
+        s.n = 5
+        self.assertEqual(b"\x05abc\0\0", s.to_bytes())
+
+    def test_parent_value_overridden(self):
+        class Inner(Structure):
+            ver = IntegerField(length=1, override=lambda f, v: f._.version)
+
+        class TestStructure(Structure):
+            version = IntegerField(length=1)
+            inner = StructureField(Inner)
+
+            class Meta:
+                capture_raw = True
+
+        s = TestStructure.from_bytes(b"\x01\x01")
+        s.version = 2
+        self.assertEqual(b"\x02\x02", s.to_bytes())
+
+class ErrorContextTest(DestructifyTestCase):
+    def test_parse_error_message(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=5)
+
+        with self.assertRaisesRegex(StreamExhaustedError, "^Error while parsing field TestStructure.field1$") as cm:
+            TestStructure.from_bytes(b"abc")
+        self.assertIsInstance(cm.exception.__cause__, StreamExhaustedError)
+
+    def test_write_error_message(self):
+        class TestStructure(Structure):
+            field1 = IntegerField(length=1)
+
+        with self.assertRaisesRegex(WriteError, "^Error while writing field TestStructure.field1$") as cm:
+            TestStructure(field1=1000).to_bytes()
+        self.assertIsInstance(cm.exception.__cause__, OverflowError)
+
+
+class SlotsTest(DestructifyTestCase):
+    def test_no_dict(self):
+        self.assertEqual(('field1', 'field2', '_context'), SlottedStructure.__slots__)
+        self.assertFalse(hasattr(SlottedStructure(field1=1, field2=b"ab"), '__dict__'))
+
+    def test_parse_and_write(self):
+        s = SlottedStructure.from_bytes(b"\x01ab")
+        self.assertEqual(SlottedStructure(field1=1, field2=b"ab"), s)
+        self.assertIsInstance(s._context, ParsingContext)
+        self.assertEqual(b"\x01ab", s.to_bytes())
+
+    def test_pickle(self):
+        for s in (SlottedStructure(field1=1, field2=b"ab"), SlottedStructure.from_bytes(b"\x01ab")):
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                with self.subTest(protocol=protocol):
+                    self.assertEqual(s, pickle.loads(pickle.dumps(s, protocol)))
+
+
+class DetachContextTest(DestructifyTestCase):
+    def test_keep_context_false(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=3)
+
+        s = TestStructure.from_bytes(b"123", keep_context=False)
+        self.assertFalse(hasattr(s, '_context'))
+        self.assertFalse(s.pins_stream())
+        self.assertEqual(TestStructure(field1=b"123"), s)
+
+    def test_detach_resolves_lazy(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=3, lazy=True)
+
+        s = TestStructure.from_bytes(b"123")
+        self.assertTrue(s.pins_stream())
+        s.detach_context()
+        self.assertNotIsInstance(s.field1, lazy_object_proxy.Proxy)
+        self.assertEqual(b"123", s.field1)
+        self.assertFalse(s.pins_stream())
+
+    def test_detach_nested(self):
+        class Inner(Structure):
+            a = FixedLengthField(length=1, lazy=True)
+            b = FixedLengthField(length=1)
+
+        class TestStructure(Structure):
+            inner = StructureField(Inner)
+            inners = ArrayField(StructureField(Inner), count=2)
+
+        s = TestStructure.from_bytes(b"123456")
+        s.detach_context()
+        self.assertFalse(s.pins_stream())
+        self.assertFalse(s.inner.pins_stream())
+        self.assertEqual(b"5", s.inners[1].a)
+        self.assertNotIsInstance(s.inners[1].a, lazy_object_proxy.Proxy)
+
+    def test_stream_released(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=3)
+
+        stream = io.BytesIO(b"123")
+        stream_ref = weakref.ref(stream)
+        s, _ = TestStructure.from_stream(stream, keep_context=False)
+        del stream
+        gc.collect()
+        self.assertIsNone(stream_ref())
+        self.assertEqual(b"123", s.field1)
+
+
+class ProjectionTest(DestructifyTestCase):
+    def test_only_requested_fields(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=2)
+            field2 = FixedLengthField(length=2)
+            field3 = FixedLengthField(length=2)
+
+        with mock.patch.object(FixedLengthField, 'from_stream', autospec=True,
+                               side_effect=FixedLengthField.from_stream) as from_stream:
+            s, consumed = TestStructure.from_stream(io.BytesIO(b"aabbcc"), only=['field2'])
+        self.assertEqual(1, from_stream.call_count)
+        self.assertEqual(6, consumed)
+        self.assertIs(UNLOADED, s.field1)
+        self.assertEqual(b"bb", s.field2)
+        self.assertIs(UNLOADED, s.field3)
+
+    def test_single_name(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=2)
+            field2 = FixedLengthField(length=2)
+
+        s = TestStructure.from_bytes(b"aabb", only='field2')
+        self.assertIs(UNLOADED, s.field1)
+        self.assertEqual(b"bb", s.field2)
+
+    def test_dependencies_decoded(self):
+        class TestStructure(Structure):
+            length = IntegerField(length=1)
+            other = IntegerField(length=1)
+            data = FixedLengthField(length='length')
+            tail = FixedLengthField(length=1)
+
+        s = TestStructure.from_bytes(b"\x03\x01abcd", only={'data', 'tail'})
+        self.assertEqual(3, s.length)
+        self.assertIs(UNLOADED, s.other)
+        self.assertEqual(b"abc", s.data)
+        self.assertEqual(b"d", s.tail)
+
+    def test_skip_depends_on_field(self):
+        class TestStructure(Structure):
+            length = IntegerField(length=1)
+            data = FixedLengthField(length='length')
+            tail = FixedLengthField(length=1)
+
+        s = TestStructure.from_bytes(b"\x03abcd", only={'tail'})
+        self.assertEqual(3, s.length)
+        self.assertIs(UNLOADED, s.data)
+        self.assertEqual(b"d", s.tail)
+
+    def test_unskippable_field_decoded(self):
+        class TestStructure(Structure):
+            name = TerminatedField(terminator=b"\0")
+            tail = FixedLengthField(length=1)
+
+        s = TestStructure.from_bytes(b"abc\0d", only={'tail'})
+        self.assertEqual(b"abc", s.name)
+        self.assertEqual(b"d", s.tail)
+
+    def test_nested_projection(self):
+        class Chunk(Structure):
+            length = IntegerField(length=1)
+            chunk_type = FixedLengthField(length=2)
+            data = FixedLengthField(length='length')
+
+        class TestStructure(Structure):
+            header = FixedLengthField(length=2)
+            chunks = ArrayField(StructureField(Chunk), count=2)
+
+        s = TestStructure.from_bytes(b"hh\x01abX\x02cdYZ", only={'chunks.chunk_type'})
+        self.assertIs(UNLOADED, s.header)
+        self.assertEqual([b"ab", b"cd"], [chunk.chunk_type for chunk in s.chunks])
+        self.assertEqual([1, 2], [chunk.length for chunk in s.chunks])
+        self.assertIs(UNLOADED, s.chunks[0].data)
+
+    def test_full_path_overrides_nested(self):
+        class Inner(Structure):
+            a = FixedLengthField(length=1)
+            b = FixedLengthField(length=1)
+
+        class TestStructure(Structure):
+            inner = StructureField(Inner)
+
+        s = TestStructure.from_bytes(b"ab", only={'inner.a', 'inner'})
+        self.assertEqual(b"b", s.inner.b)
+
+    def test_unknown_field(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=2)
+
+        with self.assertRaises(ValueError):
+            TestStructure.from_bytes(b"aa", only={'field2'})
+
+    def test_checks_not_run(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=1)
+            field2 = FixedLengthField(length=1)
+
+            class Meta:
+                checks = [lambda c: c.field1 == b"b"]
+
+        with self.assertRaises(CheckError):
+            TestStructure.from_bytes(b"ab")
+        self.assertEqual(b"b", TestStructure.from_bytes(b"ab", only={'field2'}).field2)
+
+    def test_write_unloaded(self):
+        class TestStructure(Structure):
+            field1 = FixedLengthField(length=1)
+            field2 = FixedLengthField(length=1)
+
+        s = TestStructure.from_bytes(b"ab", only={'field2'})
+        with self.assertRaises(WriteError):
+            s.to_bytes()
+
+
+class WhereTest(DestructifyTestCase):
+    data = b"\x02HEAD\x01\x02\xff\x03IDATabc\xff\x01IEND\x00\xff"
+
+    def test_where_this(self):
+        self.assertEqual(b"IDAT", Chunk.from_bytes(b"\x03IDATabc\xff", where=this.chunk_type == b"IDAT").chunk_type)
+        self.assertIsNone(Chunk.from_bytes(b"\x03IDATabc\xff", where=this.chunk_type == b"IEND"))
+
+    def test_where_callable(self):
+        self.assertIsNone(Chunk.from_bytes(b"\x03IDATabc\xff", where=lambda f: f.length > 3))
+
+    def test_rejected_consumed(self):
+        result, consumed = Chunk.from_stream(io.BytesIO(self.data[8:]), where=this.chunk_type == b"IEND")
+        self.assertIsNone(result)
+        self.assertEqual(9, consumed)
+
+    def test_rejected_not_decoded(self):
+        with mock.patch.object(SwitchField, 'from_stream', autospec=True,
+                               side_effect=SwitchField.from_stream) as from_stream:
+            self.assertIsNotNone(Chunk.from_bytes(b"\x03IDATabc\xff", where=this.chunk_type == b"IDAT"))
+            self.assertEqual(1, from_stream.call_count)
+            self.assertIsNone(Chunk.from_bytes(b"\x03IDATabc\xff", where=this.chunk_type == b"IEND"))
+            self.assertEqual(1, from_stream.call_count)
+
+    def test_rejected_checks_not_run(self):
+        self.assertIsNone(Chunk.from_bytes(b"\x03IDATabc\x00", where=this.chunk_type == b"IEND"))
+        with self.assertRaises(CheckError):
+            Chunk.from_bytes(b"\x03IDATabc\x00", where=this.chunk_type == b"IDAT")
+
+    def test_iter_stream(self):
+        self.assertEqual([b"HEAD", b"IDAT", b"IEND"],
+                         [c.chunk_type for c in Chunk.iter_stream(io.BytesIO(self.data))])
+        chunks = list(Chunk.iter_stream(io.BytesIO(self.data), where=this.chunk_type == b"IDAT"))
+        self.assertEqual(1, len(chunks))
+        self.assertEqual(b"abc", chunks[0].data)
+
+    def test_rejected_nested_skipped(self):
+        class TestStructure(Structure):
+            kind = IntegerField(length=1)
+            chunks = ArrayField(StructureField(Chunk), count=3)
+
+        with mock.patch.object(SwitchField, 'from_stream', autospec=True,
+                               side_effect=SwitchField.from_stream) as from_stream:
+            result, consumed = TestStructure.from_stream(io.BytesIO(b"\x01" + self.data), where=this.kind == 2)
+        self.assertIsNone(result)
+        self.assertEqual(1 + len(self.data), consumed)
+        self.assertEqual(0, from_stream.call_count)
+
+
+class StreamCallsTest(DestructifyTestCase):
+    def assertCalls(self, calls, structure, data, context=None):
+        stream = StatsStream(io.BytesIO(data))
+        result, consumed = structure.from_stream(stream, context)
+        self.assertEqual(calls, stream.total.calls)
+        self.assertEqual(consumed, stream.raw.tell())
+        return result
+
+    def test_sequential(self):
+        class TestStructure(Structure):
+            length = IntegerField(length=1)
+            data = FixedLengthField(length='length')
+            name = StringField(terminator=b"\0")
+
+        self.assertCalls({'tell': 1, 'read': 4}, TestStructure, b"\x02abc\0")
+
+    def test_nested(self):
+        class Inner(Structure):
+            x = IntegerField(length=1)
+
+        class TestStructure(Structure):
+            a = StructureField(Inner)
+            b = StructureField(Inner)
+
+        # the Substream of each nested structure keeps its position in sync with the underlying stream
+        self.assertCalls({'tell': 7, 'read': 2}, TestStructure, b"\x01\x02")
+
+    def test_resolved_lazy(self):
+        class TestStructure(Structure):
+            data = FixedLengthField(length='size')
+            size = IntegerField(length=1, offset=-1, lazy=True)
+
+        # size is resolved while parsing data, and is not read again after seeking to it
+        self.assertCalls({'tell': 2, 'read': 2, 'seek': 6}, TestStructure, b"ab\x02")
+
+    def test_resolved_lazy_before_offset_none(self):
+        class TestStructure(Structure):
+            h = FixedLengthField(length=1)
+            b = FixedLengthField(length='a')
+            a = IntegerField(length=1, lazy=True, offset=3)
+            c = FixedLengthField(length=1, offset=lambda f: None)
+
+        # the seek over a is still needed, as c starts at the current position
+        s = self.assertCalls({'tell': 2, 'read': 4, 'seek': 6}, TestStructure, b"Hbb\x02C")
+        self.assertEqual(b"C", s.c)
+
+    def test_capture_raw(self):
+        class TestStructure(Structure):
+            a = FixedLengthField(length=2)
+            b = IntegerField(length=1)
+
+        s = self.assertCalls({'tell': 2, 'read': 2}, TestStructure, b"ab\x01", ParsingContext(capture_raw=True))
+        self.assertEqual(b"ab", s._context.fields['a'].raw)
+
+    def test_end_of_structure(self):
+        class TestStructure(Structure):
+            a = IntegerField(length=1, offset=2)
+            b = IntegerField(length=1, offset=0)
+
+        self.assertCalls({'tell': 1, 'read': 2, 'seek': 3}, TestStructure, b"\x01\x00\x02")
@@ -0,0 +1,155 @@
+import concurrent.futures
+import gc
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+from destructify import Structure, IntegerField, FixedLengthField, StructureField, ArrayField, parallel
+
+
+class FixedRecord(Structure):
+    a = IntegerField(length=2, byte_order='big')
+    b = FixedLengthField(length=2)
+
+
+class LazyRecord(Structure):
+    a = IntegerField(length=2, byte_order='big')
+    b = FixedLengthField(length=2, lazy=True)
+    c = IntegerField(length=1)
+
+
+class Inner(Structure):
+    x = IntegerField(length=1)
+
+
+class VariableRecord(Structure):
+    length = IntegerField(length=1)
+    data = FixedLengthField(length='length')
+    inner = ArrayField(StructureField(Inner), count=2)
+
+
+class ParseFileTest(unittest.TestCase):
+    def write_file(self, data):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        self.addCleanup(os.unlink, path)
+        return path
+
+    def test_fixed_records(self):
+        path = self.write_file(b"".join(FixedRecord(a=i, b=b"xy").to_bytes() for i in range(100)))
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                result = list(parallel.parse_file(FixedRecord, path, workers=workers, chunk_size=32))
+                self.assertEqual([(i, b"xy") for i in range(100)], result)
+
+    def test_variable_records(self):
+        records = [VariableRecord(data=b"a" * (i % 7), inner=[Inner(x=i), Inner(x=1)]) for i in range(50)]
+        path = self.write_file(b"".join(r.to_bytes() for r in records))
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                result = list(parallel.parse_file(VariableRecord, path, workers=workers, chunk_size=20))
+                self.assertEqual([(i % 7, b"a" * (i % 7), [(i,), (1,)]) for i in range(50)], result)
+
+    def test_find_boundaries(self):
+        data = b"".join(VariableRecord(data=b"a" * i, inner=[Inner(x=0), Inner(x=0)]).to_bytes() for i in range(5))
+        ranges = parallel.find_boundaries(VariableRecord, data, chunk_size=8)
+        self.assertEqual([(0, 12), (12, 25)], ranges)
+        self.assertEqual(ranges, parallel.find_boundaries(VariableRecord, data, chunk_size=8,
+                                                          boundary=lambda b, o: b[o] + 3))
+
+    def test_reducer(self):
+        path = self.write_file(b"".join(FixedRecord(a=i, b=b"xy").to_bytes() for i in range(100)))
+        self.assertEqual(sum(range(100)), parallel.parse_file(FixedRecord, path, workers=2, chunk_size=40,
+                                                              reducer=lambda acc, r: acc + r[0], initial=0))
+
+    def test_structures_returned_without_convert(self):
+        records = [VariableRecord(length=1, data=b"a", inner=[Inner(x=i), Inner(x=1)]) for i in range(10)]
+        path = self.write_file(b"".join(r.to_bytes() for r in records))
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                result = list(parallel.parse_file(VariableRecord, path, workers=workers, chunk_size=20, convert=None))
+                self.assertEqual(records, result)
+                self.assertFalse(any(r.pins_stream() for r in result))
+
+    def test_lazy_fields_resolved_without_convert(self):
+        path = self.write_file(b"".join(LazyRecord(a=i, b=b"xy", c=i).to_bytes() for i in range(3)))
+        result = list(parallel.parse_file(LazyRecord, path, workers=1, convert=None))
+        self.assertEqual([b"xy"] * 3, [r.b for r in result])
+
+    def test_pause_gc(self):
+        path = self.write_file(b"".join(FixedRecord(a=i, b=b"xy").to_bytes() for i in range(10)))
+        self.assertEqual([(i, b"xy") for i in range(10)],
+                         list(parallel.parse_file(FixedRecord, path, workers=1, pause_gc=True)))
+        self.assertTrue(gc.isenabled())
+
+    def test_empty_file(self):
+        path = self.write_file(b"")
+        self.assertEqual([], list(parallel.parse_file(FixedRecord, path, workers=2)))
+
+
+class Element(Structure):
+    length = IntegerField(length=1)
+    data = FixedLengthField(length='length')
+
+
+class ArrayRecord(Structure):
+    count = IntegerField(length=1)
+    elements = ArrayField(StructureField(Element), count='count')
+    nested = ArrayField(ArrayField(IntegerField(length=1), count=2), count=2)
+
+
+class ParseManyTest(unittest.TestCase):
+    def setUp(self):
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        self.addCleanup(sys.setswitchinterval, switch_interval)
+
+    def test_sequential(self):
+        self.assertEqual([FixedRecord(a=1, b=b"ab"), FixedRecord(a=2, b=b"cd")],
+                         list(parallel.parse_many(FixedRecord, [b"\x00\x01ab", io.BytesIO(b"\x00\x02cd")])))
+
+    def test_pause_gc(self):
+        results = parallel.parse_many(FixedRecord, [b"\x00\x01ab", b"\x00\x02cd"], pause_gc=True)
+        self.assertEqual(FixedRecord(a=1, b=b"ab"), next(results))
+        # the collector is not paused while the caller handles a result
+        self.assertTrue(gc.isenabled())
+        self.assertEqual([FixedRecord(a=2, b=b"cd")], list(results))
+        self.assertTrue(gc.isenabled())
+
+    def test_gc_paused(self):
+        with parallel.gc_paused(freeze=True):
+            self.assertFalse(gc.isenabled())
+        self.assertTrue(gc.isenabled())
+        self.assertEqual(0, gc.get_freeze_count())
+
+    def test_gc_paused_keeps_frozen_objects(self):
+        gc.freeze()
+        self.addCleanup(gc.unfreeze)
+        count = gc.get_freeze_count()
+        with parallel.gc_paused(freeze=True):
+            pass
+        self.assertEqual(count, gc.get_freeze_count())
+
+    def test_threads(self):
+        records = [ArrayRecord(elements=[Element(data=b"x" * ((i + j) % 5)) for j in range(i % 8)],
+                               nested=[[i % 256, j] for j in range(2)])
+                   for i in range(200)]
+        inputs = [r.to_bytes() for r in records]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(parallel.parse_many(ArrayRecord, inputs, executor=executor))
+
+        self.assertEqual([ArrayRecord.from_bytes(b) for b in inputs], results)
+        self.assertEqual(inputs, [r.to_bytes() for r in results])
+
+
+class WriteManyTest(unittest.TestCase):
+    def test_processes(self):
+        records = [VariableRecord(length=i % 4, data=b"x" * (i % 4), inner=[Inner(x=i % 256), Inner(x=1)])
+                   for i in range(50)]
+        stream = io.BytesIO()
+        VariableRecord.write_many(records, stream, workers=2, chunk_size=7)
+        self.assertEqual(b"".join(r.to_bytes() for r in records), stream.getvalue())
@@ -0,0 +1,103 @@
+import json
+import threading
+import unittest
+
+from destructify import Structure, IntegerField, FixedLengthField, StructureField, ArrayField, ParsingContext, \
+    ParseError, profiling
+
+
+class Inner(Structure):
+    x = IntegerField(length=1)
+
+
+class Record(Structure):
+    length = IntegerField(length=1)
+    data = FixedLengthField(length='length')
+    inner = ArrayField(StructureField(Inner), count=2)
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(ParsingContext.profiler)
+        self.assertIsNone(ParsingContext().profiler)
+
+    def test_parse(self):
+        with profiling.profile() as profiler:
+            Record.from_bytes(b"\x02ab\x01\x02")
+            Record.from_bytes(b"\x01a\x01\x02")
+        self.assertIsNone(ParsingContext.profiler)
+
+        stats = profiler.stats
+        self.assertEqual(2, stats['Record.length'].calls)
+        self.assertEqual(2, stats['Record.length'].bytes)
+        self.assertEqual(3, stats['Record.data'].bytes)
+        self.assertEqual(2, stats['Record.inner'].calls)
+        self.assertEqual(4, stats['Record.inner.inner'].calls)
+        self.assertEqual(4, stats['Inner.x'].calls)
+        self.assertGreaterEqual(stats['Record.inner'].time, stats['Record.inner.inner'].time)
+
+    def test_write(self):
+        with profiling.profile() as profiler:
+            Record(data=b"abc", inner=[Inner(x=1), Inner(x=2)]).to_bytes()
+        self.assertEqual(1, profiler.stats['Record.data'].calls)
+        self.assertEqual(3, profiler.stats['Record.data'].bytes)
+        self.assertEqual(2, profiler.stats['Inner.x'].calls)
+
+    def test_errors(self):
+        with profiling.profile() as profiler:
+            with self.assertRaises(ParseError):
+                Record.from_bytes(b"\x05ab")
+        self.assertEqual(1, profiler.stats['Record.data'].errors)
+        self.assertEqual(0, profiler.stats['Record.length'].errors)
+
+    def test_seeks(self):
+        class TestStructure(Structure):
+            a = IntegerField(length=1)
+            b = FixedLengthField(length=2, lazy=True)
+            c = IntegerField(length=1, skip=1)
+
+        with profiling.profile() as profiler:
+            TestStructure.from_bytes(b"\x01ab\x00\x02")
+        self.assertEqual(0, profiler.stats['TestStructure.a'].seeks)
+        self.assertEqual(1, profiler.stats['TestStructure.b'].seeks)
+        self.assertEqual(1, profiler.stats['TestStructure.c'].seeks)
+
+    def test_sample_interval(self):
+        with profiling.profile(sample_interval=3) as profiler:
+            for i in range(7):
+                Record.from_bytes(b"\x01a\x01\x02")
+        self.assertEqual(3, profiler.stats['Record.length'].calls)
+        self.assertEqual(6, profiler.stats['Inner.x'].calls)
+
+    def test_enable_disable(self):
+        profiler = profiling.enable()
+        try:
+            Inner.from_bytes(b"\x01")
+        finally:
+            self.assertIs(profiler, profiling.disable())
+        Inner.from_bytes(b"\x01")
+        self.assertEqual(1, profiler.stats['Inner.x'].calls)
+
+    def test_other_threads_not_profiled(self):
+        with profiling.profile() as profiler:
+            thread = threading.Thread(target=Inner.from_bytes, args=(b"\x01",))
+            thread.start()
+            thread.join()
+            Record.from_bytes(b"\x01a\x01\x02")
+        self.assertEqual(2, profiler.stats['Inner.x'].calls)
+
+    def test_context(self):
+        profiler = profiling.Profiler()
+        Record.from_bytes(b"\x01a\x01\x02", ParsingContext(profiler=profiler))
+        Record.from_bytes(b"\x01a\x01\x02")
+        self.assertEqual(1, profiler.stats['Record.length'].calls)
+        self.assertEqual(2, profiler.stats['Inner.x'].calls)
+
+    def test_export(self):
+        with profiling.profile() as profiler:
+            Inner.from_bytes(b"\x01")
+        self.assertEqual({'Inner.x': {'calls': 1, 'time': profiler.stats['Inner.x'].time, 'bytes': 1, 'seeks': 0,
+                                      'errors': 0}}, json.loads(profiler.to_json()))
+        table = profiler.table().splitlines()
+        self.assertEqual(2, len(table))
+        self.assertTrue(table[1].startswith("Inner.x"))